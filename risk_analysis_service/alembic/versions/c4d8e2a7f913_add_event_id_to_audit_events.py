@@ -0,0 +1,36 @@
+"""add event_id to audit_events
+
+Revision ID: c4d8e2a7f913
+Revises: b1c2d3e4f5a6
+Create Date: 2026-01-12 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = "c4d8e2a7f913"
+down_revision: Union[str, Sequence[str], None] = "b1c2d3e4f5a6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows keep a NULL event_id; NULLs never conflict in the unique index
+    op.add_column("audit_events", sa.Column("event_id", sa.String(), nullable=True))
+    op.create_index(
+        "uq_audit_events_org_event_id",
+        "audit_events",
+        ["organization_id", "event_id"],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("uq_audit_events_org_event_id", table_name="audit_events")
+    op.drop_column("audit_events", "event_id")
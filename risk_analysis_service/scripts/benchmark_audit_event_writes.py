@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+
+def _resolve_project_root() -> Path:
+    """
+    Resolve the project root assuming this file lives in <root>/scripts/.
+    """
+    return Path(__file__).resolve().parent.parent
+
+
+def _ensure_import_path() -> None:
+    """
+    Add project root to sys.path so local modules under `src/` are importable.
+    """
+    project_root = _resolve_project_root()
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+
+
+def _make_rows(count: int, organization_id: uuid.UUID) -> List[Dict[str, Any]]:
+    """
+    Build synthetic audit event rows shaped like the consumer's flush output.
+    """
+    base = datetime.now(timezone.utc) - timedelta(days=1)
+    actions = ("GetObject", "PutObject", "DeleteBucket", "ConsoleLogin")
+    rows: List[Dict[str, Any]] = []
+    for i in range(count):
+        rows.append(
+            {
+                "event_id": str(uuid.uuid4()),
+                "event_time": base + timedelta(seconds=i),
+                "actor_identity": f"arn:aws:iam::123456789012:user/bench-{i % 37}",
+                "action_name": actions[i % len(actions)],
+                "target_resource": f"s3://bench-bucket-{i % 11}/key,{i}",
+                "actor_ip_address": f"10.0.{i % 256}.{(i * 7) % 256}",
+                "event_status": "FAILURE" if i % 13 == 0 else "SUCCESS",
+                "organization_id": organization_id,
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    """
+    Compare rows/sec of the COPY FROM STDIN write path against the ORM
+    bulk_save_objects path for audit_events, plus the idempotent variants the
+    consumer uses (INSERT ... ON CONFLICT, COPY via a staging table). Every run
+    is rolled back, so the benchmark leaves no rows behind. Uses DATABASE_URL
+    when set, otherwise the service's default engine.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[50, 500, 5000, 50000],
+        help="Batch sizes to measure (default: 50 500 5000 50000)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per batch size (default: 3)"
+    )
+    args = parser.parse_args()
+
+    _ensure_import_path()
+
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+
+    from src.risk_analysis_service.db import models  # noqa: F401
+    from src.risk_analysis_service.db.repositories.audit_event_repository import (
+        AuditEventRepository,
+    )
+
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        engine = create_engine(database_url)
+    else:
+        from src.risk_analysis_service.db.session import engine
+
+    def run(
+        rows: List[Dict[str, Any]],
+        use_copy: bool,
+        org_id: uuid.UUID,
+        dedup: bool = False,
+    ) -> float:
+        with engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                conn.execute(
+                    text("INSERT INTO organizations (id, name) VALUES (:id, :name)"),
+                    {"id": str(org_id), "name": f"bench-{org_id}"},
+                )
+                with Session(bind=conn) as db:
+                    started = time.perf_counter()
+                    repo = AuditEventRepository(db)
+                    if dedup:
+                        repo.insert_new(rows, use_copy=use_copy)
+                    else:
+                        repo.bulk_insert(rows, use_copy=use_copy)
+                    db.flush()
+                    elapsed = time.perf_counter() - started
+            finally:
+                trans.rollback()
+        return elapsed
+
+    paths: Dict[str, Callable[[List[Dict[str, Any]], uuid.UUID], float]] = {
+        "orm": lambda rows, org: run(rows, False, org),
+        "copy": lambda rows, org: run(rows, True, org),
+        "upsert": lambda rows, org: run(rows, False, org, dedup=True),
+        "staged": lambda rows, org: run(rows, True, org, dedup=True),
+    }
+
+    print(f"{'rows':>8} {'path':>6} {'best_s':>10} {'rows/sec':>12}")
+    for count in args.rows:
+        org_id = uuid.uuid4()
+        rows = _make_rows(count, org_id)
+        results: Dict[str, float] = {}
+        for name, fn in paths.items():
+            best = min(fn(rows, org_id) for _ in range(max(1, args.repeat)))
+            results[name] = best
+            print(f"{count:>8} {name:>6} {best:>10.4f} {count / best:>12.0f}")
+        print(f"{count:>8} {'speedup':>6} {results['orm'] / results['copy']:>10.2f}x")
+        print(
+            f"{count:>8} {'dedup':>6} {results['upsert'] / results['staged']:>10.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
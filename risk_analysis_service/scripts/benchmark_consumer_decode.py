@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+
+def _resolve_project_root() -> Path:
+    """
+    Resolve the project root assuming this file lives in <root>/scripts/.
+    """
+    return Path(__file__).resolve().parent.parent
+
+
+def _ensure_import_path() -> None:
+    """
+    Add project root to sys.path so local modules under `src/` are importable.
+    """
+    project_root = _resolve_project_root()
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+
+
+def _make_messages(count: int) -> List[bytes]:
+    """
+    Build Kafka values shaped like the ingestion service's CloudTrail events.
+    """
+    org_id = str(uuid.uuid4())
+    base = datetime.now(timezone.utc) - timedelta(days=1)
+    messages: List[bytes] = []
+    for i in range(count):
+        event_time = (base + timedelta(seconds=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        payload: Dict[str, Any] = {
+            "organization_id": org_id,
+            "cloud_account_id": str(uuid.uuid4()),
+            "actor_identity": f"bench-{i % 37}",
+            "action": "GetObject",
+            "event_time": event_time,
+            "source": "cloudtrail",
+            "raw": {
+                "eventID": str(uuid.uuid4()),
+                "eventTime": event_time,
+                "eventName": "GetObject" if i % 5 else "DeleteBucket",
+                "eventSource": "s3.amazonaws.com",
+                "awsRegion": "eu-central-1",
+                "sourceIPAddress": f"10.0.{i % 256}.{(i * 7) % 256}",
+                "userAgent": "aws-cli/2.15.0",
+                "userIdentity": {
+                    "type": "IAMUser",
+                    "userName": f"bench-{i % 37}",
+                    "arn": f"arn:aws:iam::123456789012:user/bench-{i % 37}",
+                },
+                "requestParameters": {
+                    "bucketName": f"bench-bucket-{i % 11}",
+                    "key": f"objects/{i}.json",
+                },
+                "responseElements": None if i % 13 == 0 else {},
+            },
+        }
+        messages.append(json.dumps(payload).encode("utf-8"))
+    return messages
+
+
+def main() -> None:
+    """
+    Measure messages/sec of the consumer decode path: the previous per-message
+    utf-8 decode, strip, json.loads and model_validate against bytes parsing
+    (orjson when installed) with one TypeAdapter validation per batch.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--messages", type=int, default=20000, help="Messages per run (default: 20000)"
+    )
+    parser.add_argument(
+        "--batch", type=int, default=500, help="Messages per poll (default: 500)"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per path (default: 3)"
+    )
+    args = parser.parse_args()
+
+    _ensure_import_path()
+
+    from src.risk_analysis_service.core import event_decoding
+    from src.risk_analysis_service.core.event_decoding import (
+        loads_json,
+        to_generic_event_payload,
+        validate_events,
+    )
+    from src.risk_analysis_service.schemas.audit_event import GenericAuditEvent
+
+    messages = _make_messages(args.messages)
+    polls = [
+        messages[i : i + args.batch] for i in range(0, len(messages), args.batch)
+    ]
+
+    def before() -> int:
+        count = 0
+        for poll in polls:
+            for value in poll:
+                payload = json.loads(value.decode("utf-8").strip())
+                GenericAuditEvent.model_validate(to_generic_event_payload(payload))
+                count += 1
+        return count
+
+    def after() -> int:
+        count = 0
+        for poll in polls:
+            pending = [to_generic_event_payload(loads_json(value)) for value in poll]
+            events, _ = validate_events(pending)
+            count += len(events)
+        return count
+
+    paths: Dict[str, Callable[[], int]] = {"before": before, "after": after}
+    parser_name = "orjson" if event_decoding.orjson is not None else "json"
+    print(f"messages={args.messages} batch={args.batch} parser={parser_name}")
+    results: Dict[str, float] = {}
+    for name, fn in paths.items():
+        best = float("inf")
+        for _ in range(max(1, args.repeat)):
+            started = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - started)
+        results[name] = best
+        print(f"{name:>7}: {best:8.4f}s  {args.messages / best:>10.0f} msg/s")
+    print(f"speedup: {results['before'] / results['after']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+
+
+def _resolve_project_root() -> Path:
+    """
+    Resolve the project root assuming this file lives in <root>/scripts/.
+    """
+    return Path(__file__).resolve().parent.parent
+
+
+def _ensure_import_path() -> None:
+    """
+    Add project root to sys.path so local modules under `src/` are importable.
+    """
+    project_root = _resolve_project_root()
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+
+
+def _make_events(count: int, seed: int) -> List[object]:
+    """
+    Audit events spread over a few hours, entities and source IPs, as one
+    consumer flush would see them.
+    """
+    from src.risk_analysis_service.schemas.audit_event import GenericAuditEvent
+
+    rnd = random.Random(seed)
+    organization_id = uuid.uuid4()
+    start = datetime(2025, 3, 1, tzinfo=timezone.utc)
+    users = [f"arn:aws:iam::123456789012:user/user{i}" for i in range(20)]
+    return [
+        GenericAuditEvent(
+            event_id=str(i),
+            event_time=start + timedelta(seconds=rnd.randint(0, 4 * 3600)),
+            actor_identity=rnd.choice(users + ["", "Unknown"]),
+            actor_ip_address=f"10.0.{rnd.randint(0, 3)}.{rnd.randint(1, 20)}",
+            action_name=rnd.choice(
+                ["GetObject", "PutObject", "ListBuckets", "DeleteBucket"]
+            ),
+            target_resource="arn:aws:s3:::bucket",
+            event_status="FAILURE" if rnd.random() < 0.1 else "SUCCESS",
+            organization_id=organization_id,
+            cloud_provider="AWS",
+            raw_log={},
+        )
+        for i in range(count)
+    ]
+
+
+def _entity_id(event) -> str:
+    identity = (event.actor_identity or "").strip()
+    if identity and identity.lower() not in {"", "nan", "none", "anonymous", "unknown"}:
+        return identity
+    return (event.actor_ip_address or "").strip()
+
+
+def _pandas_vectors(events, keys) -> Dict[Tuple[str, int], List[float]]:
+    """
+    The previous EventAnalyzerService._prepare_features plus its .loc lookups.
+    """
+    columns = [
+        "event_count",
+        "failure_ratio",
+        "unique_ips",
+        "critical_actions_count",
+        "is_night",
+    ]
+    records = [
+        {
+            "event_time": pd.to_datetime(e.event_time, utc=True, errors="coerce"),
+            "actor_identity": (e.actor_identity or "").strip(),
+            "actor_ip_address": (e.actor_ip_address or "").strip(),
+            "action_name": (e.action_name or "").strip(),
+            "status": e.event_status.value.upper(),
+            "entity_id": _entity_id(e),
+        }
+        for e in events
+    ]
+    df = pd.DataFrame.from_records(records)
+    df = df.dropna(subset=["event_time"])
+    df["is_failure"] = df["status"].astype(str).str.strip().str.upper().eq("FAILURE")
+    df["is_critical_action"] = (
+        df["action_name"]
+        .astype(str)
+        .str.strip()
+        .str.lower()
+        .str.startswith(("delete", "terminate"))
+    )
+    df["time_window"] = df["event_time"].dt.floor("h")
+    features = df.groupby(["entity_id", "time_window"]).agg(
+        event_count=("event_time", "size"),
+        failure_ratio=("is_failure", "mean"),
+        unique_ips=("actor_ip_address", "nunique"),
+        critical_actions_count=("is_critical_action", "sum"),
+    )
+    window_hours = features.index.get_level_values(1).hour
+    features = features.assign(
+        is_night=((window_hours <= 6) | (window_hours >= 21)).astype(int)
+    )
+    vectors = {}
+    for entity_id, hour in keys:
+        idx_key = (entity_id, pd.Timestamp(hour * 3600, unit="s", tz="UTC"))
+        if idx_key in features.index:
+            row = features.loc[idx_key, columns].fillna(0)
+            vectors[(entity_id, hour)] = [float(v) for v in row.values]
+    return vectors
+
+
+def _columnar_vectors(events, keys) -> Dict[Tuple[str, int], List[float]]:
+    """
+    EventAnalyzerService._feature_rows followed by FeatureBatch.aggregate.
+    """
+    from src.risk_analysis_service.ml_engine.hourly_features import (
+        CRITICAL_ACTION_PREFIXES,
+        FeatureBatch,
+        epoch_hour,
+    )
+
+    rows = [
+        (
+            _entity_id(e),
+            epoch_hour(e.event_time),
+            (e.actor_ip_address or "").strip(),
+            e.event_status.value.strip().upper() == "FAILURE",
+            (e.action_name or "").strip().lower().startswith(CRITICAL_ACTION_PREFIXES),
+        )
+        for e in events
+    ]
+    features = FeatureBatch(rows).aggregate()
+    return {key: features[key] for key in keys if key in features}
+
+
+def _best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    """
+    Compare the pandas hourly feature builder previously used by the analyzer
+    with the columnar NumPy FeatureBatch on synthetic flushes, after checking
+    that both return identical feature vectors for every (entity, hour).
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 50, 500, 5000],
+        help="Events per batch (default: 10 50 500 5000)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="Runs per batch size (default: 20)"
+    )
+    args = parser.parse_args()
+
+    _ensure_import_path()
+
+    from src.risk_analysis_service.ml_engine.hourly_features import epoch_hour
+
+    print(f"{'events':>7} {'keys':>6} {'pandas ms':>10} {'numpy ms':>9} {'speedup':>8}")
+    for size in args.sizes:
+        events = _make_events(size, seed=size)
+        keys = sorted({(_entity_id(e), epoch_hour(e.event_time)) for e in events})
+        expected = _pandas_vectors(events, keys)
+        actual = _columnar_vectors(events, keys)
+        if expected != actual or len(actual) != len(keys):
+            raise SystemExit(f"Feature vectors differ for a batch of {size} events")
+        pandas_s = _best_of(lambda: _pandas_vectors(events, keys), args.repeat)
+        numpy_s = _best_of(lambda: _columnar_vectors(events, keys), args.repeat)
+        print(
+            f"{size:>7} {len(keys):>6} {pandas_s * 1e3:>10.3f} "
+            f"{numpy_s * 1e3:>9.3f} {pandas_s / numpy_s:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+
+def _resolve_project_root() -> Path:
+    """
+    Resolve the project root assuming this file lives in <root>/scripts/.
+    """
+    return Path(__file__).resolve().parent.parent
+
+
+def _ensure_import_path() -> None:
+    """
+    Add project root to sys.path so local modules under `src/` are importable.
+    """
+    project_root = _resolve_project_root()
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+
+
+def _make_features(count: int, seed: int) -> np.ndarray:
+    """
+    Hourly feature rows shaped like the analyzer's: event_count, failure_ratio,
+    unique_ips, critical_actions_count, is_night.
+    """
+    rng = np.random.default_rng(seed)
+    event_count = rng.integers(1, 40, count)
+    return np.column_stack(
+        [
+            event_count,
+            rng.binomial(event_count, 0.05) / event_count,
+            rng.integers(1, 4, count),
+            rng.binomial(event_count, 0.02),
+            rng.integers(0, 2, count),
+        ]
+    ).astype(np.float64)
+
+
+def _best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    """
+    Compare per-call latency of sklearn inference (scaler.transform +
+    IsolationForest.predict) with the NumPy ForestScorer built from the same
+    model.pkl/scaler.pkl, after checking that both make the same decisions.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100, 1000, 10000],
+        help="Batch sizes (default: 1 10 100 1000 10000)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Runs per batch size (default: 5)"
+    )
+    parser.add_argument(
+        "--check-rows",
+        type=int,
+        default=50000,
+        help="Rows compared against sklearn before timing (default: 50000)",
+    )
+    args = parser.parse_args()
+
+    _ensure_import_path()
+
+    import joblib
+
+    from src.risk_analysis_service.ml_engine.predictor import ForestScorer
+
+    artifacts = _resolve_project_root() / "src" / "risk_analysis_service" / "ml_engine"
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = joblib.load(artifacts / "model.pkl")
+        scaler = joblib.load(artifacts / "scaler.pkl")
+    scorer = ForestScorer.from_model(model, scaler)
+
+    check = _make_features(args.check_rows, seed=1)
+    expected = model.predict(scaler.transform(check))
+    mismatches = int((scorer.predict(check) != expected).sum())
+    score_diff = float(
+        np.abs(
+            scorer.score_samples(check) - model.score_samples(scaler.transform(check))
+        ).max()
+    )
+    print(
+        f"check rows={args.check_rows} decision mismatches={mismatches} "
+        f"max score diff={score_diff:.2e}"
+    )
+
+    print(f"{'batch':>7} {'sklearn ms':>11} {'numpy ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        batch = _make_features(size, seed=size)
+        sklearn_s = _best_of(
+            lambda: model.predict(scaler.transform(batch)), args.repeat
+        )
+        numpy_s = _best_of(lambda: scorer.predict(batch), args.repeat)
+        print(
+            f"{size:>7} {sklearn_s * 1e3:>11.3f} {numpy_s * 1e3:>10.3f} "
+            f"{sklearn_s / numpy_s:>7.1f}x"
+        )
+    if mismatches:
+        raise SystemExit(f"{mismatches} decisions differ from sklearn")
+
+
+if __name__ == "__main__":
+    main()
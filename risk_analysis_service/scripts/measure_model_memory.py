@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+from typing import Dict, List
+
+FORMATS = ("pickle", "pickle-mmap", "npy", "npy-mmap")
+
+
+def _resolve_project_root() -> Path:
+    """
+    Resolve the project root assuming this file lives in <root>/scripts/.
+    """
+    return Path(__file__).resolve().parent.parent
+
+
+def _ensure_import_path() -> None:
+    """
+    Add project root to sys.path so local modules under `src/` are importable.
+    """
+    project_root = _resolve_project_root()
+    if str(project_root) not in sys.path:
+        sys.path.insert(0, str(project_root))
+
+
+def _memory_kb() -> Dict[str, int]:
+    """
+    VmRSS plus its private (RssAnon) and file-backed (RssFile) parts, in kB.
+    File-backed pages of read-only mappings are shared by every process that
+    maps the same file.
+    """
+    values: Dict[str, int] = {}
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            key, _, rest = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def _child(fmt: str, artifacts: Path, forest_dir: Path) -> None:
+    """
+    Load one artifact format in a fresh process and print its cost as JSON.
+    """
+    _ensure_import_path()
+
+    import joblib
+    import numpy as np
+    import sklearn.ensemble  # noqa: F401  (preloaded: code is not artifact memory)
+
+    from src.risk_analysis_service.ml_engine.predictor import ForestScorer
+
+    row = np.ones((1, 5))
+    before = _memory_kb()
+    started = time.perf_counter()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        if fmt.startswith("pickle"):
+            mmap_mode = "r" if fmt == "pickle-mmap" else None
+            model = joblib.load(artifacts / "model.pkl", mmap_mode=mmap_mode)
+            scaler = joblib.load(artifacts / "scaler.pkl")
+            loaded = time.perf_counter()
+            model.predict(scaler.transform(row))
+        else:
+            mmap_mode = "r" if fmt == "npy-mmap" else None
+            scorer = ForestScorer.load(forest_dir, mmap_mode=mmap_mode)
+            loaded = time.perf_counter()
+            scorer.predict(row)
+    first_prediction = time.perf_counter()
+    after = _memory_kb()
+    print(
+        json.dumps(
+            {
+                "load_ms": (loaded - started) * 1e3,
+                "first_predict_ms": (first_prediction - loaded) * 1e3,
+                **{key: after[key] - before[key] for key in after},
+            }
+        )
+    )
+
+
+def _measure(fmt: str, artifacts: Path, forest_dir: Path) -> Dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", fmt, str(artifacts), str(forest_dir)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    """
+    Report load time and resident memory added by the model artifacts in a
+    fresh process: joblib pickles (model.pkl/scaler.pkl, with and without
+    mmap_mode="r") against the flattened forest .npy arrays (copied or
+    memory-mapped). RssAnon is memory each worker pays for on its own; RssFile
+    is page cache shared between workers mapping the same files.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--artifacts",
+        type=Path,
+        default=_resolve_project_root() / "src" / "risk_analysis_service" / "ml_engine",
+        help="Directory holding model.pkl/scaler.pkl (default: ml_engine)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Processes per format (default: 5)"
+    )
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        fmt, artifacts, forest_dir = args.child
+        _child(fmt, Path(artifacts), Path(forest_dir))
+        return
+
+    _ensure_import_path()
+
+    import joblib
+
+    from src.risk_analysis_service.ml_engine.train_model import export_forest
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            forest_dir = export_forest(
+                joblib.load(args.artifacts / "model.pkl"),
+                joblib.load(args.artifacts / "scaler.pkl"),
+                Path(tmp) / "forest",
+            )
+        forest_kb = sum(p.stat().st_size for p in forest_dir.iterdir()) // 1024
+        model_kb = (args.artifacts / "model.pkl").stat().st_size // 1024
+        print(f"model.pkl {model_kb} kB, forest/*.npy {forest_kb} kB")
+
+        columns = ("load_ms", "first_predict_ms", "VmRSS", "RssAnon", "RssFile")
+        print(f"{'format':>12} " + " ".join(f"{name:>16}" for name in columns))
+        for fmt in FORMATS:
+            runs: List[Dict[str, float]] = [
+                _measure(fmt, args.artifacts, forest_dir)
+                for _ in range(max(1, args.repeat))
+            ]
+            medians = [statistics.median(run[name] for run in runs) for name in columns]
+            print(
+                f"{fmt:>12} "
+                + " ".join(f"{value:>16.1f}" for value in medians[:2])
+                + " "
+                + " ".join(f"{value:>13.0f} kB" for value in medians[2:])
+            )
+
+
+if __name__ == "__main__":
+    main()
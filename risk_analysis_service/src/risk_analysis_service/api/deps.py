@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import hmac
+import os
 import uuid
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy import select
@@ -52,3 +54,23 @@ def get_current_active_user(
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+def require_admin_token(
+    x_admin_token: Annotated[str | None, Header()] = None,
+) -> None:
+    """
+    Operator endpoints act on or report across every organization, so they are
+    guarded by the ADMIN_TOKEN shared secret (X-Admin-Token header), not by org
+    roles. MODEL_ADMIN_TOKEN is still honoured when ADMIN_TOKEN is unset.
+    """
+    expected = os.getenv("ADMIN_TOKEN") or os.getenv("MODEL_ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administration endpoints are disabled",
+        )
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token"
+        )
@@ -9,6 +9,8 @@ from .v1.endpoints import organizations as organizations_endpoints
 from .v1.endpoints import organization as organization_members_endpoints
 from .v1.endpoints import alerts as alerts_endpoints
 from .v1.endpoints import cloud_accounts as cloud_accounts_endpoints
+from .v1.endpoints import models as models_endpoints
+from .v1.endpoints import rules as rules_endpoints
 
 
 api_router = APIRouter()
@@ -25,3 +27,5 @@ api_router.include_router(resources_endpoints.router, prefix="/api/v1")
 api_router.include_router(profiles_endpoints.router, prefix="/api/v1")
 api_router.include_router(alerts_endpoints.router, prefix="/v1")
 api_router.include_router(cloud_accounts_endpoints.router, prefix="/api/v1")
+api_router.include_router(models_endpoints.router, prefix="/api/v1")
+api_router.include_router(rules_endpoints.router, prefix="/api/v1")
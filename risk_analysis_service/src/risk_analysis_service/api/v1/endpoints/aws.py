@@ -28,5 +28,6 @@ async def analyze_resource_endpoint(
         resource.resource_type,
     )
     risks = analyze_and_save_risks(db, resource)
+    db.commit()
     logger.info("POST /analyze/resource success: risks_saved=%d", len(risks))
     return risks
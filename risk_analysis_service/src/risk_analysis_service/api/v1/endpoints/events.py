@@ -32,8 +32,12 @@ def ingest_events(
         "POST /events/ingest received: events_count=%d", len(events) if events else 0
     )
     created_alerts = analyzer.analyze_events(
-        db, events, organization_id=current_user.organization_id
+        db, events, organization_id=current_user.organization_id, broadcast=False
     )
+    payloads = [analyzer.alert_payload(a) for a in created_alerts]
+    db.commit()
+    # Broadcast only alerts that are committed
+    analyzer.publish_alerts(payloads, current_user.organization_id)
     count = len(created_alerts)
     logger.info("POST /events/ingest success: alerts_created=%d", count)
     return {"alerts_created": count}
@@ -14,6 +14,7 @@ from ....db.models.entity_profile import EntityProfile
 from ....db.models.organization import User
 from ....db.session import get_db
 from ....schemas.entity_profile import EntityProfileResponse
+from ....services.profile_cache import profile_cache
 from ....schemas.identity import (
     IdentityDetailResponse,
     IdentityResponse,
@@ -100,6 +101,7 @@ def get_identity_detail(
         db.add(profile)
         db.commit()
         db.refresh(profile)
+        profile_cache.invalidate(profile.organization_id, profile.entity_id)
         logger.info("Created EntityProfile for identity %s", identity.id)
     else:
                                
@@ -107,6 +109,7 @@ def get_identity_detail(
             profile.cloud_identity_id = identity.id
             db.commit()
             db.refresh(profile)
+            profile_cache.invalidate(profile.organization_id, profile.entity_id)
 
     return IdentityDetailResponse(
         id=identity.id,
@@ -183,5 +186,6 @@ def update_identity_profile(
 
     db.commit()
     db.refresh(profile)
+    profile_cache.invalidate(profile.organization_id, profile.entity_id)
     logger.info("PATCH /identities/%s/profile success", identity_id)
     return profile
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from ....api.deps import require_admin_token
+from ....ml_engine.model_registry import BUILTIN_VERSION, get_registry
+from ....schemas.model_registry import (
+    ModelReloadRequest,
+    ModelReloadResponse,
+    ModelVersionsResponse,
+)
+
+router = APIRouter(tags=["Models"])
+logger = logging.getLogger("risk_analysis.api")
+
+
+@router.get("/models", response_model=ModelVersionsResponse)
+def list_models(_: None = Depends(require_admin_token)) -> ModelVersionsResponse:
+    """List registry versions, the active pointer and the version loaded here."""
+    registry = get_registry()
+    current = registry.current
+    return ModelVersionsResponse(
+        loaded_version=current.version if current else None,
+        active_version=registry.active_version(),
+        versions=registry.versions(),
+    )
+
+
+@router.post(
+    "/models/reload",
+    response_model=ModelReloadResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def reload_model(
+    payload: Optional[ModelReloadRequest] = None,
+    _: None = Depends(require_admin_token),
+) -> ModelReloadResponse:
+    """
+    Load a model version in the background and swap it in when ready.
+    With a version, it is also made current for every process watching the
+    registry; without one, the version named by the CURRENT pointer is reloaded.
+    """
+    registry = get_registry()
+    version = payload.version if payload else None
+    if version:
+        if version != BUILTIN_VERSION and version not in registry.versions():
+            raise HTTPException(status_code=404, detail="Model version not found")
+        logger.info("POST /models/reload: activating version %s", version)
+        registry.activate(version)
+    else:
+        version = registry.active_version() or BUILTIN_VERSION
+        logger.info("POST /models/reload: reloading version %s", version)
+        registry.reload_async(version)
+    return ModelReloadResponse(status="reloading", version=version)
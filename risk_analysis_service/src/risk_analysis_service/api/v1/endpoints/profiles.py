@@ -11,6 +11,7 @@ from ....db.session import get_db
 from ....db.models.entity_profile import EntityProfile
 from ....schemas.entity_profile import EntityProfileUpdate, EntityProfileResponse
 from ....api.deps import get_current_active_user
+from ....services.profile_cache import profile_cache
 from ....db.models.organization import User
 
 router = APIRouter(tags=["Profiles"])
@@ -112,5 +113,7 @@ def update_profile(
 
     db.commit()
     db.refresh(profile)
+    # Let the analyzer pick up the new settings on its next batch
+    profile_cache.invalidate(profile.organization_id, profile.entity_id)
     logger.info("PATCH /profiles?entity_id=%s success", entity_id)
     return profile
@@ -15,6 +15,8 @@ from ....schemas.resource import (
     ResourceDetailResponse,
     ResourceConfigUpdate,
 )
+from ....services.lookup_cache import resource_cache
+from ....rules.custom_rules import RuleSyntaxError, compile_custom_rules
 from ....api.deps import get_current_active_user
 from ....db.models.organization import User
 
@@ -22,6 +24,14 @@ router = APIRouter(tags=["Resources"])
 logger = logging.getLogger("risk_analysis.api")
 
 
+def _validate_custom_rules(custom_rules: Optional[dict]) -> None:
+    """Reject custom rule definitions the analyzer could not compile."""
+    try:
+        compile_custom_rules(custom_rules)
+    except RuleSyntaxError as exc:
+        raise HTTPException(status_code=422, detail=f"Invalid custom rules: {exc}")
+
+
 @router.post("/resources/", response_model=ResourceResponse)
 def upsert_resource(
     payload: ResourceUpsertRequest,
@@ -35,6 +45,7 @@ def upsert_resource(
         payload.resource_type,
         payload.criticality,
     )
+    _validate_custom_rules(payload.custom_rules)
 
     resource: Optional[CloudResource] = db.execute(
         select(CloudResource).where(
@@ -62,6 +73,7 @@ def upsert_resource(
             resource.custom_rules = payload.custom_rules
 
     db.commit()
+    resource_cache.invalidate(resource.organization_id, resource.resource_id)
     db.refresh(resource)
     logger.info("POST /resources/ success: id=%s", resource.resource_id)
     return resource
@@ -133,10 +145,12 @@ def update_resource(
             raise HTTPException(status_code=422, detail="Invalid criticality value")
 
     if payload.security_config is not None:
+        _validate_custom_rules(payload.security_config)
                                                       
         resource.custom_rules = payload.security_config
 
     db.add(resource)
     db.commit()
+    resource_cache.invalidate(resource.organization_id, resource.resource_id)
     db.refresh(resource)
     return resource
@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import os
+
+from fastapi import APIRouter, Depends
+
+from ....api.deps import require_admin_token
+from ....rules.registry import rule_stats
+from ....schemas.rule_stats import RuleStatsResponse
+
+router = APIRouter(tags=["Rules"])
+
+
+@router.get("/rules/stats", response_model=RuleStatsResponse)
+def get_rule_stats(_: None = Depends(require_admin_token)) -> RuleStatsResponse:
+    """
+    Per-rule evaluation, hit and error counts and check latency in this process
+    and its analysis shards (ANALYSIS_WORKERS). Events analyzed by standalone
+    consumer processes (python -m risk_analysis_service.consumer) are counted
+    there, not here; process_id identifies the process that answered.
+    """
+    return RuleStatsResponse(process_id=os.getpid(), **rule_stats())
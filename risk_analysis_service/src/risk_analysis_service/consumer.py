@@ -0,0 +1,149 @@
+"""
+Standalone Kafka consumer runner, independent of the API process.
+
+    python -m risk_analysis_service.consumer --processes 4
+
+Starts N consumer processes in the same consumer group, so Kafka spreads the
+topic partitions across them. The topics are grown to at least N partitions
+first; members beyond the partition count would sit idle. Run the API with
+ENABLE_KAFKA_CONSUMER=false when consumers are deployed this way. Alerts are
+still persisted, but live WebSocket broadcasts only reach clients connected to
+the process that ran the analysis, so API pods will not push them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from typing import Dict, Optional
+
+from .core.logging_config import configure_logging
+
+
+logger = logging.getLogger("risk_analysis.consumer")
+
+# Minimum delay before restarting a consumer process that exited unexpectedly
+RESTART_BACKOFF_SECONDS: float = 5.0
+
+
+async def _ensure_topics(num_partitions: int) -> None:
+    from .core.kafka_consumer import ensure_topics, topics_from_env
+
+    bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
+    await ensure_topics(bootstrap_servers, topics_from_env(), num_partitions)
+
+
+async def _consume(num_partitions: int) -> None:
+    """
+    Run one consumer until SIGTERM/SIGINT, then drain in-flight flushes and stop.
+    """
+    from .core.kafka_consumer import EventConsumer
+
+    consumer = EventConsumer(num_partitions=num_partitions)
+    await consumer.start()
+    task = asyncio.create_task(consumer.consume_loop())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await consumer.stop()
+
+
+def _run_worker(index: int, num_partitions: int) -> None:
+    configure_logging()
+    logger.info("Consumer process %d started (pid %d)", index, os.getpid())
+    asyncio.run(_consume(num_partitions))
+    logger.info("Consumer process %d stopped", index)
+
+
+class ConsumerSupervisor:
+    """
+    Keeps `processes` consumer processes running and restarts any that exit.
+    """
+
+    def __init__(self, processes: int, num_partitions: int) -> None:
+        self.processes = max(1, processes)
+        self.num_partitions = max(self.processes, num_partitions)
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: Dict[int, multiprocessing.Process] = {}
+        self._started_at: Dict[int, float] = {}
+        self._stopping = False
+
+    def _spawn(self, index: int) -> None:
+        proc = self._context.Process(
+            target=_run_worker,
+            args=(index, self.num_partitions),
+            name=f"risk-analysis-consumer-{index}",
+        )
+        proc.start()
+        self._workers[index] = proc
+        self._started_at[index] = time.monotonic()
+
+    def stop(self, *_: object) -> None:
+        self._stopping = True
+        for proc in self._workers.values():
+            if proc.is_alive():
+                proc.terminate()
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        try:
+            asyncio.run(_ensure_topics(self.num_partitions))
+        except Exception as exc:
+            logger.warning("Could not size Kafka topics: %s", exc)
+        for index in range(self.processes):
+            self._spawn(index)
+        logger.info(
+            "Started %d consumer processes for %d partitions",
+            self.processes,
+            self.num_partitions,
+        )
+        while not self._stopping:
+            for index, proc in list(self._workers.items()):
+                if proc.is_alive() or self._stopping:
+                    continue
+                logger.warning(
+                    "Consumer process %d exited with code %s", index, proc.exitcode
+                )
+                elapsed = time.monotonic() - self._started_at[index]
+                if elapsed < RESTART_BACKOFF_SECONDS:
+                    time.sleep(RESTART_BACKOFF_SECONDS - elapsed)
+                if not self._stopping:
+                    self._spawn(index)
+            time.sleep(1.0)
+        for proc in self._workers.values():
+            proc.join()
+        return 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the Kafka event consumers.")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=int(os.getenv("CONSUMER_PROCESSES", "1")),
+        help="Consumer processes to run (default: CONSUMER_PROCESSES or 1)",
+    )
+    parser.add_argument(
+        "--partitions",
+        type=int,
+        default=int(os.getenv("KAFKA_TOPIC_PARTITIONS", "0")),
+        help="Minimum partitions per topic (default: at least --processes)",
+    )
+    args = parser.parse_args(argv)
+    configure_logging()
+    return ConsumerSupervisor(args.processes, args.partitions).run()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+"""
+Decoding helpers for the Kafka consumer hot path: JSON parsing, payload
+normalization and batch validation into GenericAuditEvent models.
+Kept free of DB/Kafka imports so the path can be benchmarked in isolation.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter, ValidationError
+
+from ..schemas.audit_event import GenericAuditEvent
+from .normalizers import registry as normalizer_registry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+if orjson is None:
+    # Logged once, at import: the consumer still works but decodes slower
+    logger.warning("orjson is not installed; falling back to stdlib json decoding")
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can keep
+# catching the stdlib exception regardless of the parser in use.
+JSONDecodeError = json.JSONDecodeError
+
+_EVENTS_ADAPTER: TypeAdapter[List[GenericAuditEvent]] = TypeAdapter(
+    List[GenericAuditEvent]
+)
+
+
+def loads_json(raw: bytes | bytearray | memoryview | str) -> Any:
+    """
+    Parse a Kafka value straight from bytes. Uses orjson when installed and the
+    stdlib otherwise; invalid UTF-8 is retried with replacement characters.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            if isinstance(raw, str):
+                raise
+            return orjson.loads(bytes(raw).decode("utf-8", errors="replace"))
+    try:
+        return json.loads(raw)
+    except UnicodeDecodeError:
+        return json.loads(bytes(raw).decode("utf-8", errors="replace"))
+
+
+def validate_events(
+    items: List[Dict[str, Any]],
+) -> Tuple[List[GenericAuditEvent | None], List[Tuple[int, Exception]]]:
+    """
+    Validate a whole batch of normalized event dicts in one TypeAdapter call.
+    If any item is invalid, falls back to per-item validation so only the bad
+    items are dropped. Returns (events aligned with items, None where invalid)
+    and a list of (index, error) for the failures.
+    """
+    if not items:
+        return [], []
+    try:
+        return list(_EVENTS_ADAPTER.validate_python(items)), []
+    except ValidationError:
+        pass
+    events: List[GenericAuditEvent | None] = []
+    errors: List[Tuple[int, Exception]] = []
+    for idx, item in enumerate(items):
+        try:
+            events.append(GenericAuditEvent.model_validate(item))
+        except Exception as exc:
+            events.append(None)
+            errors.append((idx, exc))
+    return events, errors
+
+
+def to_generic_event_payload(
+    payload: Dict[str, Any], provider_hint: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Adapt various incoming payload shapes (AWS CloudTrail, Azure Activity Log,
+    GCP Audit Log, or already-normalized events) into the GenericAuditEvent dict
+    expected by validation. provider_hint (e.g. from a Kafka header) skips shape
+    detection.
+    """
+    normalized = normalizer_registry.normalize(payload, provider_hint)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Normalized event for validation: %r", normalized)
+    return normalized
+
+
+def source_event_id(
+    payload: Dict[str, Any], provider_hint: Optional[str] = None
+) -> Optional[str]:
+    """
+    The provider event id of a raw payload, read without a full normalization so
+    duplicates can be dropped early. None if the payload has no id.
+    """
+    return normalizer_registry.event_id(payload, provider_hint)
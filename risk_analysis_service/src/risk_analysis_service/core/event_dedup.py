@@ -0,0 +1,51 @@
+"""
+Bounded in-memory record of recently persisted (organization_id, event_id) keys.
+
+Used by the Kafka consumer to drop re-delivered events before normalization.
+It is only a pre-filter: a miss (evicted key, another consumer process) is
+still caught by the unique index on audit_events. An exact LRU is used rather
+than a Bloom filter because a false positive would silently drop a new event.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable
+
+
+class RecentEventKeys:
+    """
+    Thread-safe LRU set with a fixed capacity; capacity 0 disables it.
+    """
+
+    def __init__(self, capacity: int = 200_000) -> None:
+        self.capacity = max(0, int(capacity))
+        self._keys: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        if not self.capacity:
+            return False
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                return True
+            return False
+
+    def add_many(self, keys: Iterable[Hashable]) -> None:
+        if not self.capacity:
+            return
+        with self._lock:
+            for key in keys:
+                self._keys[key] = None
+                self._keys.move_to_end(key)
+            while len(self._keys) > self.capacity:
+                self._keys.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys.clear()
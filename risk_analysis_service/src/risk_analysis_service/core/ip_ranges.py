@@ -0,0 +1,133 @@
+"""
+IP range index: CIDR lists merged into sorted, non-overlapping integer intervals
+per address family, queried with binary search.
+"""
+
+from __future__ import annotations
+
+import ipaddress
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+
+def _merge(intervals: List[Tuple[int, int]]) -> Tuple[List[int], List[int]]:
+    """
+    Merge overlapping or adjacent [start, end] intervals; returns sorted starts
+    and the matching ends.
+    """
+    starts: List[int] = []
+    ends: List[int] = []
+    for start, end in sorted(intervals):
+        if ends and start <= ends[-1] + 1:
+            if end > ends[-1]:
+                ends[-1] = end
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+class IPRangeIndex:
+    """
+    Membership index over a list of CIDRs (IPv4 and IPv6). Invalid CIDRs are
+    skipped and counted in `invalid`. An address only matches networks of its
+    own family, as with ipaddress containment.
+    """
+
+    __slots__ = ("_v4", "_v6", "_v4_arrays", "invalid")
+
+    def __init__(self, cidrs: Iterable[str]) -> None:
+        v4: List[Tuple[int, int]] = []
+        v6: List[Tuple[int, int]] = []
+        invalid = 0
+        for cidr in cidrs:
+            try:
+                network = ipaddress.ip_network(cidr, strict=False)
+            except (TypeError, ValueError):
+                invalid += 1
+                continue
+            interval = (
+                int(network.network_address),
+                int(network.broadcast_address),
+            )
+            (v4 if network.version == 4 else v6).append(interval)
+        self._v4 = _merge(v4)
+        self._v6 = _merge(v6)
+        # IPv4 bounds fit in int64, so batch lookups can use np.searchsorted
+        self._v4_arrays = (
+            np.asarray(self._v4[0], dtype=np.int64),
+            np.asarray(self._v4[1], dtype=np.int64),
+        )
+        self.invalid = invalid
+
+    def __len__(self) -> int:
+        """Number of merged intervals."""
+        return len(self._v4[0]) + len(self._v6[0])
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    @staticmethod
+    def _lookup(bounds: Tuple[List[int], List[int]], value: int) -> bool:
+        starts, ends = bounds
+        i = bisect_right(starts, value) - 1
+        return i >= 0 and value <= ends[i]
+
+    def contains(self, ip_str: str) -> bool:
+        """
+        True if the address falls in any range; unparsable input never matches.
+        """
+        if not ip_str or not self:
+            return False
+        try:
+            ip_obj = ipaddress.ip_address(ip_str)
+        except ValueError:
+            return False
+        bounds = self._v4 if ip_obj.version == 4 else self._v6
+        return self._lookup(bounds, int(ip_obj))
+
+    def __contains__(self, ip_str: str) -> bool:
+        return self.contains(ip_str)
+
+    def contains_many(self, ips: Sequence[str]) -> np.ndarray:
+        """
+        Vectorized contains() over a batch of address strings. Each distinct
+        address is parsed once; IPv4 lookups run as a single np.searchsorted.
+        Returns a bool array aligned with `ips`.
+        """
+        result = np.zeros(len(ips), dtype=bool)
+        if not len(ips) or not self:
+            return result
+
+        positions: Dict[str, int] = {}
+        codes = np.empty(len(ips), dtype=np.int64)
+        for i, ip in enumerate(ips):
+            codes[i] = positions.setdefault(ip, len(positions))
+
+        unique_hits = np.zeros(len(positions), dtype=bool)
+        v4_slots: List[int] = []
+        v4_values: List[int] = []
+        for ip, slot in positions.items():
+            if not ip:
+                continue
+            try:
+                ip_obj = ipaddress.ip_address(ip)
+            except ValueError:
+                continue
+            if ip_obj.version == 4:
+                v4_slots.append(slot)
+                v4_values.append(int(ip_obj))
+            else:
+                unique_hits[slot] = self._lookup(self._v6, int(ip_obj))
+
+        starts, ends = self._v4_arrays
+        if v4_slots and len(starts):
+            values = np.asarray(v4_values, dtype=np.int64)
+            idx = np.searchsorted(starts, values, side="right") - 1
+            hit = (idx >= 0) & (values <= ends[np.maximum(idx, 0)])
+            unique_hits[np.asarray(v4_slots, dtype=np.int64)] = hit
+
+        result[:] = unique_hits[codes]
+        return result
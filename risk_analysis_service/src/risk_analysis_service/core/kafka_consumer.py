@@ -1,14 +1,16 @@
 import asyncio
 import os
-import json
 import logging
-from typing import Optional, Any, Dict, List, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, Deque, Dict, List, Sequence, Tuple
 from uuid import uuid4, UUID
 from datetime import datetime
 import time
 
-from aiokafka import AIOKafkaConsumer
-from aiokafka.admin import AIOKafkaAdminClient
+from aiokafka import AIOKafkaConsumer, TopicPartition
+from aiokafka.abc import ConsumerRebalanceListener
+from aiokafka.admin import AIOKafkaAdminClient, NewPartitions
 from aiokafka.admin.new_topic import NewTopic
 from aiokafka.errors import (
     TopicAlreadyExistsError,
@@ -18,13 +20,118 @@ from aiokafka.errors import (
 
 from ..db.session import SessionLocal
 from ..schemas.audit_event import GenericAuditEvent
+from .event_decoding import (
+    JSONDecodeError,
+    loads_json,
+    source_event_id,
+    to_generic_event_payload,
+    validate_events,
+)
+from .event_dedup import RecentEventKeys
 from ..services.event_analyzer import EventAnalyzerService
-from ..db.models.audit_event import AuditEvent
-from ..db.models.cloud_identity import CloudIdentity, IdentityType
+from ..services.analysis_pool import ShardedAnalysisPool
+from ..services.lookup_cache import identity_cache
+from ..db.repositories.audit_event_repository import AuditEventRepository
+from ..db.models.cloud_identity import IdentityType
+from ..db.repositories.cloud_identity_repository import CloudIdentityRepository
 
 
 logger = logging.getLogger(__name__)
 
+# Per-partition (first, last) offsets of the messages covered by one flush
+OffsetRange = Dict[TopicPartition, Tuple[int, int]]
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() not in {"0", "false", "no"}
+
+
+async def ensure_topics(
+    bootstrap_servers: str, topics: Sequence[str], num_partitions: int = 1
+) -> None:
+    """
+    Ensure the topics exist with at least num_partitions partitions: create
+    missing ones and grow existing ones. Errors are logged, not raised.
+    """
+    admin = AIOKafkaAdminClient(bootstrap_servers=bootstrap_servers)
+    try:
+        await admin.start()
+        try:
+            existing_topics = set(await admin.list_topics())
+            to_create = [t for t in topics if t not in existing_topics]
+            if to_create:
+                await admin.create_topics(
+                    [
+                        NewTopic(
+                            name=t, num_partitions=num_partitions, replication_factor=1
+                        )
+                        for t in to_create
+                    ]
+                )
+                logger.info("Created Kafka topics %s", to_create)
+            existing = [t for t in topics if t in existing_topics]
+            if existing and num_partitions > 1:
+                await _grow_partitions(admin, existing, num_partitions)
+        except TopicAlreadyExistsError:
+            # Benign race: topic appeared between list and create
+            logger.debug("Topic(s) already exist")
+        except (KafkaConnectionError, KafkaError) as exc:
+            logger.warning("Could not verify/create topics %s: %s", topics, exc)
+        except Exception as exc:
+            logger.warning("Unexpected error ensuring topics %s: %s", topics, exc)
+    finally:
+        try:
+            await admin.close()
+        except Exception:
+            pass
+
+
+async def _grow_partitions(
+    admin: AIOKafkaAdminClient, topics: List[str], num_partitions: int
+) -> None:
+    # Partitions can only be added; existing records keep their partition
+    to_grow: Dict[str, NewPartitions] = {}
+    for meta in await admin.describe_topics(topics):
+        count = len(meta.get("partitions") or [])
+        if 0 < count < num_partitions:
+            to_grow[meta["topic"]] = NewPartitions(total_count=num_partitions)
+    if to_grow:
+        await admin.create_partitions(to_grow)
+        logger.info(
+            "Increased Kafka topics %s to %d partitions", list(to_grow), num_partitions
+        )
+
+
+def topics_from_env(topic: str = "cloud_audit_events") -> Tuple[str, str]:
+    """
+    (audit events topic, identities topic) after environment overrides.
+    """
+    return (
+        os.getenv("KAFKA_TOPIC", topic),
+        os.getenv("KAFKA_IDENTITIES_TOPIC", "cloud_identities"),
+    )
+
+
+class _FlushOnRevoke(ConsumerRebalanceListener):
+    """
+    Persist and commit everything consumed from partitions before they are
+    handed to another group member, so manual-commit mode does not replay them.
+    """
+
+    def __init__(self, consumer: "EventConsumer") -> None:
+        self._owner = consumer
+
+    async def on_partitions_revoked(self, revoked: Any) -> None:
+        if revoked:
+            await self._owner._drain_flushes()
+            await self._owner._wait_for_commits()
+
+    async def on_partitions_assigned(self, assigned: Any) -> None:
+        pass
+
 
 class EventConsumer:
     def __init__(
@@ -34,22 +141,30 @@ class EventConsumer:
         group_id: str = "risk-analysis-service",
         auto_offset_reset: str = "earliest",
         enable_auto_commit: bool = True,
+        num_partitions: Optional[int] = None,
     ) -> None:
         """
         Initialize Kafka consumer for audit events and cloud identities.
+        num_partitions is the minimum partition count ensured for both topics.
         """
         # Allow environment overrides
         bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS", bootstrap_servers)
-        audit_topic = os.getenv("KAFKA_TOPIC", topic)
-        identities_topic = os.getenv("KAFKA_IDENTITIES_TOPIC", "cloud_identities")
+        audit_topic, identities_topic = topics_from_env(topic)
         group_id = os.getenv("KAFKA_GROUP_ID", group_id)
+        enable_auto_commit = _env_flag("KAFKA_ENABLE_AUTO_COMMIT", enable_auto_commit)
 
         self._audit_topic = audit_topic
         self._identities_topic = identities_topic
         self._topics: tuple[str, str] = (audit_topic, identities_topic)
         self._bootstrap_servers = bootstrap_servers
+        if num_partitions is None:
+            num_partitions = int(os.getenv("KAFKA_TOPIC_PARTITIONS", "1"))
+        self._num_partitions = max(1, num_partitions)
+        # With auto-commit disabled the consumer runs at-least-once: offsets are
+        # committed only after the flush covering them has been persisted.
+        self._manual_commit = not enable_auto_commit
+        self._async_commit = _env_flag("KAFKA_ASYNC_COMMIT", True)
         self._consumer: Optional[AIOKafkaConsumer] = AIOKafkaConsumer(
-            *self._topics,
             bootstrap_servers=bootstrap_servers,
             group_id=group_id,
             auto_offset_reset=auto_offset_reset,
@@ -57,48 +172,71 @@ class EventConsumer:
         )
         # Reuse analyzer across messages to avoid reloading artifacts
         self._analyzer = EventAnalyzerService()
+        # With ANALYSIS_WORKERS > 0 analysis runs in that many worker processes,
+        # sharded by organization; the in-process analyzer only broadcasts alerts.
+        analysis_workers = int(os.getenv("ANALYSIS_WORKERS", "0"))
+        self._analysis_pool: Optional[ShardedAnalysisPool] = (
+            ShardedAnalysisPool(analysis_workers) if analysis_workers > 0 else None
+        )
+        # audit_events are written with COPY FROM STDIN unless disabled
+        self._use_copy = _env_flag("AUDIT_EVENTS_USE_COPY", True)
         self._running = False
         # Batch buffer and settings
         # Buffer of (organization_id, GenericAuditEvent)
         self.batch: List[Tuple[UUID, GenericAuditEvent]] = []
+        # (organization_id, event_id) of events in self.batch
+        self._batch_keys: set[Tuple[UUID, str]] = set()
+        # Keys of recently persisted events; re-deliveries are dropped on sight
+        self._recent_events = RecentEventKeys(
+            int(os.getenv("EVENT_DEDUP_CACHE_SIZE", "200000"))
+        )
+        self.duplicates_skipped: int = 0
+        # Pending CloudIdentity rows keyed by (organization_id, identity_arn)
+        self.identity_batch: Dict[Tuple[UUID, str], Dict[str, Any]] = {}
         self.BATCH_SIZE: int = 50
+        self.IDENTITY_BATCH_SIZE: int = 1000
         self.FLUSH_INTERVAL: float = 5.0
         self._last_flush_time: float = time.monotonic()
+        # Flushes run on a dedicated worker thread so the event loop keeps
+        # polling Kafka and serving the API. The single worker executes batches
+        # one at a time in consumption order, so identity upserts, profile links,
+        # streaming windows and alerts of consecutive batches never interleave;
+        # at most MAX_INFLIGHT_FLUSHES batches are queued or running.
+        self.MAX_INFLIGHT_FLUSHES: int = max(
+            1, int(os.getenv("KAFKA_MAX_INFLIGHT_FLUSHES", "2"))
+        )
+        self._flush_executor: Optional[ThreadPoolExecutor] = None
+        self._inflight_flushes: Deque[Tuple[asyncio.Future, OffsetRange]] = deque()
+        # Offsets consumed since the last scheduled flush (manual-commit mode)
+        self._consumed_offsets: OffsetRange = {}
+        # Next offsets to commit, merged while a commit request is in flight
+        self._pending_commit: Dict[TopicPartition, int] = {}
+        self._commit_task: Optional[asyncio.Task] = None
+        # The consume loop and the rebalance listener both reap flushes; resolving
+        # a flush (commit or rewind) is serialized so offsets advance in order
+        self._flush_lock = asyncio.Lock()
+        # A failed batch is redelivered with exponential backoff; after
+        # MAX_FLUSH_ATTEMPTS failures from the same offsets (e.g. a deterministic
+        # constraint violation) it is skipped with an error so the partition
+        # does not stall.
+        self.MAX_FLUSH_ATTEMPTS: int = max(
+            1, int(os.getenv("KAFKA_MAX_FLUSH_ATTEMPTS", "5"))
+        )
+        self.FLUSH_RETRY_BACKOFF: float = float(
+            os.getenv("KAFKA_FLUSH_RETRY_BACKOFF_SECONDS", "1")
+        )
+        self.FLUSH_RETRY_MAX_BACKOFF: float = float(
+            os.getenv("KAFKA_FLUSH_RETRY_MAX_BACKOFF_SECONDS", "60")
+        )
+        # Per partition: (first offset of the failing batch, failed attempts)
+        self._flush_failures: Dict[TopicPartition, Tuple[int, int]] = {}
+        self.batches_skipped: int = 0
 
     async def _ensure_topic_exists(self) -> None:
         """
         Ensure the consumer topic exists. Try to create if missing.
         """
-        admin = AIOKafkaAdminClient(bootstrap_servers=self._bootstrap_servers)
-        try:
-            await admin.start()
-            try:
-                existing_topics = set(await admin.list_topics())
-                to_create = [t for t in self._topics if t not in existing_topics]
-                if to_create:
-                    await admin.create_topics(
-                        [
-                            NewTopic(name=t, num_partitions=1, replication_factor=1)
-                            for t in to_create
-                        ]
-                    )
-                    logger.info("Created Kafka topics %s", to_create)
-            except TopicAlreadyExistsError:
-                # Benign race: topic appeared between list and create
-                logger.debug("Topic(s) already exist")
-            except (KafkaConnectionError, KafkaError) as exc:
-                logger.warning(
-                    "Could not verify/create topics %s: %s", self._topics, exc
-                )
-            except Exception as exc:
-                logger.warning(
-                    "Unexpected error ensuring topics %s: %s", self._topics, exc
-                )
-        finally:
-            try:
-                await admin.close()
-            except Exception:
-                pass
+        await ensure_topics(self._bootstrap_servers, self._topics, self._num_partitions)
 
     def _msg_ctx(self, msg: Any) -> Dict[str, Any]:
         """
@@ -113,10 +251,11 @@ class EventConsumer:
     def _normalize_raw(self, raw: Any, msg: Any) -> Optional[Any]:
         """
         Normalize raw Kafka value: handle None, bytes, and strings.
-        Returns normalized raw (str or dict) or None to skip.
+        Bytes are passed through undecoded for the JSON parser.
+        Returns normalized raw (bytes, str or dict) or None to skip.
         """
-        ctx = self._msg_ctx(msg)
         if raw is None:
+            ctx = self._msg_ctx(msg)
             logger.warning(
                 "Received null message on %s partition %s offset %s; skipping",
                 ctx["topic"],
@@ -126,7 +265,8 @@ class EventConsumer:
             return None
 
         if isinstance(raw, (bytes, bytearray)):
-            if len(raw) == 0:
+            if len(raw) == 0 or raw.isspace():
+                ctx = self._msg_ctx(msg)
                 logger.warning(
                     "Received empty bytes payload on %s partition %s offset %s; skipping",
                     ctx["topic"],
@@ -134,14 +274,11 @@ class EventConsumer:
                     ctx["offset"],
                 )
                 return None
-            try:
-                raw = raw.decode("utf-8")
-            except Exception:
-                raw = raw.decode("utf-8", errors="replace")
+            return raw
 
         if isinstance(raw, str):
-            raw = raw.strip()
-            if not raw:
+            if not raw or raw.isspace():
+                ctx = self._msg_ctx(msg)
                 logger.warning(
                     "Received blank string payload on %s partition %s offset %s; skipping",
                     ctx["topic"],
@@ -157,11 +294,11 @@ class EventConsumer:
         Convert normalized raw into a dict payload. Returns None to skip.
         May raise json.JSONDecodeError for invalid JSON strings.
         """
-        ctx = self._msg_ctx(msg)
-        logger.info("Parsing payload: %r", raw)
-        payload = raw if isinstance(raw, dict) else json.loads(raw)
-        logger.info("Parsed payload: %r", payload)
+        payload = raw if isinstance(raw, dict) else loads_json(raw)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Parsed payload: %r", payload)
         if not isinstance(payload, dict):
+            ctx = self._msg_ctx(msg)
             logger.warning(
                 "Ignoring non-object JSON payload on %s partition %s offset %s: %r",
                 ctx["topic"],
@@ -172,9 +309,10 @@ class EventConsumer:
             return None
         return payload
 
-    def _upsert_cloud_identity(self, payload: Dict[str, Any]) -> None:
+    def _buffer_cloud_identity(self, payload: Dict[str, Any]) -> None:
         """
-        Upsert CloudIdentity for the given organization and identity ARN.
+        Buffer a CloudIdentity upsert for the given organization and identity ARN;
+        the next flush writes all buffered identities in a single statement.
         Expected payload keys:
           - organization_id (UUID or str)
           - identity_arn (str)
@@ -218,271 +356,466 @@ class EventConsumer:
             except Exception:
                 created_at_dt = None
 
-        db = SessionLocal()
-        try:
-            from sqlalchemy import select
-
-            stmt = select(CloudIdentity).where(
-                CloudIdentity.organization_id == org_id,
-                CloudIdentity.identity_arn == identity_arn,
-            )
-            existing = db.execute(stmt).scalars().first()
-            if existing:
-                existing.identity_name = identity_name
-                existing.identity_type = identity_type
-                existing.is_mfa_enabled = is_mfa_enabled
-                if created_at_dt and existing.created_at is None:
-                    existing.created_at = created_at_dt
-                db.add(existing)
-                logger.info(
-                    "Updated CloudIdentity for org=%s arn=%s", org_id, identity_arn
-                )
-            else:
-                obj = CloudIdentity(
-                    organization_id=org_id,
-                    identity_arn=identity_arn,
-                    identity_name=identity_name,
-                    identity_type=identity_type,
-                    is_mfa_enabled=is_mfa_enabled,
-                    created_at=created_at_dt,
-                )
-                db.add(obj)
-                logger.info(
-                    "Inserted CloudIdentity for org=%s arn=%s", org_id, identity_arn
-                )
-            db.commit()
-        except Exception as exc:
-            logger.exception("Upsert CloudIdentity failed: %s", exc)
-            try:
-                db.rollback()
-            except Exception:
-                pass
-        finally:
-            try:
-                db.close()
-            except Exception:
-                pass
+        # Last write wins for the same ARN within one flush
+        self.identity_batch[(org_id, identity_arn)] = {
+            "id": uuid4(),
+            "organization_id": org_id,
+            "identity_arn": identity_arn,
+            "identity_name": identity_name,
+            "identity_type": identity_type,
+            "is_mfa_enabled": is_mfa_enabled,
+            "created_at": created_at_dt,
+        }
 
-    def _process_payload(self, db: Any, payload: Dict[str, Any]) -> None:
+    @staticmethod
+    def _provider_hint(msg: Any) -> Optional[str]:
+        """
+        Return the producer-declared provider/log format from the
+        `cloud_provider` Kafka header, if present.
         """
-        Validate payload into domain model and buffer it for batch processing.
+        for key, value in getattr(msg, "headers", None) or ():
+            if key == "cloud_provider" and value:
+                return value.decode("utf-8", errors="replace")
+        return None
+
+    def _process_payload(
+        self, payload: Dict[str, Any], provider_hint: Optional[str] = None
+    ) -> Optional[Tuple[UUID, Dict[str, Any]]]:
+        """
+        Resolve the organization and normalize the payload into a GenericAuditEvent
+        dict. Validation happens per poll in _buffer_events. Returns None to skip.
         """
         # Extract and validate organization_id directly from payload (required for multi-tenancy)
         org_raw = payload.get("organization_id")
         if not org_raw:
             logger.warning("Dropping payload without organization_id: %r", payload)
-            return
+            return None
         try:
             org_id: UUID = UUID(str(org_raw))
         except Exception:
             logger.warning(
                 "Dropping payload with invalid organization_id %r: %r", org_raw, payload
             )
-            return
-        event_dict = self._to_generic_event_payload(payload)
-        event = GenericAuditEvent.model_validate(event_dict)
-        # In batch mode we do not analyze per-message; buffer and let flush handle persistence + analysis
-        self.batch.append((org_id, event))
-
-    def _to_generic_event_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        """
-        Adapt various incoming payload shapes (e.g., AWS CloudTrail-like under 'raw')
-        into the GenericAuditEvent dict expected by validation.
-        """
-        # Prefer nested 'raw' if present; otherwise use payload itself
-        raw = payload.get("raw") if isinstance(payload, dict) else None
-        raw = raw if isinstance(raw, dict) else payload
-
-        # Helper getters with graceful fallbacks
-        def _get_event_time() -> Any:
-            # Accept existing normalized field
-            v = (
-                payload.get("event_time")
-                or raw.get("event_time")
-                or raw.get("eventTime")
-            )
-            return v
-
-        def _get_actor_identity() -> Optional[str]:
-            v = (
-                payload.get("actor_identity")
-                or raw.get("actor_identity")
-                or (raw.get("userIdentity") or {}).get("userName")
-                or (raw.get("userIdentity") or {}).get("arn")
-                or raw.get("AccessKeyId")
-            )
-            return v
-
-        def _get_actor_ip() -> Optional[str]:
-            v = (
-                payload.get("actor_ip_address")
-                or raw.get("actor_ip_address")
-                or raw.get("sourceIPAddress")
-                or payload.get("ip")
-            )
-            return v
-
-        def _get_action_name() -> Optional[str]:
-            v = (
-                payload.get("action_name")
-                or raw.get("action_name")
-                or raw.get("eventName")
-            )
-            return v
-
-        def _get_target_resource() -> Optional[str]:
-            if "target_resource" in payload:
-                return payload.get("target_resource")
-            if "target_resource" in raw:
-                return raw.get("target_resource")
-            req = raw.get("requestParameters") or {}
-            # Try common AWS params
-            bucket = req.get("bucketName") or req.get("bucket") or req.get("name")
-            key = req.get("key") or req.get("objectKey")
-            instance = (
-                req.get("instanceId") or req.get("instanceIds") or req.get("imageId")
-            )
-            resource = None
-            if bucket and key:
-                resource = f"s3://{bucket}/{key}"
-            elif bucket:
-                resource = f"s3://{bucket}"
-            elif instance:
-                resource = str(instance)
-            # Fallback to event source/service if available
-            if not resource:
-                resource = (
-                    raw.get("eventSource") or req.get("resource") or req.get("groupId")
-                )
-            return resource
-
-        def _get_event_status() -> str:
-            v = payload.get("event_status") or raw.get("event_status")
-            if v:
-                return str(v)
-            # Infer from typical AWS fields
-            if raw.get("errorCode") or raw.get("errorMessage"):
-                return "FAILURE"
-            # Some events include responseElements = None on failure
-            if "responseElements" in raw and raw.get("responseElements") is None:
-                return "FAILURE"
-            return "SUCCESS"
-
-        def _get_cloud_provider() -> str:
-            v = payload.get("cloud_provider") or raw.get("cloud_provider")
-            if v:
-                return str(v)
-            # Heuristic: presence of AWS-specific fields
-            aws_hints = (
-                "awsRegion",
-                "eventSource",
-                "eventName",
-                "userIdentity",
-                "AccessKeyId",
-            )
-            if any(h in raw for h in aws_hints):
-                return "AWS"
-            return "AWS"
-
-        def _get_event_id() -> str:
-            return (
-                payload.get("event_id")
-                or raw.get("event_id")
-                or raw.get("eventID")
-                or str(uuid4())
-            )
-
-        # Build normalized dict for GenericAuditEvent
-        normalized: Dict[str, Any] = {
-            "event_id": _get_event_id(),
-            "event_time": _get_event_time(),
-            "actor_identity": _get_actor_identity() or "",
-            "actor_ip_address": _get_actor_ip() or "",
-            "action_name": _get_action_name() or "",
-            "target_resource": _get_target_resource() or "",
-            "event_status": _get_event_status(),
-            # Let Pydantic coerce to UUID
-            "organization_id": payload.get("organization_id"),
-            "cloud_provider": _get_cloud_provider(),
-            "raw_log": raw if isinstance(raw, dict) else {"raw": raw},
-        }
-
-        # If event_time is Unix epoch seconds, convert to ISO; otherwise let Pydantic parse
-        et = normalized.get("event_time")
-        if isinstance(et, (int, float)):
-            try:
-                normalized["event_time"] = (
-                    datetime.utcfromtimestamp(float(et)).isoformat() + "Z"
-                )
-            except Exception:
-                pass
+            return None
+        event_id = source_event_id(payload, provider_hint)
+        if event_id is not None and self._is_duplicate((org_id, event_id)):
+            self.duplicates_skipped += 1
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Skipping duplicate event %s for org %s", event_id, org_id)
+            return None
+        return org_id, to_generic_event_payload(payload, provider_hint)
 
-        logger.debug("Normalized event for validation: %r", normalized)
-        return normalized
+    def _is_duplicate(self, key: Tuple[UUID, str]) -> bool:
+        return key in self._batch_keys or key in self._recent_events
 
-    def _flush(self) -> None:
+    def _buffer_events(self, pending: List[Tuple[UUID, Dict[str, Any]]]) -> None:
         """
-        Persist buffered events and run analysis in a single DB transaction.
+        Validate all events from one poll in a single batch and buffer them.
         """
-        if not self.batch:
+        if not pending:
             return
+        events, errors = validate_events([event_dict for _, event_dict in pending])
+        for idx, exc in errors:
+            logger.warning(
+                "Dropping event %r that failed validation: %s",
+                pending[idx][1].get("event_id"),
+                exc,
+            )
+        for (org_id, _), event in zip(pending, events):
+            if event is None:
+                continue
+            # Duplicates within the same poll
+            key = (org_id, event.event_id)
+            if key in self._batch_keys:
+                self.duplicates_skipped += 1
+                continue
+            self._batch_keys.add(key)
+            self.batch.append((org_id, event))
+
+    def _flush(
+        self,
+        batch: Optional[List[Tuple[UUID, GenericAuditEvent]]] = None,
+        identities: Optional[List[Dict[str, Any]]] = None,
+        ticket: Optional[int] = None,
+    ) -> bool:
+        """
+        Upsert buffered identities, persist buffered events and run analysis in a
+        single DB transaction. When no batch is given, the current buffers are
+        flushed and cleared. Runs synchronously; the consume loop dispatches it to
+        the flush executor. Returns True once the data is committed; identities
+        whose upsert fails are logged and dropped without failing the events.
+        With an analysis pool, events are committed first and analysis then runs
+        in the organization's shard; ticket is the pool slot reserved for this
+        batch so shards receive batches in consumption order.
+        """
+        if batch is None:
+            batch = self.batch
+            identities = list(self.identity_batch.values())
+            self.batch = []
+            self._batch_keys = set()
+            self.identity_batch = {}
+            self._last_flush_time = time.monotonic()
+        identities = identities or []
+        if not batch and not identities:
+            self._release_ticket(ticket)
+            return True
         db = SessionLocal()
         try:
-            # Step 1: Persist all events (with per-record organization_id)
-            orm_events: List[AuditEvent] = []
-            for org_id, e in self.batch:
-                orm_events.append(
-                    AuditEvent(
-                        event_time=e.event_time,
-                        actor_identity=e.actor_identity or None,
-                        action_name=e.action_name or None,
-                        target_resource=e.target_resource or None,
-                        actor_ip_address=e.actor_ip_address or None,
-                        event_status=str(
+            # Step 0: Upsert identities first so analysis sees them. They run in
+            # a SAVEPOINT: a failing upsert is rolled back on its own and must
+            # not cost the batch its events
+            upserted_arns: Dict[UUID, List[str]] = {}
+            if identities:
+                try:
+                    with db.begin_nested():
+                        CloudIdentityRepository(db).upsert_many(identities)
+                    upserted_arns = self._identity_arns(identities)
+                except Exception as exc:
+                    logger.exception(
+                        "Failed to upsert %d cloud identities; persisting events "
+                        "without them: %s",
+                        len(identities),
+                        exc,
+                    )
+            self._invalidate_identities(upserted_arns)
+
+            # Step 1: Persist new events (with per-record organization_id); rows
+            # already stored for the same (organization_id, event_id) are skipped
+            rows: List[Dict[str, Any]] = []
+            for org_id, e in batch:
+                rows.append(
+                    {
+                        "event_id": e.event_id,
+                        "event_time": e.event_time,
+                        "actor_identity": e.actor_identity or None,
+                        "action_name": e.action_name or None,
+                        "target_resource": e.target_resource or None,
+                        "actor_ip_address": e.actor_ip_address or None,
+                        "event_status": str(
                             e.event_status.value
                             if hasattr(e.event_status, "value")
                             else e.event_status
                         ),
-                        organization_id=org_id,
-                    )
+                        "organization_id": org_id,
+                    }
+                )
+            inserted = AuditEventRepository(db).insert_new(
+                rows, use_copy=self._use_copy
+            )
+            if len(inserted) < len(rows):
+                logger.info(
+                    "Skipped %d already stored events", len(rows) - len(inserted)
                 )
-            if orm_events:
-                db.bulk_save_objects(orm_events)
 
-            # Step 2: Group by organization and analyze
+            # Step 2: Group new events by organization and analyze
             org_to_events: Dict[UUID, List[GenericAuditEvent]] = {}
-            for org_id, e in self.batch:
-                org_to_events.setdefault(org_id, []).append(e)
-            for org_id, events in org_to_events.items():
-                try:
-                    self._analyzer.analyze_events(db, events, organization_id=org_id)
-                except Exception as exc:
-                    logger.exception(
-                        "Analyzer failed for org %s batch of %d events: %s",
-                        org_id,
-                        len(events),
-                        exc,
-                    )
+            for org_id, e in batch:
+                if (org_id, e.event_id) in inserted:
+                    org_to_events.setdefault(org_id, []).append(e)
+            if self._analysis_pool is not None:
+                db.commit()
+                self._invalidate_identities(upserted_arns)
+                self._recent_events.add_many((o, e.event_id) for o, e in batch)
+                # The pool owns the ticket from here on
+                pool_ticket, ticket = ticket, None
+                self._analyze_sharded(org_to_events, pool_ticket, upserted_arns)
+                logger.info(
+                    "Flushed %d events to audit_events and %d cloud identities; "
+                    "committed.",
+                    len(batch),
+                    len(identities),
+                )
+                return True
+            # One lookup query per table for all organizations; per-org
+            # analyzer failures are logged by analyze_batch
+            alerts_by_org = self._analyzer.analyze_batch(
+                db, org_to_events, broadcast=False
+            )
+            payloads_by_org = {
+                org_id: [self._analyzer.alert_payload(a) for a in alerts]
+                for org_id, alerts in alerts_by_org.items()
+            }
 
-            # Step 3: Commit
+            # Step 3: Commit, then broadcast the committed alerts
             db.commit()
+            for org_id, payloads in payloads_by_org.items():
+                self._analyzer.publish_alerts(payloads, org_id)
+            self._invalidate_identities(upserted_arns)
+            self._recent_events.add_many((o, e.event_id) for o, e in batch)
             logger.info(
-                "Flushed %d events to audit_events and committed.", len(self.batch)
+                "Flushed %d events to audit_events and %d cloud identities; committed.",
+                len(batch),
+                len(identities),
             )
+            return True
         except Exception as exc:
             logger.exception("Failed during batch flush: %s", exc)
             try:
                 db.rollback()
             except Exception:
                 pass
+            return False
         finally:
+            self._release_ticket(ticket)
             try:
                 db.close()
             except Exception:
                 pass
-        # Clear buffer and update flush timer
-        self.batch.clear()
+
+    @staticmethod
+    def _identity_arns(identities: List[Dict[str, Any]]) -> Dict[UUID, List[str]]:
+        arns: Dict[UUID, List[str]] = {}
+        for row in identities:
+            arns.setdefault(row["organization_id"], []).append(row["identity_arn"])
+        return arns
+
+    @staticmethod
+    def _invalidate_identities(arns: Dict[UUID, List[str]]) -> None:
+        """
+        Drop cached lookups (in particular cached "unknown identity" entries) for
+        upserted ARNs. Done before analysis and again after commit, so a
+        concurrent flush cannot keep a negative entry read before the commit.
+        """
+        for org_id, org_arns in arns.items():
+            identity_cache.invalidate_many(org_id, org_arns)
+
+    def _release_ticket(self, ticket: Optional[int]) -> None:
+        if ticket is not None and self._analysis_pool is not None:
+            self._analysis_pool.release(ticket)
+
+    def _analyze_sharded(
+        self,
+        org_to_events: Dict[UUID, List[GenericAuditEvent]],
+        ticket: Optional[int],
+        upserted_arns: Optional[Dict[UUID, List[str]]] = None,
+    ) -> None:
+        """
+        Run analysis in the organization shards and broadcast the returned alerts.
+        Analyzer failures are logged per organization, as in the in-process path.
+        """
+        results = self._analysis_pool.analyze(org_to_events, ticket, upserted_arns)
+        for org_id, count, payloads, error in results:
+            if error is not None:
+                logger.error(
+                    "Analyzer failed for org %s batch of %d events: %s",
+                    org_id,
+                    count,
+                    error,
+                )
+                continue
+            self._analyzer.publish_alerts(payloads, org_id)
+
+    def _get_flush_executor(self) -> ThreadPoolExecutor:
+        if self._flush_executor is None:
+            # One worker: overlapping flush I/O with polling needs no more, and
+            # same-partition batches must not run concurrently
+            self._flush_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="kafka-flush"
+            )
+        return self._flush_executor
+
+    async def _await_oldest_flush(self) -> None:
+        """
+        Wait for the oldest in-flight flush and commit the offsets it covers; a
+        failed flush is redelivered with backoff, or skipped once it has failed
+        MAX_FLUSH_ATTEMPTS times. Failures are already logged by _flush.
+        """
+        async with self._flush_lock:
+            if not self._inflight_flushes:
+                return
+            fut, offsets = self._inflight_flushes.popleft()
+            persisted = False
+            try:
+                persisted = bool(await fut)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.exception("Batch flush raised: %s", exc)
+            if not self._manual_commit:
+                return
+            if not persisted:
+                attempts = self._record_flush_failure(offsets)
+                if attempts < self.MAX_FLUSH_ATTEMPTS:
+                    await self._rewind(offsets, attempts)
+                    return
+                self.batches_skipped += 1
+                logger.error(
+                    "Batch flush failed %d times; skipping messages %s",
+                    attempts,
+                    {tp: f"{first}-{last}" for tp, (first, last) in offsets.items()},
+                )
+            for tp in offsets:
+                self._flush_failures.pop(tp, None)
+            self._queue_commit({tp: last + 1 for tp, (_, last) in offsets.items()})
+        # Sent outside the lock; offsets were queued in order above
+        await self._send_commits()
+
+    def _record_flush_failure(self, offsets: OffsetRange) -> int:
+        """
+        Count a failure of the batch starting at these offsets; returns the
+        highest number of consecutive failures from the same offset.
+        """
+        attempts = 0
+        for tp, (first, _) in offsets.items():
+            failed_first, failed_attempts = self._flush_failures.get(tp, (first, 0))
+            count = failed_attempts + 1 if failed_first == first else 1
+            self._flush_failures[tp] = (first, count)
+            attempts = max(attempts, count)
+        return attempts
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(
+            self.FLUSH_RETRY_MAX_BACKOFF,
+            self.FLUSH_RETRY_BACKOFF * 2 ** max(0, attempts - 1),
+        )
+
+    async def _reap_flushes(self) -> None:
+        """
+        Collect flushes that have completed, stopping at the first one still running
+        so completion (and offset commits) are always observed in submission order.
+        """
+        while self._inflight_flushes and self._inflight_flushes[0][0].done():
+            await self._await_oldest_flush()
+
+    def _track_offsets(self, tp: TopicPartition, first: int, last: int) -> None:
+        if not self._manual_commit:
+            return
+        prev = self._consumed_offsets.get(tp)
+        self._consumed_offsets[tp] = (prev[0] if prev else first, last)
+
+    async def _schedule_flush(self) -> None:
+        """
+        Hand the current buffer to the flush executor without blocking the loop.
+        Applies backpressure once MAX_INFLIGHT_FLUSHES batches are outstanding.
+        """
+        await self._reap_flushes()
+        if not self.batch and not self.identity_batch and not self._consumed_offsets:
+            self._last_flush_time = time.monotonic()
+            return
+        while len(self._inflight_flushes) >= self.MAX_INFLIGHT_FLUSHES:
+            await self._await_oldest_flush()
+        batch = self.batch
+        identities = list(self.identity_batch.values())
+        offsets = self._consumed_offsets
+        self.batch = []
+        self._batch_keys = set()
+        self.identity_batch = {}
+        self._consumed_offsets = {}
         self._last_flush_time = time.monotonic()
+        loop = asyncio.get_running_loop()
+        if batch or identities:
+            # Alerts are broadcast from worker threads; route them back to this loop
+            self._analyzer.bind_event_loop(loop)
+            ticket = (
+                self._analysis_pool.reserve()
+                if self._analysis_pool is not None and batch
+                else None
+            )
+            fut = loop.run_in_executor(
+                self._get_flush_executor(), self._flush, batch, identities, ticket
+            )
+        else:
+            # Only skipped messages: keep their offsets in order behind the
+            # batches already in flight.
+            fut = loop.create_future()
+            fut.set_result(True)
+        self._inflight_flushes.append((fut, offsets))
+
+    async def _drain_flushes(self) -> None:
+        """
+        Flush whatever is buffered and wait for every in-flight batch, in order.
+        """
+        try:
+            await self._schedule_flush()
+        except Exception as exc:
+            logger.exception("Failed to schedule final flush: %s", exc)
+        while self._inflight_flushes:
+            await self._await_oldest_flush()
+
+    def _queue_commit(self, offsets: Dict[TopicPartition, int]) -> None:
+        """
+        Merge next-offsets of persisted messages into the pending commit.
+        """
+        for tp, offset in offsets.items():
+            if offset > self._pending_commit.get(tp, -1):
+                self._pending_commit[tp] = offset
+
+    async def _send_commits(self) -> None:
+        """
+        Commit the pending offsets. In async mode the request is pipelined: the
+        loop does not wait for the broker, and offsets queued while a commit is
+        in flight are merged into the following request.
+        """
+        if not self._pending_commit:
+            return
+        if not self._async_commit:
+            await self._run_commits()
+            return
+        if self._commit_task is None or self._commit_task.done():
+            self._commit_task = asyncio.create_task(self._run_commits())
+
+    async def _run_commits(self) -> None:
+        while self._pending_commit:
+            offsets, self._pending_commit = self._pending_commit, {}
+            try:
+                await self._consumer.commit(offsets)
+                logger.debug("Committed offsets %s", offsets)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # A later commit of higher offsets supersedes this one
+                logger.warning("Offset commit failed for %s: %s", offsets, exc)
+                return
+
+    async def _wait_for_commits(self) -> None:
+        if self._commit_task is not None and not self._commit_task.done():
+            try:
+                await self._commit_task
+            except Exception:
+                pass
+        if self._pending_commit:
+            await self._run_commits()
+
+    async def _rewind(self, failed: OffsetRange, attempts: int = 1) -> None:
+        """
+        A batch could not be persisted: stop committing past it and seek its
+        partitions back so the messages are redelivered (at-least-once) after
+        an exponential backoff. Called with _flush_lock held.
+        """
+        rewind_to: Dict[TopicPartition, int] = {
+            tp: first for tp, (first, _) in failed.items()
+        }
+        # Later batches are persisted but must not advance the committed offsets
+        while self._inflight_flushes:
+            fut, offsets = self._inflight_flushes.popleft()
+            try:
+                await fut
+            except Exception:
+                pass
+            for tp, (first, _) in offsets.items():
+                rewind_to.setdefault(tp, first)
+        for tp, (first, _) in self._consumed_offsets.items():
+            rewind_to.setdefault(tp, first)
+        self._consumed_offsets = {}
+        self.batch = []
+        self._batch_keys = set()
+        self.identity_batch = {}
+        for tp, offset in rewind_to.items():
+            try:
+                self._consumer.seek(tp, offset)
+            except Exception as exc:
+                logger.warning("Could not seek %s to %d: %s", tp, offset, exc)
+        delay = self._retry_delay(attempts)
+        logger.warning(
+            "Batch flush failed (attempt %d/%d); rewound partitions to %s, "
+            "retrying in %.1fs",
+            attempts,
+            self.MAX_FLUSH_ATTEMPTS,
+            rewind_to,
+            delay,
+        )
+        if delay > 0:
+            await asyncio.sleep(delay)
 
     async def start(self) -> None:
         # Best-effort ensure topic exists before starting the consumer
@@ -491,13 +824,27 @@ class EventConsumer:
         except Exception as exc:
             # Non-fatal: consumer may still start if broker allows auto-create or topic exists
             logger.debug("Continuing without ensuring topic due to: %s", exc)
+        self._consumer.subscribe(
+            self._topics,
+            listener=_FlushOnRevoke(self) if self._manual_commit else None,
+        )
         await self._consumer.start()
         self._running = True
         logger.info("Kafka consumer started for topics %s", self._topics)
 
     async def stop(self) -> None:
         self._running = False
+        if self._manual_commit:
+            try:
+                await self._wait_for_commits()
+            except Exception as exc:
+                logger.warning("Final offset commit failed: %s", exc)
         await self._consumer.stop()
+        if self._flush_executor is not None:
+            self._flush_executor.shutdown(wait=False)
+            self._flush_executor = None
+        if self._analysis_pool is not None:
+            await asyncio.to_thread(self._analysis_pool.shutdown)
         logger.info("Kafka consumer stopped for topics %s", self._topics)
 
     async def consume_loop(self) -> None:
@@ -522,7 +869,12 @@ class EventConsumer:
 
                 # Process fetched messages
                 total_received = 0
+                pending_events: List[Tuple[UUID, Dict[str, Any]]] = []
                 for tp, messages in messages_map.items():
+                    if messages:
+                        self._track_offsets(
+                            tp, messages[0].offset, messages[-1].offset
+                        )
                     for msg in messages:
                         total_received += 1
                         try:
@@ -534,12 +886,16 @@ class EventConsumer:
                             if payload is None:
                                 continue
                             if getattr(msg, "topic", "") == self._identities_topic:
-                                # Identity upsert is immediate (not batched)
-                                self._upsert_cloud_identity(payload)
+                                # Identities are upserted together at flush time
+                                self._buffer_cloud_identity(payload)
                             else:
-                                # Buffer event
-                                self._process_payload(None, payload)
-                        except json.JSONDecodeError as exc:
+                                # Normalize now; validate with the rest of the poll
+                                prepared = self._process_payload(
+                                    payload, self._provider_hint(msg)
+                                )
+                                if prepared is not None:
+                                    pending_events.append(prepared)
+                        except JSONDecodeError as exc:
                             logger.warning(
                                 "Invalid JSON received on topic %s: %s",
                                 getattr(msg, "topic", ",".join(self._topics)),
@@ -547,25 +903,27 @@ class EventConsumer:
                             )
                         except Exception as exc:
                             logger.exception("Failed to process message: %s", exc)
+                try:
+                    self._buffer_events(pending_events)
+                except Exception as exc:
+                    logger.exception(
+                        "Failed to buffer %d events: %s", len(pending_events), exc
+                    )
 
                 # Decide flush based on size or time
                 now = time.monotonic()
                 if (
                     len(self.batch) >= self.BATCH_SIZE
+                    or len(self.identity_batch) >= self.IDENTITY_BATCH_SIZE
                     or (now - self._last_flush_time) >= self.FLUSH_INTERVAL
                 ):
-                    self._flush()
-                # If no messages arrived but interval passed and there is buffered data, flush as well
-                elif (
-                    total_received == 0
-                    and self.batch
-                    and (now - self._last_flush_time) >= self.FLUSH_INTERVAL
-                ):
-                    self._flush()
+                    await self._schedule_flush()
+                else:
+                    await self._reap_flushes()
         except asyncio.CancelledError:
             logger.info("consume_loop cancelled; stopping consumer.")
             try:
-                self._flush()
+                await self._drain_flushes()
             except Exception:
                 pass
             await self.stop()
@@ -573,7 +931,7 @@ class EventConsumer:
             logger.exception("Fatal error in consume_loop: %s", exc)
             # Best-effort final flush
             try:
-                self._flush()
+                await self._drain_flushes()
             except Exception:
                 pass
             await self.stop()
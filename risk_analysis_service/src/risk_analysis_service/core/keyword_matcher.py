@@ -0,0 +1,154 @@
+"""
+Multi-pattern string matcher: every prefix, suffix and substring keyword set
+registered under a category is compiled into tries (an Aho-Corasick automaton
+for substrings), so all categories of a string come back from one pass over
+it. Results are cached per distinct input string.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+_NO_CATEGORIES: FrozenSet[str] = frozenset()
+
+
+class _Trie(NamedTuple):
+    # Node 0 is the root; children[node] maps a character to the next node
+    children: List[Dict[str, int]]
+    outputs: List[FrozenSet[str]]
+
+
+def _build_trie(patterns: Dict[str, Set[str]]) -> _Trie:
+    children: List[Dict[str, int]] = [{}]
+    outputs: List[Set[str]] = [set()]
+    for pattern, categories in patterns.items():
+        node = 0
+        for ch in pattern:
+            nxt = children[node].get(ch)
+            if nxt is None:
+                nxt = len(children)
+                children[node][ch] = nxt
+                children.append({})
+                outputs.append(set())
+            node = nxt
+        outputs[node] |= categories
+    return _Trie(children, [frozenset(o) for o in outputs])
+
+
+def _build_automaton(keywords: Dict[str, Set[str]]) -> Tuple[_Trie, List[int]]:
+    """
+    Aho-Corasick: the keyword trie plus failure links, with each node's
+    outputs extended by those of its failure chain.
+    """
+    trie = _build_trie(keywords)
+    children, outputs = trie
+    fail = [0] * len(children)
+    queue = deque(children[0].values())
+    while queue:
+        node = queue.popleft()
+        for ch, nxt in children[node].items():
+            queue.append(nxt)
+            state = fail[node]
+            while state and ch not in children[state]:
+                state = fail[state]
+            target = children[state].get(ch, 0)
+            fail[nxt] = target if target != nxt else 0
+            outputs[nxt] = outputs[nxt] | outputs[fail[nxt]]
+    return trie, fail
+
+
+class _Compiled(NamedTuple):
+    prefixes: _Trie
+    suffixes: _Trie
+    keywords: _Trie
+    fail: List[int]
+
+
+class KeywordMatcher:
+    """
+    Categorizes strings by registered prefixes, suffixes and substring
+    keywords. With ignore_case, patterns and inputs are lower-cased. Patterns
+    may be added at any time; the automata are rebuilt on the next lookup.
+    """
+
+    def __init__(self, ignore_case: bool = True, cache_size: int = 65536) -> None:
+        self.ignore_case = ignore_case
+        self._prefixes: Dict[str, Set[str]] = {}
+        self._suffixes: Dict[str, Set[str]] = {}
+        self._keywords: Dict[str, Set[str]] = {}
+        self._compiled: Optional[_Compiled] = None
+        self._lock = threading.Lock()
+        self.categories = lru_cache(maxsize=cache_size)(self._scan)
+
+    def add_prefixes(self, category: str, prefixes: Iterable[str]) -> None:
+        self._add(self._prefixes, category, prefixes)
+
+    def add_suffixes(self, category: str, suffixes: Iterable[str]) -> None:
+        # Matched by walking the reversed input through a trie of reversed suffixes
+        self._add(self._suffixes, category, (s[::-1] for s in suffixes))
+
+    def add_keywords(self, category: str, keywords: Iterable[str]) -> None:
+        self._add(self._keywords, category, keywords)
+
+    def _add(
+        self, table: Dict[str, Set[str]], category: str, patterns: Iterable[str]
+    ) -> None:
+        with self._lock:
+            for pattern in patterns:
+                if self.ignore_case:
+                    pattern = pattern.lower()
+                table.setdefault(pattern, set()).add(category)
+            self._compiled = None
+            self.categories.cache_clear()
+
+    def _compile(self) -> _Compiled:
+        with self._lock:
+            if self._compiled is None:
+                keywords, fail = _build_automaton(self._keywords)
+                self._compiled = _Compiled(
+                    prefixes=_build_trie(self._prefixes),
+                    suffixes=_build_trie(self._suffixes),
+                    keywords=keywords,
+                    fail=fail,
+                )
+            return self._compiled
+
+    def _scan(self, text: str) -> FrozenSet[str]:
+        compiled = self._compiled or self._compile()
+        if self.ignore_case:
+            text = text.lower()
+        found: Set[str] = set()
+        for trie, chars in (
+            (compiled.prefixes, text),
+            (compiled.suffixes, reversed(text)),
+        ):
+            children, outputs = trie
+            node = 0
+            found |= outputs[0]
+            for ch in chars:
+                node = children[node].get(ch, 0)
+                if not node:
+                    break
+                found |= outputs[node]
+
+        children, outputs = compiled.keywords
+        fail = compiled.fail
+        found |= outputs[0]
+        state = 0
+        for ch in text:
+            while state and ch not in children[state]:
+                state = fail[state]
+            state = children[state].get(ch, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return frozenset(found) if found else _NO_CATEGORIES
+
+    def matches(self, text: str, category: str) -> bool:
+        return category in self.categories(text)
+
+
+# Process-wide matcher for the built-in action-name and resource keyword sets
+keyword_matcher = KeywordMatcher()
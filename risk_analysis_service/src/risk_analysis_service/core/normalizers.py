@@ -0,0 +1,421 @@
+"""
+Table-driven normalizers that adapt provider audit-log payloads into the dict
+shape expected by GenericAuditEvent validation.
+
+Each normalizer declares, per output field, an ordered list of lookup paths into
+the message envelope ("payload") or the provider record ("raw"). The paths are
+compiled once into getters when the normalizer is registered, so the per-message
+cost is a provider lookup plus a handful of dict gets.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+
+# (scope, key path); scope is "payload" (envelope) or "raw" (provider record)
+FieldPath = Tuple[str, Tuple[str, ...]]
+Getter = Callable[[Dict[str, Any], Dict[str, Any]], Any]
+
+NORMALIZED_FIELDS: Tuple[str, ...] = (
+    "event_id",
+    "event_time",
+    "actor_identity",
+    "actor_ip_address",
+    "action_name",
+    "target_resource",
+    "event_status",
+)
+
+
+def _compile_getter(paths: Iterable[FieldPath]) -> Getter:
+    """
+    Build a getter returning the first truthy value found along the given paths.
+    """
+    steps = tuple((scope == "payload", keys) for scope, keys in paths)
+
+    def get(payload: Dict[str, Any], raw: Dict[str, Any]) -> Any:
+        for from_payload, keys in steps:
+            node: Any = payload if from_payload else raw
+            for key in keys:
+                if not isinstance(node, dict):
+                    node = None
+                    break
+                node = node.get(key)
+            if node:
+                return node
+        return None
+
+    return get
+
+
+def _p(*keys: str) -> FieldPath:
+    return ("payload", keys)
+
+
+def _r(*keys: str) -> FieldPath:
+    return ("raw", keys)
+
+
+class PayloadNormalizer:
+    """
+    Base normalizer: fields are resolved from `field_paths`; providers override
+    the hooks for values that need more than a lookup.
+    """
+
+    name: str = "normalized"
+    provider: str = "AWS"
+    field_paths: Dict[str, List[FieldPath]] = {
+        "event_id": [_p("event_id"), _r("event_id")],
+        "event_time": [_p("event_time"), _r("event_time")],
+        "actor_identity": [_p("actor_identity"), _r("actor_identity")],
+        "actor_ip_address": [
+            _p("actor_ip_address"),
+            _r("actor_ip_address"),
+            _p("ip"),
+        ],
+        "action_name": [_p("action_name"), _r("action_name")],
+        "target_resource": [],
+        "event_status": [_p("event_status"), _r("event_status")],
+    }
+
+    def __init__(self) -> None:
+        self._getters: Dict[str, Getter] = {
+            field: _compile_getter(self.field_paths.get(field, ()))
+            for field in NORMALIZED_FIELDS
+        }
+
+    def target_resource(
+        self, payload: Dict[str, Any], raw: Dict[str, Any]
+    ) -> Optional[str]:
+        # An explicit target_resource wins even when empty
+        if "target_resource" in payload:
+            return payload.get("target_resource")
+        if "target_resource" in raw:
+            return raw.get("target_resource")
+        return self._getters["target_resource"](payload, raw)
+
+    def event_status(self, payload: Dict[str, Any], raw: Dict[str, Any]) -> str:
+        value = self._getters["event_status"](payload, raw)
+        return str(value) if value else "SUCCESS"
+
+    def cloud_provider(self, payload: Dict[str, Any], raw: Dict[str, Any]) -> str:
+        value = payload.get("cloud_provider") or raw.get("cloud_provider")
+        return str(value) if value else self.provider
+
+    def event_id(self, payload: Dict[str, Any]) -> Optional[str]:
+        """
+        The provider's event id, or None when the message carries none.
+        """
+        raw = payload.get("raw")
+        raw = raw if isinstance(raw, dict) else payload
+        value = self._getters["event_id"](payload, raw)
+        return str(value) if value else None
+
+    def normalize(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build the GenericAuditEvent dict for one message.
+        """
+        raw = payload.get("raw")
+        raw = raw if isinstance(raw, dict) else payload
+        get = self._getters
+        normalized: Dict[str, Any] = {
+            "event_id": get["event_id"](payload, raw) or str(uuid4()),
+            "event_time": get["event_time"](payload, raw),
+            "actor_identity": get["actor_identity"](payload, raw) or "",
+            "actor_ip_address": get["actor_ip_address"](payload, raw) or "",
+            "action_name": get["action_name"](payload, raw) or "",
+            "target_resource": self.target_resource(payload, raw) or "",
+            "event_status": self.event_status(payload, raw),
+            # Let Pydantic coerce to UUID
+            "organization_id": payload.get("organization_id"),
+            "cloud_provider": self.cloud_provider(payload, raw),
+            "raw_log": raw,
+        }
+        # Unix epoch seconds become ISO; anything else is left to Pydantic
+        et = normalized["event_time"]
+        if isinstance(et, (int, float)):
+            try:
+                normalized["event_time"] = (
+                    datetime.utcfromtimestamp(float(et)).isoformat() + "Z"
+                )
+            except Exception:
+                pass
+        return normalized
+
+
+class CloudTrailNormalizer(PayloadNormalizer):
+    """
+    AWS CloudTrail records (event history or LookupEvents output), optionally
+    wrapped by the ingestion service's envelope under "raw".
+    """
+
+    name = "cloudtrail"
+    provider = "AWS"
+    field_paths = {
+        "event_id": [_p("event_id"), _r("event_id"), _r("eventID"), _r("EventId")],
+        "event_time": [
+            _p("event_time"),
+            _r("event_time"),
+            _r("eventTime"),
+            _r("EventTime"),
+        ],
+        "actor_identity": [
+            _p("actor_identity"),
+            _r("actor_identity"),
+            _r("userIdentity", "userName"),
+            _r("userIdentity", "arn"),
+            _r("AccessKeyId"),
+            _r("Username"),
+        ],
+        "actor_ip_address": [
+            _p("actor_ip_address"),
+            _r("actor_ip_address"),
+            _r("sourceIPAddress"),
+            _p("ip"),
+        ],
+        "action_name": [
+            _p("action_name"),
+            _r("action_name"),
+            _r("eventName"),
+            _r("EventName"),
+            _p("action"),
+        ],
+        "target_resource": [
+            _r("eventSource"),
+            _r("requestParameters", "resource"),
+            _r("requestParameters", "groupId"),
+            _r("EventSource"),
+        ],
+        "event_status": [_p("event_status"), _r("event_status")],
+    }
+
+    def target_resource(
+        self, payload: Dict[str, Any], raw: Dict[str, Any]
+    ) -> Optional[str]:
+        if "target_resource" in payload:
+            return payload.get("target_resource")
+        if "target_resource" in raw:
+            return raw.get("target_resource")
+        req = raw.get("requestParameters") or {}
+        # Try common AWS params
+        bucket = req.get("bucketName") or req.get("bucket") or req.get("name")
+        key = req.get("key") or req.get("objectKey")
+        if bucket and key:
+            return f"s3://{bucket}/{key}"
+        if bucket:
+            return f"s3://{bucket}"
+        instance = req.get("instanceId") or req.get("instanceIds") or req.get("imageId")
+        if instance:
+            return str(instance)
+        # Fallback to event source/service if available
+        return self._getters["target_resource"](payload, raw)
+
+    def event_status(self, payload: Dict[str, Any], raw: Dict[str, Any]) -> str:
+        value = self._getters["event_status"](payload, raw)
+        if value:
+            return str(value)
+        # Infer from typical AWS fields
+        if raw.get("errorCode") or raw.get("errorMessage"):
+            return "FAILURE"
+        # Some events include responseElements = None on failure
+        if "responseElements" in raw and raw.get("responseElements") is None:
+            return "FAILURE"
+        return "SUCCESS"
+
+
+class AzureActivityLogNormalizer(PayloadNormalizer):
+    """
+    Azure Activity Log records, in diagnostic-settings export or REST API shape.
+    """
+
+    name = "azure_activity_log"
+    provider = "AZURE"
+    field_paths = {
+        "event_id": [
+            _p("event_id"),
+            _r("event_id"),
+            _r("eventDataId"),
+            _r("correlationId"),
+        ],
+        "event_time": [
+            _p("event_time"),
+            _r("event_time"),
+            _r("time"),
+            _r("eventTimestamp"),
+        ],
+        "actor_identity": [
+            _p("actor_identity"),
+            _r("actor_identity"),
+            _r("caller"),
+            _r(
+                "identity",
+                "claims",
+                "http://schemas.xmlsoap.org/ws/2005/05/identity/claims/upn",
+            ),
+            _r("identity", "claims", "appid"),
+        ],
+        "actor_ip_address": [
+            _p("actor_ip_address"),
+            _r("actor_ip_address"),
+            _r("callerIpAddress"),
+            _r("httpRequest", "clientIpAddress"),
+        ],
+        "action_name": [
+            _p("action_name"),
+            _r("action_name"),
+            _r("operationName", "value"),
+            _r("operationName"),
+        ],
+        "target_resource": [_r("resourceId")],
+        "event_status": [
+            _p("event_status"),
+            _r("event_status"),
+            _r("resultType"),
+            _r("status", "value"),
+        ],
+    }
+
+    def event_status(self, payload: Dict[str, Any], raw: Dict[str, Any]) -> str:
+        value = self._getters["event_status"](payload, raw)
+        if value and str(value).upper() in ("FAILURE", "FAILED"):
+            return "FAILURE"
+        return "SUCCESS"
+
+
+class GcpAuditLogNormalizer(PayloadNormalizer):
+    """
+    GCP Cloud Audit Logs LogEntry records (protoPayload AuditLog).
+    """
+
+    name = "gcp_audit_log"
+    provider = "GCP"
+    field_paths = {
+        "event_id": [_p("event_id"), _r("event_id"), _r("insertId")],
+        "event_time": [
+            _p("event_time"),
+            _r("event_time"),
+            _r("timestamp"),
+            _r("receiveTimestamp"),
+        ],
+        "actor_identity": [
+            _p("actor_identity"),
+            _r("actor_identity"),
+            _r("protoPayload", "authenticationInfo", "principalEmail"),
+            _r("protoPayload", "authenticationInfo", "principalSubject"),
+        ],
+        "actor_ip_address": [
+            _p("actor_ip_address"),
+            _r("actor_ip_address"),
+            _r("protoPayload", "requestMetadata", "callerIp"),
+        ],
+        "action_name": [
+            _p("action_name"),
+            _r("action_name"),
+            _r("protoPayload", "methodName"),
+        ],
+        "target_resource": [
+            _r("protoPayload", "resourceName"),
+            _r("protoPayload", "serviceName"),
+        ],
+        "event_status": [_p("event_status"), _r("event_status")],
+    }
+
+    def event_status(self, payload: Dict[str, Any], raw: Dict[str, Any]) -> str:
+        value = self._getters["event_status"](payload, raw)
+        if value:
+            return str(value)
+        # google.rpc.Status: a non-zero code means the call failed
+        status = (raw.get("protoPayload") or {}).get("status") or {}
+        return "FAILURE" if status.get("code") else "SUCCESS"
+
+
+class NormalizerRegistry:
+    """
+    Resolves the normalizer for a message: an explicit provider hint (Kafka
+    header) wins, then a marker key of the provider record, then the envelope's
+    cloud_provider field, then the pre-normalized default.
+    """
+
+    def __init__(self, default: PayloadNormalizer) -> None:
+        self._default = default
+        self._by_hint: Dict[str, PayloadNormalizer] = {}
+        self._by_marker: List[Tuple[str, PayloadNormalizer]] = []
+
+    def register(
+        self,
+        normalizer: PayloadNormalizer,
+        hints: Iterable[str] = (),
+        markers: Iterable[str] = (),
+    ) -> None:
+        for hint in hints:
+            self._by_hint[hint.lower()] = normalizer
+        for marker in markers:
+            self._by_marker.append((marker, normalizer))
+
+    def resolve(
+        self, payload: Dict[str, Any], hint: Optional[str] = None
+    ) -> PayloadNormalizer:
+        if hint:
+            normalizer = self._by_hint.get(hint.lower())
+            if normalizer is not None:
+                return normalizer
+        raw = payload.get("raw")
+        record = raw if isinstance(raw, dict) else payload
+        for marker, normalizer in self._by_marker:
+            if marker in record:
+                return normalizer
+        # The envelope's cloud_provider only decides when the record has no marker
+        declared = payload.get("cloud_provider")
+        if isinstance(declared, str):
+            return self._by_hint.get(declared.lower(), self._default)
+        return self._default
+
+    def normalize(
+        self, payload: Dict[str, Any], hint: Optional[str] = None
+    ) -> Dict[str, Any]:
+        return self.resolve(payload, hint).normalize(payload)
+
+    def event_id(
+        self, payload: Dict[str, Any], hint: Optional[str] = None
+    ) -> Optional[str]:
+        return self.resolve(payload, hint).event_id(payload)
+
+
+CLOUDTRAIL = CloudTrailNormalizer()
+AZURE_ACTIVITY_LOG = AzureActivityLogNormalizer()
+GCP_AUDIT_LOG = GcpAuditLogNormalizer()
+PRE_NORMALIZED = PayloadNormalizer()
+
+registry = NormalizerRegistry(default=PRE_NORMALIZED)
+registry.register(
+    CLOUDTRAIL,
+    hints=("aws", "cloudtrail"),
+    # Any CloudTrail key routes here: the pre-normalized default reads only
+    # the generic field names
+    markers=(
+        "eventName",
+        "EventName",
+        "userIdentity",
+        "eventSource",
+        "awsRegion",
+        "AccessKeyId",
+        "eventVersion",
+        "eventID",
+        "EventId",
+        "eventTime",
+        "EventTime",
+    ),
+)
+registry.register(
+    AZURE_ACTIVITY_LOG,
+    hints=("azure", "azure_activity_log"),
+    markers=("operationName",),
+)
+registry.register(
+    GCP_AUDIT_LOG,
+    hints=("gcp", "gcp_audit_log"),
+    markers=("protoPayload",),
+)
@@ -3,7 +3,7 @@ from __future__ import annotations
 from datetime import datetime
 from typing import Optional, TYPE_CHECKING
 
-from sqlalchemy import DateTime, ForeignKey, String
+from sqlalchemy import DateTime, ForeignKey, Index, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -17,7 +17,18 @@ if TYPE_CHECKING:
 class AuditEvent(Base):
     __tablename__ = "audit_events"
 
+    # Provider event id (CloudTrail eventID, ...) makes re-delivered events idempotent
+    __table_args__ = (
+        Index(
+            "uq_audit_events_org_event_id",
+            "organization_id",
+            "event_id",
+            unique=True,
+        ),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    event_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     event_time: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False
     )
@@ -1,3 +1,4 @@
 from .risk_repository import RiskRepository
 from .security_alert_repository import SecurityAlertRepository
 from .audit_event_repository import AuditEventRepository
+from .cloud_identity_repository import CloudIdentityRepository
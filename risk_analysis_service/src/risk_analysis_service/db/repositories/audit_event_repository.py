@@ -1,24 +1,181 @@
 from __future__ import annotations
 
-from typing import Optional, List, Dict
+import csv
+import io
+import logging
+from typing import Any, Optional, List, Dict, Sequence, Set, Tuple
+from uuid import UUID
 
 import pandas as pd
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy import func, or_, text
 
 from .base import BaseRepository
 from ..models.audit_event import AuditEvent
 from datetime import datetime, timedelta, timezone
 
 
+logger = logging.getLogger("risk_analysis.db")
+
+# Columns written by bulk_insert, in COPY order
+AUDIT_EVENT_COPY_COLUMNS: tuple[str, ...] = (
+    "event_id",
+    "event_time",
+    "actor_identity",
+    "action_name",
+    "target_resource",
+    "actor_ip_address",
+    "event_status",
+    "organization_id",
+)
+
+# Session-local staging table for COPY followed by INSERT ... ON CONFLICT
+_STAGING_TABLE = "audit_events_staging"
+
+# (organization_id, event_id)
+EventKey = Tuple[UUID, str]
+
+
 class AuditEventRepository(BaseRepository):
     def __init__(self, db: Session) -> None:
         super().__init__(db)
 
-    def fetch_events_df(self, hours: Optional[int] = None) -> pd.DataFrame:
+    def bulk_insert(
+        self, rows: Sequence[Dict[str, Any]], use_copy: bool = True
+    ) -> int:
+        """
+        Insert audit event rows (dicts keyed by AUDIT_EVENT_COPY_COLUMNS) inside the
+        session's current transaction. Uses COPY FROM STDIN when the session is bound
+        to psycopg2; otherwise falls back to ORM bulk_save_objects.
+        Returns the number of rows written.
+        """
+        if not rows:
+            return 0
+        if use_copy:
+            cursor = self._copy_cursor()
+            if cursor is not None:
+                try:
+                    self._copy_rows(cursor, rows)
+                finally:
+                    cursor.close()
+                return len(rows)
+        self.db.bulk_save_objects([AuditEvent(**row) for row in rows])
+        return len(rows)
+
+    def insert_new(
+        self, rows: Sequence[Dict[str, Any]], use_copy: bool = True
+    ) -> Set[EventKey]:
+        """
+        Insert rows, skipping any whose (organization_id, event_id) is already
+        stored (ON CONFLICT DO NOTHING on uq_audit_events_org_event_id), and return
+        the keys that were actually inserted. With psycopg2 the rows are COPYed into
+        a temporary staging table first. Does not commit.
+        """
+        if not rows:
+            return set()
+        if self.db.get_bind().dialect.name != "postgresql":
+            self.bulk_insert(rows, use_copy=False)
+            return {(row["organization_id"], row["event_id"]) for row in rows}
+        cursor = self._copy_cursor() if use_copy else None
+        if cursor is None:
+            return self._insert_on_conflict(rows)
+        columns = ", ".join(AUDIT_EVENT_COPY_COLUMNS)
+        try:
+            cursor.execute(
+                f"CREATE TEMP TABLE IF NOT EXISTS {_STAGING_TABLE} "
+                f"ON COMMIT DELETE ROWS AS SELECT {columns} "
+                f"FROM {AuditEvent.__tablename__} WITH NO DATA"
+            )
+            # A rolled-back flush may have left rows behind
+            cursor.execute(f"TRUNCATE {_STAGING_TABLE}")
+            self._copy_rows(cursor, rows, table=_STAGING_TABLE)
+        finally:
+            cursor.close()
+        table = AuditEvent.__table__
+        result = self.db.execute(
+            text(
+                f"INSERT INTO {AuditEvent.__tablename__} ({columns}) "
+                f"SELECT {columns} FROM {_STAGING_TABLE} "
+                "ON CONFLICT (organization_id, event_id) DO NOTHING "
+                "RETURNING organization_id, event_id"
+            ).columns(table.c.organization_id, table.c.event_id)
+        )
+        return {(org_id, event_id) for org_id, event_id in result}
+
+    def _insert_on_conflict(self, rows: Sequence[Dict[str, Any]]) -> Set[EventKey]:
+        table = AuditEvent.__table__
+        inserted: Set[EventKey] = set()
+        # Keep each statement under PostgreSQL's 65535 bind parameter limit
+        chunk = 65535 // len(AUDIT_EVENT_COPY_COLUMNS)
+        for start in range(0, len(rows), chunk):
+            stmt = (
+                pg_insert(table)
+                .values([dict(row) for row in rows[start : start + chunk]])
+                .on_conflict_do_nothing(
+                    index_elements=[table.c.organization_id, table.c.event_id]
+                )
+                .returning(table.c.organization_id, table.c.event_id)
+            )
+            inserted.update(
+                (org_id, event_id) for org_id, event_id in self.db.execute(stmt)
+            )
+        return inserted
+
+    def _copy_cursor(self) -> Any:
+        """
+        Return a raw DBAPI cursor on the session's connection, or None when the
+        driver does not support COPY (anything other than psycopg2).
+        """
+        conn = self.db.connection()
+        if conn.dialect.driver != "psycopg2":
+            return None
+        cursor = conn.connection.dbapi_connection.cursor()
+        if not hasattr(cursor, "copy_expert"):
+            cursor.close()
+            return None
+        return cursor
+
+    @staticmethod
+    def _copy_rows(
+        cursor: Any,
+        rows: Sequence[Dict[str, Any]],
+        table: str = AuditEvent.__tablename__,
+    ) -> None:
+        """
+        Serialize rows into an in-memory CSV buffer and stream it with COPY.
+        None becomes an unquoted empty field, which COPY CSV reads as NULL.
+        """
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        for row in rows:
+            record = []
+            for col in AUDIT_EVENT_COPY_COLUMNS:
+                value = row.get(col)
+                if value is None:
+                    record.append("")
+                elif isinstance(value, datetime):
+                    record.append(value.isoformat())
+                else:
+                    record.append(str(value))
+            writer.writerow(record)
+        buf.seek(0)
+        cursor.copy_expert(
+            f"COPY {table} "
+            f"({', '.join(AUDIT_EVENT_COPY_COLUMNS)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buf,
+        )
+
+    def fetch_events_df(
+        self,
+        hours: Optional[int] = None,
+        organization_ids: Optional[Sequence[UUID]] = None,
+    ) -> pd.DataFrame:
         """
         Return a DataFrame of raw audit events used for UEBA feature engineering.
-        Columns: event_time, actor_identity, actor_ip_address, action_name, status
+        Columns: event_time, actor_identity, actor_ip_address, action_name, status,
+        organization_id
         """
                                                            
         q = self.db.query(
@@ -27,11 +184,14 @@ class AuditEventRepository(BaseRepository):
             AuditEvent.actor_ip_address,
             AuditEvent.action_name,
             AuditEvent.event_status,
+            AuditEvent.organization_id,
         ).order_by(AuditEvent.event_time.asc())
 
         if hours is not None:
             cutoff = datetime.now(timezone.utc) - timedelta(hours=int(hours))
             q = q.filter(AuditEvent.event_time >= cutoff)
+        if organization_ids is not None:
+            q = q.filter(AuditEvent.organization_id.in_(list(organization_ids)))
 
         rows = q.all()
         if not rows:
@@ -42,6 +202,7 @@ class AuditEventRepository(BaseRepository):
                     "actor_ip_address",
                     "action_name",
                     "status",
+                    "organization_id",
                 ]
             )
 
@@ -53,6 +214,7 @@ class AuditEventRepository(BaseRepository):
             actor_ip_address,
             action_name,
             event_status,
+            organization_id,
         ) in rows:
             records.append(
                 {
@@ -61,6 +223,7 @@ class AuditEventRepository(BaseRepository):
                     "actor_ip_address": actor_ip_address,
                     "action_name": action_name,
                     "status": event_status,
+                    "organization_id": organization_id,
                 }
             )
 
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Sequence
+
+import logging
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..models.cloud_identity import CloudIdentity
+from .base import BaseRepository
+
+
+logger = logging.getLogger("risk_analysis.db")
+
+# Rows per statement; keeps bind parameters well under PostgreSQL's 65535 limit
+UPSERT_CHUNK_SIZE: int = 5000
+
+
+class CloudIdentityRepository(BaseRepository):
+    def __init__(self, db: Session) -> None:
+        super().__init__(db)
+
+    def upsert_many(self, rows: Sequence[Dict[str, Any]]) -> int:
+        """
+        Upsert identities in one INSERT ... ON CONFLICT (organization_id, identity_arn)
+        DO UPDATE, backed by the uq_cloud_identity_org_arn index.
+        Rows must be unique per (organization_id, identity_arn). created_at is only
+        filled when the stored value is NULL. Does not commit.
+        """
+        if not rows:
+            return 0
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            self._upsert_chunk(rows[start : start + UPSERT_CHUNK_SIZE])
+        logger.info("DB upsert pending: %d CloudIdentity records", len(rows))
+        return len(rows)
+
+    def _upsert_chunk(self, rows: Sequence[Dict[str, Any]]) -> None:
+        table = CloudIdentity.__table__
+        insert_stmt = pg_insert(table).values(list(rows))
+        upsert_stmt = insert_stmt.on_conflict_do_update(
+            index_elements=[table.c.organization_id, table.c.identity_arn],
+            set_={
+                "identity_name": insert_stmt.excluded.identity_name,
+                "identity_type": insert_stmt.excluded.identity_type,
+                "is_mfa_enabled": insert_stmt.excluded.is_mfa_enabled,
+                "created_at": func.coalesce(
+                    table.c.created_at, insert_stmt.excluded.created_at
+                ),
+                "last_updated_at": func.now(),
+            },
+        )
+        self.db.execute(upsert_stmt)
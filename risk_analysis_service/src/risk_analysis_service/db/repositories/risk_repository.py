@@ -41,13 +41,11 @@ class RiskRepository(BaseRepository):
             created.append(Risk(**item.model_dump()))
         if not created:
             return []
-        self.db.add_all(created)
         logger.info("DB bulk insert pending: %d Risk records", len(created))
-        self.db.commit()
-        for obj in created:
-            self.db.refresh(obj)
+        self._insert_returning(created)
+        # The caller owns the transaction and commits
         logger.info(
-            "DB bulk insert committed: Risk ids=%s",
+            "DB bulk insert flushed: Risk ids=%s",
             [obj.id for obj in created],
         )
         return created
@@ -45,12 +45,10 @@ class SecurityAlertRepository(BaseRepository):
     def create_many(self, alerts: List[SecurityAlert]) -> List[SecurityAlert]:
         if not alerts:
             return []
-        self.db.add_all(alerts)
         logger.info("DB bulk insert pending: %d SecurityAlert records", len(alerts))
-        self.db.commit()
-        for a in alerts:
-            self.db.refresh(a)
+        self._insert_returning(alerts)
+        # The caller owns the transaction and commits
         logger.info(
-            "DB bulk insert committed: SecurityAlert ids=%s", [a.id for a in alerts]
+            "DB bulk insert flushed: SecurityAlert ids=%s", [a.id for a in alerts]
         )
         return alerts
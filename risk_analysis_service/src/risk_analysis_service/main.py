@@ -59,11 +59,8 @@ async def lifespan(app: FastAPI):
         yield
     finally:
                   
-        try:
-            if app.state.kafka_consumer is not None:
-                await app.state.kafka_consumer.stop()
-        except Exception:
-            pass
+        # Cancel the loop first so it can drain in-flight flushes and commit
+        # their offsets before the consumer is closed.
         try:
             if app.state.kafka_consumer_task is not None:
                                                                           
@@ -74,6 +71,11 @@ async def lifespan(app: FastAPI):
                     pass
         except Exception:
             pass
+        try:
+            if app.state.kafka_consumer is not None:
+                await app.state.kafka_consumer.stop()
+        except Exception:
+            pass
 
 
 app = FastAPI(
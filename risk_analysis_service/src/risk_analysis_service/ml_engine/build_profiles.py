@@ -8,6 +8,7 @@ from sqlalchemy import create_engine, text, func
 from sqlalchemy.engine import Engine
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from ..db.models.entity_profile import EntityProfile
+from ..services.profile_cache import profile_cache
 
 
 logger = logging.getLogger("risk_analysis.ml_engine")
@@ -215,6 +216,8 @@ def build_profiles(
         )
         with engine.begin() as conn:
             conn.execute(upsert_stmt)
+        # Analyzers in this process reload the rebuilt profiles on their next batch
+        profile_cache.invalidate(UUID(str(organization_id)))
 
         logger.info(
             "Upserted %d entity profiles for organization_id=%s, cloud_account_id=%s",
@@ -0,0 +1,370 @@
+"""
+Streaming per-(organization, entity, hour) feature aggregation for inference.
+
+Mirrors the hourly features built by train_model.preprocess_and_aggregate, but is
+updated incrementally as events arrive so that an entity's hour is scored on all
+of its events rather than only those that happened to share a consumer batch.
+"""
+
+from __future__ import annotations
+
+import heapq
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from uuid import UUID
+
+import numpy as np
+
+from ..core.keyword_matcher import keyword_matcher
+
+# Feature order expected by the scaler and model
+FEATURE_COLUMNS: List[str] = [
+    "event_count",
+    "failure_ratio",
+    "unique_ips",
+    "critical_actions_count",
+    "is_night",
+]
+
+CRITICAL_ACTION_PREFIXES: Tuple[str, ...] = ("delete", "terminate")
+CRITICAL_ACTION = "critical_action"
+keyword_matcher.add_prefixes(CRITICAL_ACTION, CRITICAL_ACTION_PREFIXES)
+
+# (entity_id, epoch hour, ip_address, is_failure, is_critical_action) per event
+FeatureRow = Tuple[str, int, str, bool, bool]
+
+
+def epoch_hour(dt: datetime) -> int:
+    """
+    Hours since the Unix epoch for dt; naive datetimes are treated as UTC.
+    """
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() // 3600)
+
+
+def is_night_hour(hour_of_day: int) -> bool:
+    return hour_of_day <= 6 or hour_of_day >= 21
+
+
+class FeatureBatch:
+    """
+    Columnar form of one batch's feature rows: entity ids and IP addresses are
+    interned to integer codes next to epoch-hour and flag arrays, so the hourly
+    features are computed with np.unique/np.bincount instead of a pandas groupby.
+    """
+
+    __slots__ = ("entities", "entity", "hour", "ip", "n_ips", "failure", "critical")
+
+    def __init__(self, rows: Sequence[FeatureRow]) -> None:
+        count = len(rows)
+        entity_codes: Dict[str, int] = {}
+        ip_codes: Dict[str, int] = {}
+        self.entity = np.fromiter(
+            (entity_codes.setdefault(row[0], len(entity_codes)) for row in rows),
+            dtype=np.int64,
+            count=count,
+        )
+        self.hour = np.fromiter((row[1] for row in rows), dtype=np.int64, count=count)
+        self.ip = np.fromiter(
+            (ip_codes.setdefault(row[2], len(ip_codes)) for row in rows),
+            dtype=np.int64,
+            count=count,
+        )
+        self.failure = np.fromiter((row[3] for row in rows), dtype=bool, count=count)
+        self.critical = np.fromiter((row[4] for row in rows), dtype=bool, count=count)
+        self.entities: List[str] = list(entity_codes)
+        self.n_ips = max(1, len(ip_codes))
+
+    def __len__(self) -> int:
+        return len(self.entity)
+
+    def aggregate(self) -> Dict[Tuple[str, int], List[float]]:
+        """
+        Feature vectors (FEATURE_COLUMNS order) per (entity_id, hour) in the batch,
+        the same values train_model.preprocess_and_aggregate and
+        HourlyFeatureAggregator.features compute.
+        """
+        if not len(self):
+            return {}
+        hours, hour_code = np.unique(self.hour, return_inverse=True)
+        groups, group = np.unique(
+            self.entity * len(hours) + hour_code.ravel(), return_inverse=True
+        )
+        group = group.ravel()
+        counts = np.bincount(group)
+        failures = np.bincount(group, weights=self.failure)
+        critical = np.bincount(group, weights=self.critical)
+        ip_pairs = np.unique(group * self.n_ips + self.ip)
+        unique_ips = np.bincount(ip_pairs // self.n_ips, minlength=len(groups))
+        group_hours = hours[groups % len(hours)]
+        hour_of_day = group_hours % 24
+        night = (hour_of_day <= 6) | (hour_of_day >= 21)
+        entities = self.entities
+        return {
+            (entities[entity], hour): [
+                float(n),
+                failed / n,
+                float(ips),
+                crit,
+                1.0 if is_night else 0.0,
+            ]
+            for entity, hour, n, failed, ips, crit, is_night in zip(
+                (groups // len(hours)).tolist(),
+                group_hours.tolist(),
+                counts.tolist(),
+                failures.tolist(),
+                unique_ips.tolist(),
+                critical.tolist(),
+                night.tolist(),
+            )
+        }
+
+
+class _Window:
+    __slots__ = ("event_count", "failure_count", "critical_count", "ips")
+
+    def __init__(self) -> None:
+        self.event_count = 0
+        self.failure_count = 0
+        self.critical_count = 0
+        self.ips: Set[str] = set()
+
+
+class HourlyFeatureAggregator:
+    """
+    Incremental hourly feature windows keyed by (organization_id, entity_id, hour).
+
+    Each organization has its own watermark: the latest event hour observed.
+    Windows more than `allowed_lateness_hours` behind the watermark are closed and
+    evicted; events that would land in a closed window are ignored. Past
+    `max_windows` open windows the oldest hours across all organizations are
+    evicted down to `low_water_windows` (90% of max_windows by default). Events passed
+    with their ids are counted once: the last `dedup_size` observed
+    (organization_id, event_id) keys are remembered, so a batch re-analyzed after
+    its transaction rolled back does not inflate the windows. Safe to share
+    between flush worker threads.
+    """
+
+    def __init__(
+        self,
+        allowed_lateness_hours: int = 2,
+        max_windows: int = 500_000,
+        dedup_size: int = 200_000,
+        low_water_windows: Optional[int] = None,
+    ) -> None:
+        self.allowed_lateness_hours = max(0, int(allowed_lateness_hours))
+        self.max_windows = max(1, int(max_windows))
+        if low_water_windows is None:
+            low_water_windows = self.max_windows - max(1, self.max_windows // 10)
+        self.low_water_windows = min(self.max_windows - 1, max(0, low_water_windows))
+        self.dedup_size = max(0, int(dedup_size))
+        # Recently observed (organization_id, event_id), oldest first
+        self._observed: OrderedDict[Tuple[UUID, str], None] = OrderedDict()
+        # org -> epoch hour -> entity_id -> window
+        self._windows: Dict[UUID, Dict[int, Dict[str, _Window]]] = {}
+        # Min-heap of (hour, org) for every open hour; entries of hours evicted
+        # otherwise are skipped when popped and dropped by _compact_hours
+        self._hour_heap: List[Tuple[int, UUID]] = []
+        self._open_hours = 0
+        self._watermarks: Dict[UUID, int] = {}
+        self._size = 0
+        self._late_events = 0
+        self._replayed_events = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Number of open windows across all organizations."""
+        return self._size
+
+    @property
+    def late_events(self) -> int:
+        """Events dropped because their window had already been closed."""
+        return self._late_events
+
+    @property
+    def replayed_events(self) -> int:
+        """Events skipped because their event_id had already been observed."""
+        return self._replayed_events
+
+    def observe(
+        self,
+        organization_id: UUID,
+        entity_id: str,
+        hour: int,
+        ip_address: str,
+        is_failure: bool,
+        is_critical_action: bool,
+    ) -> bool:
+        """
+        Add one event to its window. Returns False if the window is already closed.
+        """
+        with self._lock:
+            return self._observe(
+                organization_id,
+                entity_id,
+                hour,
+                ip_address,
+                is_failure,
+                is_critical_action,
+            )
+
+    def observe_many(
+        self,
+        organization_id: UUID,
+        rows: Iterable[FeatureRow],
+        event_ids: Optional[Sequence[str]] = None,
+    ) -> int:
+        """
+        Add (entity_id, hour, ip_address, is_failure, is_critical_action) rows under
+        a single lock acquisition. With event_ids (one per row), rows of events
+        already observed for the organization are skipped. Returns the number of
+        rows accepted.
+        """
+        accepted = 0
+        with self._lock:
+            if event_ids is not None and self.dedup_size:
+                rows = self._unobserved(organization_id, rows, event_ids)
+            for entity_id, hour, ip, failure, critical in rows:
+                if self._observe(
+                    organization_id, entity_id, hour, ip, failure, critical
+                ):
+                    accepted += 1
+        return accepted
+
+    def _unobserved(
+        self,
+        organization_id: UUID,
+        rows: Iterable[FeatureRow],
+        event_ids: Sequence[str],
+    ) -> List[FeatureRow]:
+        observed = self._observed
+        fresh: List[FeatureRow] = []
+        for row, event_id in zip(rows, event_ids):
+            if event_id:
+                key = (organization_id, event_id)
+                if key in observed:
+                    observed.move_to_end(key)
+                    self._replayed_events += 1
+                    continue
+                observed[key] = None
+            fresh.append(row)
+        while len(observed) > self.dedup_size:
+            observed.popitem(last=False)
+        return fresh
+
+    def _observe(
+        self,
+        organization_id: UUID,
+        entity_id: str,
+        hour: int,
+        ip_address: str,
+        is_failure: bool,
+        is_critical_action: bool,
+    ) -> bool:
+        watermark = self._watermarks.get(organization_id)
+        if watermark is not None and hour < watermark - self.allowed_lateness_hours:
+            self._late_events += 1
+            return False
+
+        hours = self._windows.setdefault(organization_id, {})
+        entities = hours.get(hour)
+        if entities is None:
+            entities = hours[hour] = {}
+            self._open_hours += 1
+            heapq.heappush(self._hour_heap, (hour, organization_id))
+        window = entities.get(entity_id)
+        if window is None:
+            window = entities[entity_id] = _Window()
+            self._size += 1
+        window.event_count += 1
+        if is_failure:
+            window.failure_count += 1
+        if is_critical_action:
+            window.critical_count += 1
+        window.ips.add(ip_address)
+
+        if watermark is None or hour > watermark:
+            self._watermarks[organization_id] = hour
+            self._evict_closed(organization_id, hour)
+        if self._size > self.max_windows:
+            self._evict_oldest()
+        return True
+
+    def _evict_closed(self, organization_id: UUID, watermark: int) -> None:
+        hours = self._windows.get(organization_id)
+        if not hours:
+            return
+        cutoff = watermark - self.allowed_lateness_hours
+        for hour in [h for h in hours if h < cutoff]:
+            self._size -= len(hours.pop(hour))
+            self._open_hours -= 1
+        self._compact_hours()
+
+    def _evict_oldest(self) -> None:
+        """
+        Memory guard: drop the oldest hours across all organizations until at
+        most low_water_windows windows are open.
+        """
+        heap = self._hour_heap
+        while heap and self._size > self.low_water_windows:
+            hour, org_id = heapq.heappop(heap)
+            hours = self._windows.get(org_id)
+            if not hours or hour not in hours:
+                continue
+            self._size -= len(hours.pop(hour))
+            self._open_hours -= 1
+
+    def _compact_hours(self) -> None:
+        # Rebuild once stale entries outnumber the open hours
+        if len(self._hour_heap) <= 2 * self._open_hours + 64:
+            return
+        self._hour_heap = [
+            (hour, org_id) for org_id, hours in self._windows.items() for hour in hours
+        ]
+        heapq.heapify(self._hour_heap)
+
+    def features(
+        self, organization_id: UUID, keys: Iterable[Tuple[str, int]]
+    ) -> Dict[Tuple[str, int], List[float]]:
+        """
+        Return feature vectors (FEATURE_COLUMNS order) for the requested
+        (entity_id, hour) keys that have an open window.
+        """
+        out: Dict[Tuple[str, int], List[float]] = {}
+        with self._lock:
+            hours = self._windows.get(organization_id)
+            if not hours:
+                return out
+            for key in keys:
+                entity_id, hour = key
+                window = hours.get(hour, {}).get(entity_id)
+                if window is None or window.event_count == 0:
+                    continue
+                out[key] = [
+                    float(window.event_count),
+                    window.failure_count / window.event_count,
+                    float(len(window.ips)),
+                    float(window.critical_count),
+                    1.0 if is_night_hour(hour % 24) else 0.0,
+                ]
+        return out
+
+    def clear(self, organization_id: Optional[UUID] = None) -> None:
+        with self._lock:
+            if organization_id is None:
+                self._windows.clear()
+                self._watermarks.clear()
+                self._observed.clear()
+                self._hour_heap.clear()
+                self._open_hours = 0
+                self._size = 0
+                return
+            hours = self._windows.pop(organization_id, {})
+            self._watermarks.pop(organization_id, None)
+            self._size -= sum(len(entities) for entities in hours.values())
+            self._open_hours -= len(hours)
+            self._compact_hours()
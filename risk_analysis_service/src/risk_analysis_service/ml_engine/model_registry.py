@@ -0,0 +1,479 @@
+"""
+Versioned model artifacts with one shared, hot-swappable loaded model per process.
+
+Layout under MODEL_REGISTRY_DIR (default: ml_engine/models):
+
+    models/
+      CURRENT                  name of the active version
+      20250101T120000Z/
+        manifest.json          version, created_at, sha256 of every artifact
+        model.pkl
+        scaler.pkl
+        forest/*.npy           flattened forest (train_model.export_forest)
+
+Organizations with a model of their own have the same layout under
+models/orgs/<organization_id>/ (see org_models.OrgModelCache).
+
+Until a version is activated the registry serves model.pkl/scaler.pkl next to
+this module as version "builtin". New versions are loaded (and their checksums
+verified) in the background; the loaded model is swapped in with a single
+reference assignment, so inference keeps using the previous version until then.
+
+The forest arrays are memory-mapped read-only, so all workers on a host share
+them through the page cache; model.pkl is only unpickled if the sklearn
+estimator itself is needed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import joblib
+
+from .predictor import ForestScorer
+
+logger = logging.getLogger("risk_analysis.ml_engine")
+
+MANIFEST_NAME = "manifest.json"
+CURRENT_POINTER = "CURRENT"
+MODEL_FILE = "model.pkl"
+SCALER_FILE = "scaler.pkl"
+FOREST_DIR = "forest"
+BUILTIN_VERSION = "builtin"
+# Per-organization registries live under <root>/orgs/<organization_id>/
+ORG_MODELS_DIR = "orgs"
+
+
+class ModelLoadError(Exception):
+    """Raised when a model version is missing, incomplete or fails verification."""
+
+
+class LoadedModel:
+    """
+    One loaded model version. With a forest scorer, model.pkl is unpickled
+    lazily, the first time `model` is read.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        scaler: Any,
+        # None when ANALYZER_NUMPY_SCORER=false or the forest could not be built
+        forest_scorer: Optional[ForestScorer],
+        manifest: Dict[str, Any],
+        model: Any = None,
+        model_path: Optional[Path] = None,
+    ) -> None:
+        self.version = version
+        self.scaler = scaler
+        self.forest_scorer = forest_scorer
+        self.manifest = manifest
+        self._model = model
+        self._model_path = model_path
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self) -> Any:
+        if self._model is None and self._model_path is not None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = joblib.load(self._model_path, mmap_mode="r")
+        return self._model
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate memory held: the forest arrays, plus the pickle size once
+        the sklearn estimator has been loaded.
+        """
+        size = self.forest_scorer.nbytes if self.forest_scorer is not None else 0
+        if self._model is not None and self._model_path is not None:
+            try:
+                size += self._model_path.stat().st_size
+            except OSError:
+                pass
+        return size
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fresh_forest_dir(artifacts_dir: Path) -> Optional[Path]:
+    """
+    artifacts_dir/forest if it was exported after model.pkl was written.
+    """
+    forest_dir = artifacts_dir / FOREST_DIR
+    try:
+        stale = (
+            forest_dir.stat().st_mtime < (artifacts_dir / MODEL_FILE).stat().st_mtime
+        )
+    except OSError:
+        return None
+    return None if stale or not forest_dir.is_dir() else forest_dir
+
+
+class ModelRegistry:
+    """
+    Versioned artifact store plus the process-wide loaded model.
+
+    `current` is read without locking; readers should take it once per batch so
+    a concurrent swap cannot mix two versions within one prediction.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        builtin_dir: Optional[Path] = None,
+        use_forest_scorer: bool = True,
+    ) -> None:
+        self.root = Path(root)
+        self.builtin_dir = Path(builtin_dir or Path(__file__).resolve().parent)
+        self.use_forest_scorer = use_forest_scorer
+        self._current: Optional[LoadedModel] = None
+        self._lock = threading.Lock()
+        self._loader = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="model-loader"
+        )
+        self._watcher: Optional[threading.Thread] = None
+        self._watch_interval = 0.0
+        self._stop_watcher = threading.Event()
+
+    @property
+    def current(self) -> Optional[LoadedModel]:
+        return self._current
+
+    def versions(self) -> List[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(
+            p.name for p in self.root.iterdir() if (p / MANIFEST_NAME).is_file()
+        )
+
+    def organization_registry(self, organization_id: Any) -> "ModelRegistry":
+        """
+        Registry of one organization's own model versions, with the same layout.
+        """
+        return ModelRegistry(
+            self.root / ORG_MODELS_DIR / str(organization_id),
+            builtin_dir=self.builtin_dir,
+            use_forest_scorer=self.use_forest_scorer,
+        )
+
+    def active_version(self) -> Optional[str]:
+        """
+        Version named by the CURRENT pointer, or None if nothing was activated.
+        """
+        try:
+            version = (self.root / CURRENT_POINTER).read_text().strip()
+        except OSError:
+            return None
+        return version or None
+
+    def load(self, version: str) -> LoadedModel:
+        """
+        Load and verify one version without making it current.
+        """
+        if version == BUILTIN_VERSION:
+            return self._load_builtin()
+        version_dir = self.root / version
+        try:
+            manifest = json.loads((version_dir / MANIFEST_NAME).read_text())
+        except (OSError, ValueError) as exc:
+            raise ModelLoadError(f"Unreadable manifest for {version}: {exc}")
+        files: Dict[str, str] = manifest.get("files") or {}
+        for name in (MODEL_FILE, SCALER_FILE):
+            if name not in files:
+                raise ModelLoadError(f"Manifest of {version} does not list {name}")
+        for name, expected in files.items():
+            path = version_dir / name
+            if not path.is_file():
+                raise ModelLoadError(f"{version}: {name} is missing")
+            if _sha256(path) != expected:
+                raise ModelLoadError(f"{version}: checksum mismatch for {name}")
+        has_forest = any(name.startswith(FOREST_DIR + "/") for name in files)
+        return self._assemble(
+            version,
+            version_dir,
+            version_dir / FOREST_DIR if has_forest else None,
+            manifest,
+        )
+
+    def _load_builtin(self) -> LoadedModel:
+        model_path = self.builtin_dir / MODEL_FILE
+        scaler_path = self.builtin_dir / SCALER_FILE
+        if not model_path.is_file() or not scaler_path.is_file():
+            raise ModelLoadError(f"No model.pkl/scaler.pkl in {self.builtin_dir}")
+        return self._assemble(
+            BUILTIN_VERSION,
+            self.builtin_dir,
+            _fresh_forest_dir(self.builtin_dir),
+            {"version": BUILTIN_VERSION},
+        )
+
+    def _assemble(
+        self,
+        version: str,
+        artifacts_dir: Path,
+        forest_dir: Optional[Path],
+        manifest: Dict[str, Any],
+    ) -> LoadedModel:
+        scaler = joblib.load(artifacts_dir / SCALER_FILE)
+        if self.use_forest_scorer and forest_dir is not None:
+            try:
+                scorer = ForestScorer.load(forest_dir, mmap_mode="r")
+                if scorer.includes_scaler:
+                    return LoadedModel(
+                        version,
+                        scaler,
+                        scorer,
+                        manifest,
+                        model_path=artifacts_dir / MODEL_FILE,
+                    )
+            except Exception as exc:
+                logger.warning("Cannot map forest arrays in %s: %s", forest_dir, exc)
+        model = joblib.load(artifacts_dir / MODEL_FILE, mmap_mode="r")
+        scorer = None
+        if self.use_forest_scorer:
+            try:
+                scorer = ForestScorer.from_model(model, scaler)
+            except Exception as exc:
+                logger.warning("Forest scorer unavailable, using sklearn: %s", exc)
+        return LoadedModel(
+            version,
+            scaler,
+            scorer,
+            manifest,
+            model=model,
+            model_path=artifacts_dir / MODEL_FILE,
+        )
+
+    def ensure_loaded(self) -> Optional[LoadedModel]:
+        """
+        Load the active version on first use; failures leave ML disabled.
+        """
+        if self._current is not None:
+            return self._current
+        with self._lock:
+            if self._current is None:
+                try:
+                    self._current = self.load(self.active_version() or BUILTIN_VERSION)
+                    logger.info("Loaded model version %s", self._current.version)
+                except Exception as exc:
+                    logger.warning("No model loaded: %s", exc)
+        return self._current
+
+    def reload(self, version: Optional[str] = None) -> LoadedModel:
+        """
+        Load `version` (default: the CURRENT pointer) and swap it in. The old
+        model stays current if loading fails.
+        """
+        target = version or self.active_version() or BUILTIN_VERSION
+        loaded = self.load(target)
+        with self._lock:
+            previous = self._current
+            self._current = loaded
+        logger.info(
+            "Model version %s is now current (was %s)",
+            loaded.version,
+            previous.version if previous else None,
+        )
+        return loaded
+
+    def reload_async(self, version: Optional[str] = None) -> Future:
+        """
+        reload() on the background loader thread; loads are serialized.
+        """
+        future = self._loader.submit(self.reload, version)
+        future.add_done_callback(self._log_failed_reload)
+        return future
+
+    @staticmethod
+    def _log_failed_reload(future: Future) -> None:
+        exc = future.exception()
+        if exc is not None:
+            logger.error("Model reload failed: %s", exc)
+
+    def activate(self, version: str) -> Future:
+        """
+        Verify and load `version` in the background, then point CURRENT at it so
+        other processes watching the registry pick it up as well.
+        """
+
+        def run() -> LoadedModel:
+            loaded = self.load(version)
+            self._write_pointer(version)
+            with self._lock:
+                self._current = loaded
+            logger.info("Activated model version %s", version)
+            return loaded
+
+        future = self._loader.submit(run)
+        future.add_done_callback(self._log_failed_reload)
+        return future
+
+    def _write_pointer(self, version: str) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix=".current-")
+        with os.fdopen(fd, "w") as fh:
+            fh.write(version + "\n")
+        os.replace(tmp, self.root / CURRENT_POINTER)
+
+    def publish(
+        self,
+        source_dir: Path,
+        version: Optional[str] = None,
+        activate: bool = False,
+    ) -> str:
+        """
+        Copy model.pkl, scaler.pkl and the forest arrays from source_dir into a
+        new version directory with a manifest of their checksums; the arrays
+        are exported from the model when source_dir has no up-to-date copy.
+        The directory appears atomically; returns the version name.
+        """
+        source_dir = Path(source_dir)
+        version = version or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        if version == BUILTIN_VERSION or (self.root / version).exists():
+            raise ModelLoadError(f"Model version {version} already exists")
+        for name in (MODEL_FILE, SCALER_FILE):
+            if not (source_dir / name).is_file():
+                raise ModelLoadError(f"{name} not found in {source_dir}")
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=self.root, prefix=".staging-"))
+        try:
+            shutil.copy2(source_dir / MODEL_FILE, staging / MODEL_FILE)
+            shutil.copy2(source_dir / SCALER_FILE, staging / SCALER_FILE)
+            forest_dir = _fresh_forest_dir(source_dir)
+            if forest_dir is not None:
+                shutil.copytree(forest_dir, staging / FOREST_DIR)
+            else:
+                from .train_model import export_forest
+
+                export_forest(
+                    joblib.load(staging / MODEL_FILE),
+                    joblib.load(staging / SCALER_FILE),
+                    staging / FOREST_DIR,
+                )
+            files = {
+                path.relative_to(staging).as_posix(): _sha256(path)
+                for path in sorted(staging.rglob("*"))
+                if path.is_file()
+            }
+            manifest = {
+                "version": version,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "files": files,
+            }
+            (staging / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+            os.replace(staging, self.root / version)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if activate:
+            self._write_pointer(version)
+        return version
+
+    def start_watcher(self, interval_seconds: float) -> None:
+        """
+        Poll the CURRENT pointer and reload in the background when it changes.
+        """
+        if self._watcher is not None or interval_seconds <= 0:
+            return
+        self._watch_interval = interval_seconds
+        self._stop_watcher.clear()
+        self._watcher = threading.Thread(
+            target=self._watch,
+            args=(interval_seconds,),
+            name="model-registry-watcher",
+            daemon=True,
+        )
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop_watcher.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def _after_fork(self) -> None:
+        """
+        Threads do not survive fork(): give the child its own lock, loader and
+        watcher, keeping the already loaded model.
+        """
+        self._lock = threading.Lock()
+        self._loader = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="model-loader"
+        )
+        self._stop_watcher = threading.Event()
+        if self._watcher is not None:
+            self._watcher = None
+            self.start_watcher(self._watch_interval)
+
+    def _watch(self, interval_seconds: float) -> None:
+        pending: Optional[Future] = None
+        while not self._stop_watcher.wait(interval_seconds):
+            active = self.active_version()
+            current = self._current
+            if active is None or (current is not None and current.version == active):
+                continue
+            if pending is None or pending.done():
+                logger.info("Model pointer changed to %s; reloading", active)
+                pending = self.reload_async(active)
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def registry_from_env() -> ModelRegistry:
+    """
+    A registry configured from MODEL_REGISTRY_DIR and ANALYZER_NUMPY_SCORER.
+    """
+    builtin_dir = Path(__file__).resolve().parent
+    return ModelRegistry(
+        root=Path(os.getenv("MODEL_REGISTRY_DIR", str(builtin_dir / "models"))),
+        builtin_dir=builtin_dir,
+        use_forest_scorer=os.getenv("ANALYZER_NUMPY_SCORER", "true").lower()
+        not in {"0", "false", "no"},
+    )
+
+
+def get_registry() -> ModelRegistry:
+    """
+    The process-wide registry, created on first use; it watches the CURRENT
+    pointer every MODEL_WATCH_INTERVAL_SECONDS (0 disables the watcher).
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                registry = registry_from_env()
+                registry.start_watcher(
+                    float(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", "30"))
+                )
+                _registry = registry
+    return _registry
+
+
+def _reset_after_fork() -> None:
+    global _registry_lock
+    _registry_lock = threading.Lock()
+    if _registry is not None:
+        _registry._after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,199 @@
+"""
+Per-organization IsolationForest models, loaded on demand into an LRU cache.
+
+Each organization may publish its own versions into an organization registry
+(ModelRegistry.organization_registry, trained by train_model --per-org).
+Organizations without one, or whose model fails to load, are scored with the
+global model. Loaded models are evicted least recently used first once their
+combined size exceeds the memory budget, so a process only holds the models of
+the tenants it is currently serving.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+from uuid import UUID
+
+from .model_registry import (
+    BUILTIN_VERSION,
+    LoadedModel,
+    ModelRegistry,
+    get_registry,
+)
+
+logger = logging.getLogger("risk_analysis.ml_engine")
+
+
+class _Entry(NamedTuple):
+    # None when the organization has no usable model of its own
+    loaded: Optional[LoadedModel]
+    nbytes: int
+    checked_at: float
+    # Kept so refreshes re-read the CURRENT pointer without building a new
+    # registry (and its loader executor) each time
+    registry: ModelRegistry
+
+
+class OrgModelCache:
+    """
+    Thread-safe LRU of organization models bounded by max_bytes.
+
+    An organization's CURRENT pointer is re-read at most every refresh_seconds,
+    so a newly activated version (or a first model) is picked up without a
+    restart; organizations without a model are remembered for the same time.
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        max_bytes: int = 512 * 1024 * 1024,
+        refresh_seconds: float = 60.0,
+        max_entries: int = 100_000,
+    ) -> None:
+        self.registry = registry
+        self.max_bytes = max(0, int(max_bytes))
+        self.refresh_seconds = float(refresh_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self._entries: OrderedDict[UUID, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def model_for(self, organization_id: UUID) -> Optional[LoadedModel]:
+        """
+        The organization's active model, or the global model when it has none.
+        """
+        loaded = self._organization_model(organization_id)
+        return loaded if loaded is not None else self.registry.current
+
+    def _organization_model(self, organization_id: UUID) -> Optional[LoadedModel]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(organization_id)
+            if entry is not None:
+                self._entries.move_to_end(organization_id)
+                if now - entry.checked_at < self.refresh_seconds:
+                    self.hits += 1
+                    return entry.loaded
+
+        if entry is not None:
+            org_registry = entry.registry
+        else:
+            org_registry = self.registry.organization_registry(organization_id)
+        active = org_registry.active_version()
+        if active == BUILTIN_VERSION:
+            active = None
+        if entry is not None and entry.loaded is not None:
+            if entry.loaded.version == active:
+                self._store(organization_id, entry.loaded, now, org_registry)
+                return entry.loaded
+
+        loaded: Optional[LoadedModel] = None
+        if active is not None:
+            try:
+                loaded = org_registry.load(active)
+                self.loads += 1
+                logger.info(
+                    "Loaded model %s for organization %s", active, organization_id
+                )
+            except Exception as exc:
+                logger.warning(
+                    "Model %s of organization %s failed to load, using the global "
+                    "model: %s",
+                    active,
+                    organization_id,
+                    exc,
+                )
+        self._store(organization_id, loaded, now, org_registry)
+        return loaded
+
+    def _store(
+        self,
+        organization_id: UUID,
+        loaded: Optional[LoadedModel],
+        now: float,
+        registry: ModelRegistry,
+    ) -> None:
+        nbytes = loaded.nbytes if loaded is not None else 0
+        with self._lock:
+            previous = self._entries.pop(organization_id, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[organization_id] = _Entry(loaded, nbytes, now, registry)
+            self._bytes += nbytes
+            # The entry just stored is never evicted, even if it alone is over budget
+            while len(self._entries) > 1 and (
+                self._bytes > self.max_bytes or len(self._entries) > self.max_entries
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                if evicted.loaded is not None:
+                    self.evictions += 1
+
+    def invalidate(self, organization_id: Optional[UUID] = None) -> None:
+        """
+        Forget one organization's model, or all of them.
+        """
+        with self._lock:
+            if organization_id is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            entry = self._entries.pop(organization_id, None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            loaded = sum(1 for e in self._entries.values() if e.loaded is not None)
+            return {
+                "organizations": len(self._entries),
+                "loaded_models": loaded,
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+_org_models: Optional[OrgModelCache] = None
+_org_models_lock = threading.Lock()
+
+
+def get_org_models() -> OrgModelCache:
+    """
+    The process-wide cache over the global registry, sized by
+    ORG_MODEL_CACHE_MB and refreshed every ORG_MODEL_REFRESH_SECONDS.
+    """
+    global _org_models
+    if _org_models is None:
+        with _org_models_lock:
+            if _org_models is None:
+                _org_models = OrgModelCache(
+                    get_registry(),
+                    max_bytes=int(
+                        float(os.getenv("ORG_MODEL_CACHE_MB", "512")) * 1024 * 1024
+                    ),
+                    refresh_seconds=float(os.getenv("ORG_MODEL_REFRESH_SECONDS", "60")),
+                )
+    return _org_models
+
+
+def _reset_after_fork() -> None:
+    global _org_models_lock
+    _org_models_lock = threading.Lock()
+    if _org_models is not None:
+        _org_models._after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
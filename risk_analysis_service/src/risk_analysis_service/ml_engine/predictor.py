@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Union
 
 import warnings
 import numpy as np
@@ -26,6 +26,17 @@ class AnomalyDetector:
         self.model: Optional[BaseEstimator] = None
         self.scaler: Optional[StandardScaler] = None
 
+        # Without explicit paths, use the process-wide model registry so every
+        # detector shares one loaded (and hot-swappable) model
+        self._registry = None
+        if model_path is None and scaler_path is None:
+            from .model_registry import get_registry
+
+            self._registry = get_registry()
+            if self._registry.ensure_loaded() is None:
+                warnings.warn("No model in the registry. Predictions will be disabled.")
+            return
+
                      
         try:
             if self._scaler_path.exists():
@@ -67,7 +78,15 @@ class AnomalyDetector:
         if features_df.empty:
             return pd.DataFrame(index=features_df.index, data={"prediction": []})
 
-        if self.scaler is None or self.model is None:
+        model, scaler = self.model, self.scaler
+        forest_scorer: Optional[ForestScorer] = None
+        if self._registry is not None:
+            loaded = self._registry.current
+            forest_scorer = loaded.forest_scorer if loaded else None
+            if forest_scorer is None and loaded is not None:
+                model, scaler = loaded.model, loaded.scaler
+
+        if forest_scorer is None and (scaler is None or model is None):
             warnings.warn("Model or scaler is not loaded. Returning NaN predictions.")
             return pd.DataFrame(
                 index=features_df.index,
@@ -77,8 +96,10 @@ class AnomalyDetector:
                                                        
         features_clean = features_df.fillna(0)
         try:
-            X_scaled = self.scaler.transform(features_clean.values)
-            preds = self.model.predict(X_scaled)
+            if forest_scorer is not None:
+                preds = forest_scorer.predict(features_clean.values)
+            else:
+                preds = model.predict(scaler.transform(features_clean.values))
         except Exception as exc:
             warnings.warn(f"Inference failed: {exc}. Returning NaN predictions.")
             return pd.DataFrame(
@@ -87,3 +108,169 @@ class AnomalyDetector:
             )
 
         return pd.DataFrame(index=features_df.index, data={"prediction": preds})
+
+
+class ForestScorer:
+    """
+    IsolationForest inference on the flattened arrays produced by
+    train_model.flatten_isolation_forest / export_forest.
+
+    All trees are walked together, one tree level per step, with vectorized
+    indexing, so a batch costs max_depth NumPy passes instead of one Python
+    call per estimator. Scores and decisions follow sklearn's
+    score_samples / decision_function / predict, including its float32 cast of
+    the input before the threshold comparisons.
+    """
+
+    # Rows scored per vectorized pass
+    BLOCK_ROWS = 256
+    # Larger inputs are deduplicated before scoring
+    DEDUP_MIN_ROWS = 32
+
+    _ARRAYS = (
+        "feature",
+        "threshold",
+        "left",
+        "right",
+        "leaf_path",
+        "roots",
+        "max_depth",
+        "path_norm",
+        "offset",
+        "n_features",
+    )
+
+    def __init__(self, arrays: Dict[str, np.ndarray]) -> None:
+        missing = [name for name in self._ARRAYS if name not in arrays]
+        if missing:
+            raise ValueError(f"Forest arrays missing: {', '.join(missing)}")
+        self.feature = np.asarray(arrays["feature"], dtype=np.intp)
+        self.threshold = np.asarray(arrays["threshold"], dtype=np.float64)
+        self.left = np.asarray(arrays["left"], dtype=np.intp)
+        self.right = np.asarray(arrays["right"], dtype=np.intp)
+        self.leaf_path = np.asarray(arrays["leaf_path"], dtype=np.float64)
+        self.roots = np.asarray(arrays["roots"], dtype=np.intp)
+        self.max_depth = int(arrays["max_depth"])
+        self.offset = float(arrays["offset"])
+        self.n_features = int(arrays["n_features"])
+        self._denominator = len(self.roots) * float(arrays["path_norm"])
+        # Child lookup table: children[2 * node + (x <= threshold)] is the next node
+        if "children" in arrays:
+            self._children = np.asarray(arrays["children"], dtype=np.intp)
+        else:
+            self._children = np.stack([self.right, self.left], axis=1).ravel()
+        self.scaler_mean: Optional[np.ndarray] = None
+        self.scaler_scale: Optional[np.ndarray] = None
+        if "scaler_mean" in arrays and "scaler_scale" in arrays:
+            self.scaler_mean = np.asarray(arrays["scaler_mean"], dtype=np.float64)
+            self.scaler_scale = np.asarray(arrays["scaler_scale"], dtype=np.float64)
+
+    @classmethod
+    def load(
+        cls, path: Union[str, Path], mmap_mode: Optional[str] = "r"
+    ) -> "ForestScorer":
+        """
+        Load a directory of <name>.npy arrays written by export_forest. With
+        mmap_mode="r" (the default) the node tables are mapped read-only
+        rather than copied, so every process scoring with the same files
+        shares one copy in the page cache.
+        """
+        path = Path(path)
+        if not path.is_dir():
+            raise FileNotFoundError(f"Forest directory not found: {path}")
+        return cls(
+            {
+                array_path.stem: np.load(array_path, mmap_mode=mmap_mode)
+                for array_path in path.glob("*.npy")
+            }
+        )
+
+    @classmethod
+    def from_model(
+        cls, model: BaseEstimator, scaler: Optional[StandardScaler] = None
+    ) -> "ForestScorer":
+        from .train_model import flatten_isolation_forest
+
+        return cls(flatten_isolation_forest(model, scaler))
+
+    @property
+    def includes_scaler(self) -> bool:
+        return self.scaler_mean is not None
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the node tables, whether mapped or in private memory.
+        """
+        return sum(
+            array.nbytes
+            for array in (
+                self.feature,
+                self.threshold,
+                self.left,
+                self.right,
+                self.leaf_path,
+                self.roots,
+                self._children,
+            )
+        )
+
+    def _prepare(self, X: np.ndarray, scaled: bool) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"Expected input of shape (n, {self.n_features}), got {X.shape}"
+            )
+        if not scaled and self.scaler_mean is not None:
+            X = (X - self.scaler_mean) / self.scaler_scale
+        # sklearn trees compare float32 inputs against float64 thresholds
+        return X.astype(np.float32).astype(np.float64)
+
+    def score_samples(self, X: np.ndarray, scaled: bool = False) -> np.ndarray:
+        """
+        sklearn IsolationForest.score_samples for raw feature rows, or for rows
+        already transformed by the scaler when scaled=True.
+        """
+        X = self._prepare(X, scaled)
+        inverse = None
+        if X.shape[0] > self.DEDUP_MIN_ROWS:
+            # Hourly count features repeat a lot; score each distinct row once
+            rows = np.ascontiguousarray(X).view(
+                np.dtype((np.void, X.dtype.itemsize * X.shape[1]))
+            )
+            _, first, inverse = np.unique(
+                rows.ravel(), return_index=True, return_inverse=True
+            )
+            X = X[first]
+        n_samples = X.shape[0]
+        depths = np.empty(n_samples, dtype=np.float64)
+        # Row blocks keep the (rows x trees) node matrices cache-sized
+        for start in range(0, n_samples, self.BLOCK_ROWS):
+            block = X[start : start + self.BLOCK_ROWS]
+            depths[start : start + len(block)] = self._path_lengths(block)
+        scores = -(2.0 ** (-depths / self._denominator))
+        return scores if inverse is None else scores[inverse.ravel()]
+
+    def _path_lengths(self, X: np.ndarray) -> np.ndarray:
+        """
+        Sum over trees of each row's leaf depth plus c(leaf samples).
+        """
+        n_rows = X.shape[0]
+        values = X.ravel()
+        row_base = (np.arange(n_rows, dtype=np.intp) * self.n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = values[row_base + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = self._children[2 * nodes + go_left]
+        return self.leaf_path[nodes].sum(axis=1)
+
+    def decision_function(self, X: np.ndarray, scaled: bool = False) -> np.ndarray:
+        return self.score_samples(X, scaled) - self.offset
+
+    def predict(self, X: np.ndarray, scaled: bool = False) -> np.ndarray:
+        """
+        -1 for anomalies and 1 for inliers, as IsolationForest.predict.
+        """
+        is_inlier = np.ones(np.shape(X)[0], dtype=np.int64)
+        is_inlier[self.decision_function(X, scaled) < 0] = -1
+        return is_inlier
@@ -1,5 +1,8 @@
+import os
+import shutil
+import tempfile
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -7,6 +10,9 @@ from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 import joblib
 
+if TYPE_CHECKING:
+    from .model_registry import ModelRegistry
+
 
 def _default_training_csv_path() -> Path:
     """
@@ -34,7 +40,7 @@ def preprocess_and_aggregate(file_path: Optional[str] = None) -> pd.DataFrame:
       - failure_ratio
       - unique_ips
       - critical_actions_count
-      - is_night (hour in [0..6] or [21..23] based on window start)
+      - is_night (hour in [0..6] or [21..23] based on UTC window start)
 
     Returns a DataFrame indexed by [event_time, entity_id].
     """
@@ -42,11 +48,20 @@ def preprocess_and_aggregate(file_path: Optional[str] = None) -> pd.DataFrame:
     if not csv_path.exists():
         raise FileNotFoundError(f"Training data not found at: {csv_path}")
 
-    df = pd.read_csv(csv_path)
+    return aggregate_hourly_features(pd.read_csv(csv_path))
+
 
+def aggregate_hourly_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Hourly behavior features, as described in preprocess_and_aggregate, for a
+    DataFrame of raw events (training CSV or AuditEventRepository.fetch_events_df).
+    """
+    df = df.copy()
     if "event_time" not in df.columns:
         raise ValueError("Input CSV must contain 'event_time' column.")
-    df["event_time"] = pd.to_datetime(df["event_time"], errors="coerce")
+    # UTC like hourly_features.epoch_hour: naive times are taken as UTC and
+    # offsets converted, so mixed naive/aware columns are not coerced to NaT
+    df["event_time"] = pd.to_datetime(df["event_time"], utc=True, errors="coerce")
     df = df.dropna(subset=["event_time"])
 
     for required_col in ["actor_identity", "actor_ip_address", "action_name"]:
@@ -95,15 +110,140 @@ def preprocess_and_aggregate(file_path: Optional[str] = None) -> pd.DataFrame:
     return features
 
 
-def train_and_save_model(
-    features_df: pd.DataFrame,
-) -> Tuple[IsolationForest, StandardScaler]:
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
     """
-    Fill missing values, scale features, train IsolationForest, and persist artifacts.
-    Saves:
-      - model.pkl
-      - scaler.pkl
-    to the ml_engine directory.
+    Average path length of an unsuccessful BST search over n samples, c(n);
+    the correction IsolationForest adds at leaves that hold several samples.
+    """
+    n = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n)
+    result[n == 2] = 1.0
+    many = n > 2
+    result[many] = (
+        2.0 * (np.log(n[many] - 1.0) + np.euler_gamma) - 2.0 * (n[many] - 1.0) / n[many]
+    )
+    return result
+
+
+def flatten_isolation_forest(
+    model: IsolationForest, scaler: Optional[StandardScaler] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Flatten a fitted IsolationForest (and optionally its StandardScaler) into
+    contiguous arrays for the NumPy scorer in predictor.py.
+
+    All trees are concatenated into one node table. Internal nodes hold the
+    input column (per-estimator feature subsets already applied), threshold and
+    child indices; leaves point to themselves and hold their depth plus the
+    c(n_node_samples) path-length correction in `leaf_path`. `children`
+    interleaves right/left so children[2 * node + went_left] is the next node.
+    """
+    features, thresholds, lefts, rights, leaf_paths, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator, columns in zip(model.estimators_, model.estimators_features_):
+        tree = estimator.tree_
+        count = tree.node_count
+        is_leaf = tree.children_left == -1
+        node_ids = np.arange(count)
+
+        depth = np.zeros(count, dtype=np.int64)
+        for node in range(count):
+            if not is_leaf[node]:
+                depth[tree.children_left[node]] = depth[node] + 1
+                depth[tree.children_right[node]] = depth[node] + 1
+
+        features.append(np.where(is_leaf, 0, np.asarray(columns)[tree.feature]))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+        leaf_paths.append(
+            np.where(is_leaf, depth + _average_path_length(tree.n_node_samples), 0.0)
+        )
+        roots.append(offset)
+        offset += count
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    left = np.concatenate(lefts).astype(np.intp)
+    right = np.concatenate(rights).astype(np.intp)
+    arrays: Dict[str, np.ndarray] = {
+        "feature": np.concatenate(features).astype(np.intp),
+        "threshold": np.concatenate(thresholds).astype(np.float64),
+        "left": left,
+        "right": right,
+        "children": np.stack([right, left], axis=1).ravel(),
+        "leaf_path": np.concatenate(leaf_paths).astype(np.float64),
+        "roots": np.asarray(roots, dtype=np.intp),
+        "max_depth": np.asarray(max_depth, dtype=np.int64),
+        # Mean path length of max_samples_ points; normalizes the scores
+        "path_norm": _average_path_length(np.asarray(model.max_samples_)),
+        "offset": np.asarray(model.offset_, dtype=np.float64),
+        "n_features": np.asarray(model.n_features_in_, dtype=np.int64),
+    }
+    if scaler is not None:
+        n_features = int(model.n_features_in_)
+        mean = scaler.mean_ if scaler.with_mean else None
+        scale = scaler.scale_ if scaler.with_std else None
+        arrays["scaler_mean"] = np.asarray(
+            mean if mean is not None else np.zeros(n_features), dtype=np.float64
+        )
+        arrays["scaler_scale"] = np.asarray(
+            scale if scale is not None else np.ones(n_features), dtype=np.float64
+        )
+    return arrays
+
+
+def export_forest(
+    model: IsolationForest,
+    scaler: Optional[StandardScaler] = None,
+    path: Optional[Path] = None,
+) -> Path:
+    """
+    Write flatten_isolation_forest() arrays as raw .npy files into a `forest`
+    directory (next to model.pkl by default), replacing it as a whole.
+    predictor.ForestScorer.load() memory-maps them, so worker processes share
+    the node tables through the page cache instead of each unpickling the model.
+    """
+    path = Path(path or Path(__file__).resolve().parent / "forest")
+    arrays = flatten_isolation_forest(model, scaler)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(dir=path.parent, prefix=f".{path.name}-"))
+    try:
+        for name, array in arrays.items():
+            np.save(staging / f"{name}.npy", array)
+        if path.exists():
+            shutil.rmtree(path)
+        os.replace(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return path
+
+
+def features_by_organization(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Split training data with an organization_id column into one feature frame
+    per organization. Accepts raw events (aggregated per organization like
+    preprocess_and_aggregate) or an export of hourly features that already has
+    the feature columns.
+    """
+    from .hourly_features import FEATURE_COLUMNS
+
+    if "organization_id" not in df.columns:
+        raise ValueError("Per-organization training needs an 'organization_id' column.")
+    is_feature_export = all(column in df.columns for column in FEATURE_COLUMNS)
+    features: Dict[str, pd.DataFrame] = {}
+    for organization_id, org_df in df.groupby("organization_id", sort=True):
+        if not is_feature_export:
+            org_df = aggregate_hourly_features(org_df)
+        features[str(organization_id)] = org_df[FEATURE_COLUMNS]
+    return features
+
+
+def fit_model(features_df: pd.DataFrame) -> Tuple[IsolationForest, StandardScaler]:
+    """
+    Fill missing values, scale features and train the IsolationForest.
     """
     if features_df.empty:
         raise ValueError("Features DataFrame is empty; cannot train model.")
@@ -121,42 +261,173 @@ def train_and_save_model(
         bootstrap=True,
     )
     model.fit(scaled_values)
+    return model, scaler
 
-    output_dir = Path(__file__).resolve().parent
-    output_dir.mkdir(parents=True, exist_ok=True)
 
-    model_path = output_dir / "model.pkl"
-    scaler_path = output_dir / "scaler.pkl"
+def save_artifacts(
+    model: IsolationForest, scaler: StandardScaler, output_dir: Path
+) -> None:
+    """
+    Write model.pkl, scaler.pkl and forest/ into output_dir.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    joblib.dump(model, output_dir / "model.pkl")
+    joblib.dump(scaler, output_dir / "scaler.pkl")
+    export_forest(model, scaler, output_dir / "forest")
 
-    joblib.dump(model, model_path)
-    joblib.dump(scaler, scaler_path)
 
+def train_and_save_model(
+    features_df: pd.DataFrame,
+) -> Tuple[IsolationForest, StandardScaler]:
+    """
+    Fill missing values, scale features, train IsolationForest, and persist artifacts.
+    Saves:
+      - model.pkl
+      - scaler.pkl
+      - forest/ (flattened forest and scaler as .npy arrays for predictor.ForestScorer)
+    to the ml_engine directory.
+    """
+    model, scaler = fit_model(features_df)
+    save_artifacts(model, scaler, Path(__file__).resolve().parent)
     return model, scaler
 
 
+def train_organization_models(
+    features: Dict[str, pd.DataFrame],
+    registry: "ModelRegistry",
+    min_rows: int = 200,
+    activate: bool = False,
+) -> Dict[str, str]:
+    """
+    Train one model per organization and publish it into that organization's
+    model registry (model_registry.ModelRegistry.organization_registry).
+    Organizations with fewer than min_rows hourly rows are skipped and keep
+    using the global model. Returns the published version per organization.
+    """
+    versions: Dict[str, str] = {}
+    for organization_id, features_df in features.items():
+        if len(features_df) < min_rows:
+            continue
+        model, scaler = fit_model(features_df)
+        with tempfile.TemporaryDirectory() as tmp:
+            save_artifacts(model, scaler, Path(tmp))
+            versions[organization_id] = registry.organization_registry(
+                organization_id
+            ).publish(Path(tmp), activate=activate)
+    return versions
+
+
 if __name__ == "__main__":
-    import sys
-
-    # Check for command line argument
-    data_file = None
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ["-h", "--help"]:
-            print("Usage: python train_model.py [data_file.csv]")
-            print("  data_file.csv: Optional path to training data CSV")
-            sys.exit(0)
-        data_file = sys.argv[1]
-
-    print("Starting preprocessing and aggregation...")
-    if data_file:
-        print(f"Using training data: {data_file}")
-    aggregated_df = preprocess_and_aggregate(data_file)
-    print(f"Aggregated feature shape: {aggregated_df.shape}")
-
-    print("Training IsolationForest model and saving artifacts...")
-    model, scaler = train_and_save_model(aggregated_df)
+    import argparse
 
+    parser = argparse.ArgumentParser(description="Train the IsolationForest model.")
+    parser.add_argument(
+        "data_file", nargs="?", help="Optional path to training data CSV"
+    )
+    parser.add_argument(
+        "--export-forest",
+        action="store_true",
+        help="Only write forest/ from the existing model.pkl/scaler.pkl",
+    )
+    parser.add_argument(
+        "--publish",
+        action="store_true",
+        help="Publish the artifacts as a new model registry version "
+        "(run as python -m risk_analysis_service.ml_engine.train_model)",
+    )
+    parser.add_argument(
+        "--activate",
+        action="store_true",
+        help="With --publish or --per-org, make the new versions current",
+    )
+    parser.add_argument(
+        "--per-org",
+        action="store_true",
+        help="Train and publish one model per organization_id (the data needs an "
+        "organization_id column: raw events or an hourly feature export)",
+    )
+    parser.add_argument(
+        "--min-rows",
+        type=int,
+        default=200,
+        help="With --per-org, skip organizations with fewer hourly rows (default: 200)",
+    )
+    parser.add_argument(
+        "--from-db",
+        action="store_true",
+        help="Read raw events from the audit_events table instead of a CSV",
+    )
+    parser.add_argument(
+        "--hours",
+        type=int,
+        default=None,
+        help="With --from-db, only use events from the last N hours",
+    )
+    args = parser.parse_args()
     artifacts_dir = Path(__file__).resolve().parent
-    print("Artifacts saved:")
-    print(f" - Model: {artifacts_dir / 'model.pkl'}")
-    print(f" - Scaler: {artifacts_dir / 'scaler.pkl'}")
+
+    def load_events() -> pd.DataFrame:
+        if args.from_db:
+            from ..db.repositories.audit_event_repository import AuditEventRepository
+            from ..db.session import SessionLocal
+
+            print("Reading audit events from the database...")
+            with SessionLocal() as db:
+                return AuditEventRepository(db).fetch_events_df(hours=args.hours)
+        csv_path = (
+            Path(args.data_file) if args.data_file else _default_training_csv_path()
+        )
+        print(f"Using training data: {csv_path}")
+        return pd.read_csv(csv_path)
+
+    if args.per_org:
+        from .model_registry import registry_from_env
+
+        features = features_by_organization(load_events())
+        print(f"Training models for {len(features)} organizations...")
+        registry = registry_from_env()
+        versions = train_organization_models(
+            features, registry, min_rows=args.min_rows, activate=args.activate
+        )
+        for organization_id, features_df in features.items():
+            version = versions.get(organization_id)
+            state = (
+                f"published {version}"
+                if version
+                else f"skipped ({len(features_df)} rows), uses the global model"
+            )
+            print(f" - {organization_id}: {state}")
+        if versions and not args.activate:
+            print("Versions were not activated (use --activate).")
+    elif args.export_forest:
+        forest_path = export_forest(
+            joblib.load(artifacts_dir / "model.pkl"),
+            joblib.load(artifacts_dir / "scaler.pkl"),
+        )
+        print(f"Forest exported: {forest_path}")
+    else:
+        print("Starting preprocessing and aggregation...")
+        if args.from_db:
+            aggregated_df = aggregate_hourly_features(load_events())
+        else:
+            if args.data_file:
+                print(f"Using training data: {args.data_file}")
+            aggregated_df = preprocess_and_aggregate(args.data_file)
+        print(f"Aggregated feature shape: {aggregated_df.shape}")
+
+        print("Training IsolationForest model and saving artifacts...")
+        model, scaler = train_and_save_model(aggregated_df)
+
+        print("Artifacts saved:")
+        print(f" - Model: {artifacts_dir / 'model.pkl'}")
+        print(f" - Scaler: {artifacts_dir / 'scaler.pkl'}")
+        print(f" - Forest: {artifacts_dir / 'forest'}")
+
+    if args.publish and not args.per_org:
+        from .model_registry import registry_from_env
+
+        registry = registry_from_env()
+        version = registry.publish(artifacts_dir, activate=args.activate)
+        state = "active" if args.activate else "not activated"
+        print(f"Published model version {version} ({state}) in {registry.root}")
     print("Done.")
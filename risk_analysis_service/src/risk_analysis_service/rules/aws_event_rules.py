@@ -1,9 +1,16 @@
 from __future__ import annotations
 
+from ..core.keyword_matcher import keyword_matcher
 from .event_base import EventRule
 from .base import Severity
 from ..schemas.audit_event import GenericAuditEvent, EventStatus
 
+CRITICAL_RESOURCE_KEYWORDS = ("bucket", "db", "instance")
+CRITICAL_RESOURCE = "critical_resource"
+DELETE_ACTION = "delete_action"
+keyword_matcher.add_keywords(CRITICAL_RESOURCE, CRITICAL_RESOURCE_KEYWORDS)
+keyword_matcher.add_prefixes(DELETE_ACTION, ("delete",))
+
 
 class RootUsageRule(EventRule):
     code = "AWS_ROOT_USAGE"
@@ -25,6 +32,7 @@ class UnauthorizedAccessRule(EventRule):
         "(brute-force) або помилки конфігурації."
     )
     severity = Severity.Medium
+    statuses = (EventStatus.FAILURE,)
 
     def check(self, event: GenericAuditEvent) -> bool:
         return event.event_status == EventStatus.FAILURE
@@ -37,15 +45,14 @@ class CriticalResourceDeletionRule(EventRule):
         "Це може бути саботаж або випадкове видалення інфраструктури."
     )
     severity = Severity.High
+    action_prefixes = ("delete",)
 
     def check(self, event: GenericAuditEvent) -> bool:
-        action_name = (event.action_name or "").lower()
-        if not action_name.startswith("delete"):
+        if DELETE_ACTION not in keyword_matcher.categories(event.action_name or ""):
             return False
-
-        target_resource = (event.target_resource or "").lower()
-        critical_keywords = ("bucket", "db", "instance")
-        return any(keyword in target_resource for keyword in critical_keywords)
+        return CRITICAL_RESOURCE in keyword_matcher.categories(
+            event.target_resource or ""
+        )
 
 
 AWS_EVENT_RULES = [
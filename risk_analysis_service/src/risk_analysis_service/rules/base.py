@@ -2,8 +2,9 @@ from __future__ import annotations
 
 from abc import ABC, abstractmethod
 from enum import Enum
+from typing import Tuple
 
-from ..schemas.cloud_resource import GenericCloudResource
+from ..schemas.cloud_resource import GenericCloudResource, ResourceType
 
 
 class Severity(str, Enum):
@@ -16,6 +17,8 @@ class Rule(ABC):
     code: str
     description: str
     severity: Severity
+    # Resource types the rule can match; empty for any (see rules.registry)
+    resource_types: Tuple[ResourceType, ...] = ()
 
     @abstractmethod
     def check(self, resource: GenericCloudResource) -> bool:
@@ -0,0 +1,441 @@
+"""
+Tenant-defined rules stored in CloudResource.custom_rules.
+
+The "rules" list of custom_rules holds declarative definitions:
+
+    {"rules": [{
+        "code": "DELETE_OUTSIDE_CI",
+        "description": "Deletes must come from the CI runners",
+        "severity": "High",
+        "target": "event",
+        "when": {"all": [
+            {"field": "action_name", "prefix": ["Delete", "Put"]},
+            {"not": {"field": "actor_ip_address", "in": ["10.0.0.5"]}}
+        ]}
+    }]}
+
+A condition is "all"/"any" over a list of conditions, "not" over one, or a
+field predicate with exactly one operator (see OPERATORS) and an optional
+"ignore_case". Fields are dotted paths into the audit event (target "event",
+the default) or the GenericCloudResource (target "resource"), e.g.
+"event_time.hour" or "configuration.is_public". The "blocked_actions" list
+(see ResourceConfigUpdate) is shorthand for a BLOCKED_ACTION event rule.
+"regex" patterns are RE2 syntax (no backreferences or lookaround) and match
+in linear time, so a tenant pattern cannot stall the analyzer by backtracking.
+
+Definitions are compiled once into closures and cached by resource id and
+content hash, so the analyzer never interprets the JSON per event. The
+prefix/suffix/contains predicates of a rule set share one KeywordMatcher.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import operator
+import os
+import threading
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Tuple
+
+from ..core.keyword_matcher import KeywordMatcher
+from .base import Severity
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+logger = logging.getLogger("risk_analysis.rules")
+
+Predicate = Callable[[Any], bool]
+
+EVENT_FIELDS = frozenset(
+    {
+        "event_id",
+        "event_time",
+        "actor_identity",
+        "actor_ip_address",
+        "action_name",
+        "target_resource",
+        "event_status",
+        "cloud_provider",
+        "raw_log",
+    }
+)
+RESOURCE_FIELDS = frozenset(
+    {"resource_id", "resource_type", "cloud_provider", "account_id", "configuration"}
+)
+TARGET_FIELDS: Dict[str, frozenset] = {
+    "event": EVENT_FIELDS,
+    "resource": RESOURCE_FIELDS,
+}
+
+OPERATORS = frozenset(
+    {
+        "equals",
+        "not_equals",
+        "in",
+        "not_in",
+        "prefix",
+        "suffix",
+        "contains",
+        "regex",
+        "exists",
+        "gt",
+        "gte",
+        "lt",
+        "lte",
+    }
+)
+
+MAX_RULES: int = 100
+MAX_DEPTH: int = 16
+MAX_PATTERN_LENGTH: int = 512
+# Field values whose matches each rule set remembers
+MATCHER_CACHE_SIZE: int = 1024
+
+
+class RuleSyntaxError(ValueError):
+    """
+    A custom rule definition that cannot be compiled.
+    """
+
+
+class CustomRule(NamedTuple):
+    code: str
+    description: str
+    severity: Severity
+    check: Predicate
+
+
+class CompiledRuleSet(NamedTuple):
+    event_rules: Tuple[CustomRule, ...] = ()
+    resource_rules: Tuple[CustomRule, ...] = ()
+
+
+EMPTY_RULE_SET = CompiledRuleSet()
+
+
+def _field_getter(path: str, target: str) -> Callable[[Any], Any]:
+    if not isinstance(path, str) or not path:
+        raise RuleSyntaxError("field must be a non-empty string")
+    head, *rest = path.split(".")
+    if head not in TARGET_FIELDS[target]:
+        raise RuleSyntaxError(f"Unknown {target} field: {head}")
+
+    def get(subject: Any) -> Any:
+        value = getattr(subject, head, None)
+        for name in rest:
+            if isinstance(value, Mapping):
+                value = value.get(name)
+            else:
+                value = getattr(value, name, None)
+            if value is None:
+                return None
+        return value.value if isinstance(value, Enum) else value
+
+    return get
+
+
+def _fold(value: Any) -> Any:
+    return value.lower() if isinstance(value, str) else value
+
+
+def _strings(operand: Any, op: str) -> Tuple[str, ...]:
+    values = (operand,) if isinstance(operand, str) else operand
+    if not isinstance(values, (list, tuple)) or not all(
+        isinstance(v, str) for v in values
+    ):
+        raise RuleSyntaxError(f"{op} takes a string or a list of strings")
+    return tuple(values)
+
+
+def _scalars(operand: Any, op: str) -> frozenset:
+    if not isinstance(operand, list) or not all(
+        isinstance(v, (str, int, float, bool)) or v is None for v in operand
+    ):
+        raise RuleSyntaxError(f"{op} takes a list of scalar values")
+    return frozenset(operand)
+
+
+class _StringMatchers:
+    """
+    The prefix/suffix/contains predicates of one rule set, compiled into a
+    KeywordMatcher per case mode with one category per predicate, so all of
+    them are answered by a single cached scan of each field value.
+    """
+
+    def __init__(self) -> None:
+        self._matchers: Dict[bool, KeywordMatcher] = {}
+        self._count = 0
+
+    def predicate(
+        self, op: str, needles: Tuple[str, ...], ignore_case: bool
+    ) -> Predicate:
+        matcher = self._matchers.get(ignore_case)
+        if matcher is None:
+            matcher = self._matchers[ignore_case] = KeywordMatcher(
+                ignore_case=ignore_case, cache_size=MATCHER_CACHE_SIZE
+            )
+        category = str(self._count)
+        self._count += 1
+        if op == "prefix":
+            matcher.add_prefixes(category, needles)
+        elif op == "suffix":
+            matcher.add_suffixes(category, needles)
+        else:
+            matcher.add_keywords(category, needles)
+        return lambda value: isinstance(value, str) and category in matcher.categories(
+            value
+        )
+
+
+def _compile_operator(
+    op: str, operand: Any, ignore_case: bool, strings: _StringMatchers
+) -> Predicate:
+    """
+    Test applied to the field value.
+    """
+    fold = _fold if ignore_case else (lambda value: value)
+    if op in ("equals", "not_equals"):
+        expected = fold(operand)
+        if op == "equals":
+            return lambda value: fold(value) == expected
+        return lambda value: fold(value) != expected
+    if op in ("in", "not_in"):
+        members = frozenset(fold(v) for v in _scalars(operand, op))
+        if op == "in":
+            return lambda value: fold(value) in members
+        return lambda value: fold(value) not in members
+    if op in ("prefix", "suffix", "contains"):
+        return strings.predicate(op, _strings(operand, op), ignore_case)
+    if op == "regex":
+        if not isinstance(operand, str) or len(operand) > MAX_PATTERN_LENGTH:
+            raise RuleSyntaxError(
+                f"regex takes a pattern of at most {MAX_PATTERN_LENGTH} characters"
+            )
+        if re2 is None:
+            raise RuleSyntaxError("regex requires the google-re2 package")
+        # RE2 matches in time linear in the input; constructs that need
+        # backtracking (backreferences, lookaround) fail to compile
+        options = re2.Options()
+        options.case_sensitive = not ignore_case
+        options.never_capture = True
+        options.log_errors = False
+        try:
+            pattern = re2.compile(operand, options)
+        except re2.error as exc:
+            reason = exc.args[0] if exc.args else exc
+            if isinstance(reason, bytes):
+                reason = reason.decode("utf-8", "replace")
+            raise RuleSyntaxError(f"Invalid regex {operand!r}: {reason}") from exc
+        return (
+            lambda value: isinstance(value, str) and pattern.search(value) is not None
+        )
+    if op == "exists":
+        if not isinstance(operand, bool):
+            raise RuleSyntaxError("exists takes true or false")
+        return lambda value: (value is not None) is operand
+    if op in ("gt", "gte", "lt", "lte"):
+        if isinstance(operand, bool) or not isinstance(operand, (int, float)):
+            raise RuleSyntaxError(f"{op} takes a number")
+        compare = getattr(operator, op.replace("gte", "ge").replace("lte", "le"))
+        return lambda value: (
+            isinstance(value, (int, float))
+            and not isinstance(value, bool)
+            and compare(value, operand)
+        )
+    raise RuleSyntaxError(f"Unknown operator: {op}")
+
+
+def _compile_condition(
+    node: Any, target: str, strings: _StringMatchers, depth: int = 0
+) -> Predicate:
+    if depth > MAX_DEPTH:
+        raise RuleSyntaxError(f"Conditions nest deeper than {MAX_DEPTH} levels")
+    if not isinstance(node, Mapping):
+        raise RuleSyntaxError("A condition must be an object")
+    if "all" in node or "any" in node:
+        if len(node) != 1:
+            raise RuleSyntaxError("all/any must be the only key of a condition")
+        combinator, children = next(iter(node.items()))
+        if not isinstance(children, list) or not children:
+            raise RuleSyntaxError(f"{combinator} takes a non-empty list")
+        parts = tuple(
+            _compile_condition(c, target, strings, depth + 1) for c in children
+        )
+        if len(parts) == 1:
+            return parts[0]
+        if combinator == "all":
+            return lambda subject: all(p(subject) for p in parts)
+        return lambda subject: any(p(subject) for p in parts)
+    if "not" in node:
+        if len(node) != 1:
+            raise RuleSyntaxError("not must be the only key of a condition")
+        inner = _compile_condition(node["not"], target, strings, depth + 1)
+        return lambda subject: not inner(subject)
+
+    ops = [key for key in node if key in OPERATORS]
+    unknown = set(node) - OPERATORS - {"field", "ignore_case"}
+    if "field" not in node or len(ops) != 1 or unknown:
+        raise RuleSyntaxError(
+            "A predicate needs a field and exactly one operator "
+            f"({', '.join(sorted(OPERATORS))})"
+        )
+    get = _field_getter(node["field"], target)
+    test = _compile_operator(
+        ops[0], node[ops[0]], bool(node.get("ignore_case")), strings
+    )
+    return lambda subject: test(get(subject))
+
+
+def _parse_severity(value: Any) -> Severity:
+    for severity in Severity:
+        if isinstance(value, str) and value.strip().lower() == severity.value.lower():
+            return severity
+    raise RuleSyntaxError(
+        f"severity must be one of {', '.join(s.value for s in Severity)}"
+    )
+
+
+def _compile_rule(definition: Any, strings: _StringMatchers) -> Tuple[str, CustomRule]:
+    if not isinstance(definition, Mapping):
+        raise RuleSyntaxError("A rule must be an object")
+    code = definition.get("code")
+    if not isinstance(code, str) or not code.strip() or len(code) > 100:
+        raise RuleSyntaxError("code must be a non-empty string of at most 100 chars")
+    target = definition.get("target", "event")
+    if target not in TARGET_FIELDS:
+        raise RuleSyntaxError(f"{code}: target must be 'event' or 'resource'")
+    if "when" not in definition:
+        raise RuleSyntaxError(f"{code}: missing 'when' condition")
+    try:
+        check = _compile_condition(definition["when"], target, strings)
+        severity = _parse_severity(definition.get("severity", Severity.Medium.value))
+    except RuleSyntaxError as exc:
+        raise RuleSyntaxError(f"{code}: {exc}") from None
+    description = definition.get("description") or f"Custom rule {code} matched."
+    return target, CustomRule(
+        code=code.strip(),
+        description=str(description),
+        severity=severity,
+        check=check,
+    )
+
+
+def compile_custom_rules(custom_rules: Mapping[str, Any] | None) -> CompiledRuleSet:
+    """
+    Compile a custom_rules document; raises RuleSyntaxError on the first
+    invalid definition. Keys other than "rules" and "blocked_actions" are
+    configuration and ignored here.
+    """
+    if not custom_rules:
+        return EMPTY_RULE_SET
+    definitions: List[Any] = []
+    blocked = custom_rules.get("blocked_actions")
+    if blocked:
+        definitions.append(
+            {
+                "code": "BLOCKED_ACTION",
+                "description": "Action blocked by the resource's security config.",
+                "severity": Severity.High.value,
+                "when": {"field": "action_name", "in": blocked},
+            }
+        )
+    rules = custom_rules.get("rules") or []
+    if not isinstance(rules, list):
+        raise RuleSyntaxError("rules must be a list")
+    definitions.extend(rules)
+    if len(definitions) > MAX_RULES:
+        raise RuleSyntaxError(f"At most {MAX_RULES} rules per resource")
+
+    compiled: Dict[str, List[CustomRule]] = {target: [] for target in TARGET_FIELDS}
+    strings = _StringMatchers()
+    for definition in definitions:
+        target, rule = _compile_rule(definition, strings)
+        compiled[target].append(rule)
+    return CompiledRuleSet(
+        event_rules=tuple(compiled["event"]),
+        resource_rules=tuple(compiled["resource"]),
+    )
+
+
+def content_hash(custom_rules: Mapping[str, Any] | None) -> str:
+    return hashlib.sha256(
+        json.dumps(custom_rules or {}, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class CustomRuleCache:
+    """
+    Thread-safe LRU of compiled rule sets keyed by (resource_id, content hash).
+
+    A document that fails to compile is logged once and cached as an empty rule
+    set, so a bad definition neither raises in the analyzer nor is recompiled
+    on every batch.
+    """
+
+    def __init__(self, max_entries: int = 10_000) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self._entries: OrderedDict[Tuple[str, str], CompiledRuleSet] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.compiles = 0
+
+    def get(
+        self, resource_id: str, custom_rules: Mapping[str, Any] | None
+    ) -> CompiledRuleSet:
+        if not custom_rules:
+            return EMPTY_RULE_SET
+        key = (resource_id, content_hash(custom_rules))
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+        try:
+            compiled = compile_custom_rules(custom_rules)
+        except RuleSyntaxError as exc:
+            logger.warning("Ignoring custom rules of resource %s: %s", resource_id, exc)
+            compiled = EMPTY_RULE_SET
+        with self._lock:
+            self.compiles += 1
+            self._entries[key] = compiled
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "compiles": self.compiles,
+        }
+
+
+def matching_rules(rules: Tuple[CustomRule, ...], subject: Any) -> List[CustomRule]:
+    """
+    The rules whose condition holds for subject; a rule that raises (e.g. an
+    "in" test on a non-hashable raw_log value) is logged and does not match.
+    """
+    matched: List[CustomRule] = []
+    for rule in rules:
+        try:
+            if rule.check(subject):
+                matched.append(rule)
+        except Exception as exc:
+            logger.warning("Custom rule %s failed: %s", rule.code, exc)
+    return matched
+
+
+# Process-wide cache shared by the event analyzer and analyze_and_save_risks
+custom_rule_cache = CustomRuleCache()
+
+os.register_at_fork(after_in_child=custom_rule_cache._after_fork)
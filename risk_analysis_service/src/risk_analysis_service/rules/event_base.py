@@ -1,15 +1,20 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from typing import Tuple
 
 from .base import Severity
-from ..schemas.audit_event import GenericAuditEvent
+from ..schemas.audit_event import EventStatus, GenericAuditEvent
 
 
 class EventRule(ABC):
     code: str
     description: str
     severity: Severity
+    # Fields the registry indexes the rule by (see rules.registry); empty
+    # matches any value. check() must be false for events outside them.
+    action_prefixes: Tuple[str, ...] = ()
+    statuses: Tuple[EventStatus, ...] = ()
 
     @abstractmethod
     def check(self, event: GenericAuditEvent) -> bool:
@@ -0,0 +1,266 @@
+"""
+Rule registries that only run the rules able to match a given event or resource.
+
+Rules declare the fields they depend on as class attributes (action_prefixes
+and statuses for event rules, resource_types for resource rules; empty means
+any value). The registry reduces each subject to a candidate key from those
+fields and caches the rules applicable to every key, so an event pays one
+prefix scan (cached per action name) plus the checks of its candidates rather
+than one check per registered rule. Per-rule evaluation, hit, error and
+latency counters are kept for the stats endpoint; analysis shard processes hand
+theirs to the parent (take_rule_stats / merge_rule_stats) so the endpoint also
+covers analysis that ran in the shards.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import (
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from ..core.keyword_matcher import KeywordMatcher
+from ..schemas.audit_event import GenericAuditEvent
+from ..schemas.cloud_resource import GenericCloudResource
+from .aws_event_rules import AWS_EVENT_RULES
+from .base import Rule
+from .event_base import EventRule
+from .s3_rules import STORAGE_BUCKET_RULES
+
+logger = logging.getLogger("risk_analysis.rules")
+
+R = TypeVar("R", bound=Union[Rule, EventRule])
+S = TypeVar("S")
+
+# Distinct candidate keys remembered per registry
+CANDIDATE_CACHE_SIZE: int = 4096
+
+
+class RuleStats:
+    __slots__ = ("evaluations", "hits", "errors", "seconds")
+
+    def __init__(self) -> None:
+        self.evaluations = 0
+        self.hits = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def merge(self, other: "RuleStats") -> None:
+        self.evaluations += other.evaluations
+        self.hits += other.hits
+        self.errors += other.errors
+        self.seconds += other.seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "evaluations": self.evaluations,
+            "hits": self.hits,
+            "errors": self.errors,
+            "total_ms": self.seconds * 1e3,
+            "mean_us": (
+                (self.seconds / self.evaluations * 1e6) if self.evaluations else 0.0
+            ),
+        }
+
+
+class _IndexedRules(Generic[R, S]):
+    """
+    Registration, candidate caching and counters; subclasses define the
+    candidate key of a subject and whether a rule applies to a key.
+    """
+
+    def __init__(self, rules: Iterable[R] = ()) -> None:
+        self._rules: List[R] = []
+        self._stats: Dict[str, RuleStats] = {}
+        self._candidates: Dict[Hashable, Tuple[R, ...]] = {}
+        self._lock = threading.Lock()
+        for rule in rules:
+            self.register(rule)
+
+    def register(self, rule: R) -> None:
+        if rule.code in self._stats:
+            raise ValueError(f"Rule {rule.code} is already registered")
+        with self._lock:
+            self._rules.append(rule)
+            self._stats[rule.code] = RuleStats()
+            self._candidates = {}
+        self._on_register(rule)
+
+    @property
+    def rules(self) -> Tuple[R, ...]:
+        return tuple(self._rules)
+
+    def _on_register(self, rule: R) -> None:
+        pass
+
+    def _candidate_key(self, subject: S) -> Hashable:
+        raise NotImplementedError
+
+    def _applies(self, rule: R, key: Hashable) -> bool:
+        raise NotImplementedError
+
+    def candidates(self, subject: S) -> Tuple[R, ...]:
+        """
+        Rules that can match the subject, in registration order.
+        """
+        key = self._candidate_key(subject)
+        cached = self._candidates.get(key)
+        if cached is None:
+            cached = tuple(rule for rule in self._rules if self._applies(rule, key))
+            if len(self._candidates) >= CANDIDATE_CACHE_SIZE:
+                self._candidates = {}
+            self._candidates[key] = cached
+        return cached
+
+    def evaluate(self, subject: S) -> List[R]:
+        """
+        Candidate rules whose check() is true for the subject.
+        """
+        return self.evaluate_many([subject])[0]
+
+    def evaluate_many(self, subjects: Sequence[S]) -> List[List[R]]:
+        """
+        Matching rules per subject. A rule that raises is logged and counted as
+        an error, not a hit. Counters are merged once per call.
+        """
+        local: Dict[str, RuleStats] = {}
+        results: List[List[R]] = []
+        clock = time.perf_counter
+        for subject in subjects:
+            matched: List[R] = []
+            for rule in self.candidates(subject):
+                stats = local.get(rule.code)
+                if stats is None:
+                    stats = local[rule.code] = RuleStats()
+                started = clock()
+                try:
+                    hit = rule.check(subject)
+                except Exception as exc:
+                    stats.errors += 1
+                    hit = False
+                    logger.exception("Rule %s failed: %s", rule.code, exc)
+                stats.seconds += clock() - started
+                stats.evaluations += 1
+                if hit:
+                    stats.hits += 1
+                    matched.append(rule)
+            results.append(matched)
+        with self._lock:
+            for code, stats in local.items():
+                self._stats[code].merge(stats)
+        return results
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {code: stats.as_dict() for code, stats in self._stats.items()}
+
+    def take_stats(self) -> Dict[str, RuleStats]:
+        """
+        Counters of rules evaluated since the previous call; resets them.
+        """
+        with self._lock:
+            taken = {
+                code: stats
+                for code, stats in self._stats.items()
+                if stats.evaluations or stats.errors
+            }
+            for code in taken:
+                self._stats[code] = RuleStats()
+        return taken
+
+    def merge_stats(self, stats: Dict[str, RuleStats]) -> None:
+        """
+        Add counters taken from another process's registry.
+        """
+        with self._lock:
+            for code, other in stats.items():
+                self._stats.setdefault(code, RuleStats()).merge(other)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+
+
+class EventRuleRegistry(_IndexedRules[EventRule, GenericAuditEvent]):
+    """
+    Event rules indexed by lower-cased action-name prefix and event status.
+    """
+
+    def __init__(self, rules: Iterable[EventRule] = ()) -> None:
+        # Each registered prefix is its own category, so one pass over the
+        # action name finds every prefix it starts with
+        self._action_prefixes = KeywordMatcher()
+        super().__init__(rules)
+
+    def _on_register(self, rule: EventRule) -> None:
+        for prefix in rule.action_prefixes:
+            self._action_prefixes.add_prefixes(prefix.lower(), (prefix,))
+
+    def _candidate_key(self, event: GenericAuditEvent) -> Hashable:
+        matched = self._action_prefixes.categories(event.action_name or "")
+        return event.event_status, matched
+
+    def _applies(self, rule: EventRule, key: Hashable) -> bool:
+        status, matched_prefixes = key
+        statuses = rule.statuses
+        if statuses and status not in statuses:
+            return False
+        prefixes = rule.action_prefixes
+        return not prefixes or any(p.lower() in matched_prefixes for p in prefixes)
+
+
+class ResourceRuleRegistry(_IndexedRules[Rule, GenericCloudResource]):
+    """
+    Resource rules indexed by resource type.
+    """
+
+    def _candidate_key(self, resource: GenericCloudResource) -> Hashable:
+        return resource.resource_type
+
+    def _applies(self, rule: Rule, key: Hashable) -> bool:
+        resource_types = rule.resource_types
+        return not resource_types or key in resource_types
+
+
+event_rules = EventRuleRegistry(AWS_EVENT_RULES)
+resource_rules = ResourceRuleRegistry(STORAGE_BUCKET_RULES)
+
+
+def rule_stats() -> Dict[str, Dict[str, Dict[str, float]]]:
+    return {
+        "event_rules": event_rules.stats(),
+        "resource_rules": resource_rules.stats(),
+    }
+
+
+def take_rule_stats() -> Dict[str, Dict[str, RuleStats]]:
+    """
+    Counters accumulated since the previous call, for shipping to the parent.
+    """
+    return {
+        "event_rules": event_rules.take_stats(),
+        "resource_rules": resource_rules.take_stats(),
+    }
+
+
+def merge_rule_stats(stats: Dict[str, Dict[str, RuleStats]]) -> None:
+    event_rules.merge_stats(stats.get("event_rules", {}))
+    resource_rules.merge_stats(stats.get("resource_rules", {}))
+
+
+def _reset_after_fork() -> None:
+    event_rules._after_fork()
+    resource_rules._after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
 from .base import Rule, Severity
-from ..schemas.cloud_resource import GenericCloudResource
+from ..schemas.cloud_resource import GenericCloudResource, ResourceType
 
 
-class PublicAccessRule(Rule):
+class StorageBucketRule(Rule):
+    resource_types = (ResourceType.STORAGE_BUCKET,)
+
+
+class PublicAccessRule(StorageBucketRule):
     code = "S3_PUBLIC_ACCESS"
     description = "Бакет є публічно доступним для всіх в Інтернеті."
     severity = Severity.High
@@ -13,7 +17,7 @@ class PublicAccessRule(Rule):
         return bool(resource.configuration.get("is_public"))
 
 
-class EncryptionDisabledRule(Rule):
+class EncryptionDisabledRule(StorageBucketRule):
     code = "S3_ENCRYPTION_DISABLED"
     description = "Шифрування даних 'at-rest' не налаштовано."
     severity = Severity.Medium
@@ -22,7 +26,7 @@ class EncryptionDisabledRule(Rule):
         return resource.configuration.get("encryption_type") == "NONE"
 
 
-class VersioningDisabledRule(Rule):
+class VersioningDisabledRule(StorageBucketRule):
     code = "S3_VERSIONING_DISABLED"
     description = "Версіонування об'єктів вимкнено."
     severity = Severity.Low
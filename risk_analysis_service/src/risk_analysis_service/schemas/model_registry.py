@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class ModelVersionsResponse(BaseModel):
+    """Model versions known to the registry and the one this process serves."""
+
+    loaded_version: Optional[str] = None
+    active_version: Optional[str] = None
+    versions: List[str] = []
+
+
+class ModelReloadRequest(BaseModel):
+    """Version to activate; omit to reload whatever the CURRENT pointer names."""
+
+    version: Optional[str] = None
+
+
+class ModelReloadResponse(BaseModel):
+    status: str
+    version: str
@@ -60,6 +60,7 @@ class ResourceConfigUpdate(BaseModel):
         criticality: Optional string value for criticality (e.g., 'LOW', 'STANDARD', 'CRITICAL').
         security_config: Optional dict with security settings, e.g.,
             {"blocked_actions": ["DeleteBucket"], "audit_log_enabled": true}.
+            Its "rules" list holds tenant-defined rules (see rules.custom_rules).
     """
 
     criticality: Optional[str] = None
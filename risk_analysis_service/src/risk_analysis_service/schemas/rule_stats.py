@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from typing import Dict
+
+from pydantic import BaseModel
+
+
+class RuleStatsResponse(BaseModel):
+    """
+    Per-rule counters of the process that served the request, including the
+    analysis shards it runs. Standalone consumer processes keep their own.
+    """
+
+    process_id: int
+    event_rules: Dict[str, Dict[str, float]] = {}
+    resource_rules: Dict[str, Dict[str, float]] = {}
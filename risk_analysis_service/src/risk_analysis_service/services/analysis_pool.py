@@ -0,0 +1,238 @@
+"""
+Organization-sharded event analysis across worker processes.
+
+Each organization is hashed onto one of N single-process shards. A shard runs its
+tasks in submission order, so batches of the same organization are analyzed in
+the order they were consumed, while different organizations proceed in parallel
+on separate cores. Every worker process has its own DB engine and its own
+EventAnalyzerService (model, scaler and streaming feature windows).
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from ..rules.registry import RuleStats, merge_rule_stats, take_rule_stats
+from ..schemas.audit_event import GenericAuditEvent
+
+logger = logging.getLogger("risk_analysis.services")
+
+# (organization_id, events) in consumption order
+OrgBatch = Tuple[UUID, List[GenericAuditEvent]]
+# (organization_id, event count, alert payloads, error message or None)
+OrgResult = Tuple[UUID, int, List[dict], Optional[str]]
+# organization_id -> identity ARNs whose cached lookups a worker must drop
+IdentityKeys = Dict[UUID, List[str]]
+# Rule counters a worker accumulated for one task (see rules.registry)
+RuleStatsDelta = Dict[str, Dict[str, RuleStats]]
+
+# Per-process analyzer, created by _init_worker
+_worker_analyzer = None
+
+
+def _init_worker() -> None:
+    global _worker_analyzer
+    from ..db.session import engine
+    from .event_analyzer import EventAnalyzerService
+
+    # A forked child must not reuse the parent's pooled connections
+    engine.dispose(close=False)
+    # A forked child starts with the parent's rule counters; they are not its own
+    take_rule_stats()
+    _worker_analyzer = EventAnalyzerService()
+    logger.info("Analysis worker %d ready", os.getpid())
+
+
+def _analyze_shard(
+    batches: Sequence[OrgBatch], upserted_arns: Optional[IdentityKeys] = None
+) -> Tuple[List[OrgResult], RuleStatsDelta]:
+    """
+    Analyze the given organizations' events in one DB session and transaction.
+    Alerts are returned as payloads so the parent process can broadcast them,
+    and the rule counters of this task so the parent's /rules/stats covers them.
+    upserted_arns are dropped from this worker's identity cache first.
+    """
+    from ..db.session import SessionLocal
+    from .lookup_cache import identity_cache
+
+    for org_id, arns in (upserted_arns or {}).items():
+        identity_cache.invalidate_many(org_id, arns)
+
+    db = SessionLocal()
+    try:
+        alerts_by_org = _worker_analyzer.analyze_batch(
+            db, dict(batches), broadcast=False
+        )
+        payloads_by_org = {
+            org_id: [_worker_analyzer.alert_payload(a) for a in alerts]
+            for org_id, alerts in alerts_by_org.items()
+        }
+        db.commit()
+    except Exception as exc:
+        logger.exception("Analysis of %d organizations failed: %s", len(batches), exc)
+        db.rollback()
+        failed = [(org_id, len(events), [], repr(exc)) for org_id, events in batches]
+        return failed, take_rule_stats()
+    finally:
+        db.close()
+
+    results: List[OrgResult] = []
+    for org_id, events in batches:
+        if org_id in payloads_by_org:
+            results.append((org_id, len(events), payloads_by_org[org_id], None))
+        else:
+            # analyze_batch already logged the failure
+            results.append((org_id, len(events), [], "analysis failed"))
+    return results, take_rule_stats()
+
+
+def shard_for(organization_id: UUID, num_shards: int) -> int:
+    # UUID.int is stable across processes, unlike hash() of a str
+    return organization_id.int % num_shards
+
+
+class ShardedAnalysisPool:
+    """
+    N single-worker process pools; organization_id selects the pool.
+
+    Callers that analyze from several threads take a ticket with reserve() in
+    consumption order; analyze() then submits to the shards strictly in ticket
+    order, so an organization's batches never overtake each other.
+    """
+
+    def __init__(self, num_shards: int, start_method: Optional[str] = None) -> None:
+        self.num_shards = max(1, int(num_shards))
+        self._context = multiprocessing.get_context(
+            start_method or os.getenv("ANALYSIS_START_METHOD", "spawn")
+        )
+        self._shards: List[Optional[ProcessPoolExecutor]] = [None] * self.num_shards
+        # Guards replacing a shard, which result handling may do concurrently
+        # with submission
+        self._shards_lock = threading.Lock()
+        self._turn = threading.Condition()
+        self._next_ticket = 0
+        self._issued = 0
+        self._finished: set[int] = set()
+        # Identity invalidations not yet delivered to each shard's worker
+        self._pending_arns: List[IdentityKeys] = [{} for _ in range(self.num_shards)]
+
+    def reserve(self) -> int:
+        with self._turn:
+            ticket = self._issued
+            self._issued += 1
+            return ticket
+
+    def release(self, ticket: int) -> None:
+        """
+        Give up a ticket without analyzing (e.g. the flush failed before analysis).
+        """
+        with self._turn:
+            self._finished.add(ticket)
+            while self._next_ticket in self._finished:
+                self._finished.discard(self._next_ticket)
+                self._next_ticket += 1
+            self._turn.notify_all()
+
+    def _get_shard(self, index: int) -> ProcessPoolExecutor:
+        with self._shards_lock:
+            shard = self._shards[index]
+            if shard is None:
+                shard = ProcessPoolExecutor(
+                    max_workers=1, mp_context=self._context, initializer=_init_worker
+                )
+                self._shards[index] = shard
+            return shard
+
+    def _discard_shard(self, index: int, broken: ProcessPoolExecutor) -> None:
+        """
+        Drop a pool that raised BrokenProcessPool, unless it was already
+        replaced (another batch of the same shard saw the crash first).
+        """
+        with self._shards_lock:
+            if self._shards[index] is not broken:
+                return
+            self._shards[index] = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(
+        self, index: int, batches: List[OrgBatch]
+    ) -> Tuple[ProcessPoolExecutor, Future]:
+        """
+        Submit to the shard's pool; returns the pool with the future so a
+        crash seen on the result is attributed to that pool.
+        """
+        upserted_arns, self._pending_arns[index] = self._pending_arns[index], {}
+        shard = self._get_shard(index)
+        try:
+            return shard, shard.submit(_analyze_shard, batches, upserted_arns)
+        except BrokenProcessPool:
+            # Replace a pool whose worker died between batches; the new worker
+            # starts with empty caches
+            self._discard_shard(index, shard)
+            shard = self._get_shard(index)
+            return shard, shard.submit(_analyze_shard, batches)
+
+    def analyze(
+        self,
+        org_to_events: Dict[UUID, List[GenericAuditEvent]],
+        ticket: Optional[int] = None,
+        upserted_arns: Optional[IdentityKeys] = None,
+    ) -> List[OrgResult]:
+        """
+        Fan the organizations out to their shards and wait for every shard's
+        results. Blocks; call from a worker thread, not the event loop.
+        upserted_arns are forwarded to the owning shard with its next task.
+        """
+        if ticket is None:
+            ticket = self.reserve()
+        by_shard: Dict[int, List[OrgBatch]] = {}
+        for org_id, events in org_to_events.items():
+            by_shard.setdefault(shard_for(org_id, self.num_shards), []).append(
+                (org_id, events)
+            )
+
+        futures: List[Tuple[int, List[OrgBatch], ProcessPoolExecutor, Future]] = []
+        with self._turn:
+            self._turn.wait_for(lambda: self._next_ticket == ticket)
+        try:
+            for org_id, arns in (upserted_arns or {}).items():
+                pending = self._pending_arns[shard_for(org_id, self.num_shards)]
+                pending.setdefault(org_id, []).extend(arns)
+            for index, batches in by_shard.items():
+                futures.append((index, batches, *self._submit(index, batches)))
+        finally:
+            self.release(ticket)
+
+        results: List[OrgResult] = []
+        for index, batches, shard, future in futures:
+            try:
+                shard_results, rule_stats = future.result()
+            except BrokenProcessPool as exc:
+                # The worker died; replace it so later batches can proceed
+                logger.error("Analysis shard %d crashed: %s", index, exc)
+                self._discard_shard(index, shard)
+                results.extend(
+                    (org_id, len(events), [], repr(exc)) for org_id, events in batches
+                )
+            except Exception as exc:
+                logger.exception("Analysis shard %d failed: %s", index, exc)
+                results.extend(
+                    (org_id, len(events), [], repr(exc)) for org_id, events in batches
+                )
+            else:
+                results.extend(shard_results)
+                merge_rule_stats(rule_stats)
+        return results
+
+    def shutdown(self, wait: bool = True) -> None:
+        for index, shard in enumerate(self._shards):
+            if shard is not None:
+                shard.shutdown(wait=wait, cancel_futures=True)
+                self._shards[index] = None
@@ -8,7 +8,8 @@ from ..db.models.cloud_resource import CloudResource
 from ..db.models.cloud_account import CloudAccount
 from ..schemas import risk as risk_schemas
 from ..schemas.cloud_resource import GenericCloudResource, ResourceType
-from ..rules.s3_rules import STORAGE_BUCKET_RULES
+from ..rules.custom_rules import custom_rule_cache, matching_rules
+from ..rules.registry import resource_rules
 from ..db.repositories.risk_repository import RiskRepository
 
 
@@ -59,30 +60,25 @@ def analyze_and_save_risks(db: Session, resource: GenericCloudResource) -> list[
 
     org_id = db_cloud_resource.organization_id
 
-    if resource.resource_type == ResourceType.STORAGE_BUCKET:
-        for rule in STORAGE_BUCKET_RULES:
-            try:
-                logger.debug(
-                    "Evaluating rule %s for resource %s",
-                    getattr(rule, "code", type(rule).__name__),
-                    resource_name,
-                )
-                if rule.check(resource):
-                    found_risks.append(
-                        risk_schemas.RiskCreate(
-                            resource_name=resource_name,
-                            description=rule.description,
-                            severity=rule.severity.value,
-                            organization_id=org_id,
-                            resource_id=resource.resource_id,
-                        )
-                    )
-            except Exception as exc:
-                logger.exception(
-                    "Rule %s failed: %s",
-                    getattr(rule, "code", type(rule).__name__),
-                    exc,
-                )
+    # Only rules indexed for this resource type run; failures are logged and
+    # counted by the registry. The resource's own custom_rules come compiled
+    # from the cache.
+    custom = custom_rule_cache.get(
+        db_cloud_resource.resource_id, db_cloud_resource.custom_rules
+    )
+    for rule in [
+        *resource_rules.evaluate(resource),
+        *matching_rules(custom.resource_rules, resource),
+    ]:
+        found_risks.append(
+            risk_schemas.RiskCreate(
+                resource_name=resource_name,
+                description=rule.description,
+                severity=rule.severity.value,
+                organization_id=org_id,
+                resource_id=resource.resource_id,
+            )
+        )
 
     saved_risks_models: list[Risk] = []
     repo = RiskRepository(db)
@@ -1,58 +1,161 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Sequence, Tuple
+import os
 import uuid
 from datetime import datetime
-from pathlib import Path
 import warnings
 import logging
-import ipaddress
 import asyncio
 
-import pandas as pd
-from joblib import load
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, tuple_, update
 
 from ..schemas.audit_event import GenericAuditEvent
+from ..core.keyword_matcher import keyword_matcher
 from ..db.models.security_alert import SecurityAlert
 from ..db.models.entity_profile import EntityProfile
-from ..db.models.cloud_resource import CloudResource, CloudResourceCriticality
+from ..db.models.cloud_resource import CloudResource
 from ..db.models.cloud_identity import CloudIdentity
 from ..db.repositories.audit_event_repository import AuditEventRepository
+from ..db.repositories.security_alert_repository import SecurityAlertRepository
 from ..schemas.security_alert import SecurityAlertOut
 from ..core.socket_manager import manager
+from .lookup_cache import (
+    IdentitySnapshot,
+    ResourceSnapshot,
+    identity_cache,
+    resource_cache,
+)
+from .profile_cache import CompiledProfile, profile_cache
+from .rule_engine import SEVERITY_LABELS, SEVERITY_RANKS, evaluate_rules
+from ..rules.custom_rules import CustomRule, custom_rule_cache, matching_rules
+from ..rules.event_base import EventRule
+from ..rules.registry import EventRuleRegistry, event_rules
+from ..ml_engine.model_registry import LoadedModel, get_registry
+from ..ml_engine.org_models import get_org_models
+from ..ml_engine.hourly_features import (
+    CRITICAL_ACTION,
+    FeatureBatch,
+    FeatureRow,
+    HourlyFeatureAggregator,
+    epoch_hour,
+)
 
 
 logger = logging.getLogger("risk_analysis.services")
 
+# (entity_id, hours since epoch)
+FeatureKey = Tuple[str, int]
+# (organization_id, key) pairs per lookup query; two bind parameters each
+LOOKUP_CHUNK_SIZE: int = 5000
+
 
 class EventAnalyzerService:
-    def __init__(self) -> None:
-        base_dir = Path(__file__).resolve().parent.parent / "ml_engine"
-        self._model_path = base_dir / "model.pkl"
-        self._scaler_path = base_dir / "scaler.pkl"
+    def __init__(
+        self,
+        streaming_features: bool | None = None,
+        event_rule_registry: EventRuleRegistry | None = None,
+    ) -> None:
+        # Loop that owns the WebSocket connections; set when analysis runs in a
+        # worker thread so alert broadcasts are scheduled back onto it.
+        self._broadcast_loop: asyncio.AbstractEventLoop | None = None
+        # Hourly features accumulate across calls so an entity-hour split over many
+        # small batches is scored like the training data; set
+        # ANALYZER_STREAMING_FEATURES=false to aggregate each batch on its own.
+        if streaming_features is None:
+            streaming_features = os.getenv(
+                "ANALYZER_STREAMING_FEATURES", "true"
+            ).lower() not in {"0", "false", "no"}
+        self.feature_aggregator: HourlyFeatureAggregator | None = (
+            HourlyFeatureAggregator(
+                allowed_lateness_hours=int(
+                    os.getenv("FEATURE_WINDOW_LATENESS_HOURS", "2")
+                ),
+                dedup_size=int(os.getenv("FEATURE_DEDUP_CACHE_SIZE", "200000")),
+            )
+            if streaming_features
+            else None
+        )
 
-        self.model = None
-        self.scaler = None
+        # Model, scaler and forest scorer come from the process-wide registry,
+        # which swaps in new versions while the service runs
+        self.model_registry = get_registry()
+        if self.model_registry.ensure_loaded() is None:
+            warnings.warn("No model loaded; ML anomaly detection is disabled")
+        # Organizations with a model of their own are scored with it instead
+        self.org_models = get_org_models()
+        # Registered EventRules (AWS_EVENT_RULES by default) add their codes to
+        # the violations. Off unless ANALYZER_EVENT_RULES=true: their failure
+        # rule would otherwise alert on every FAILURE event of every provider
+        if event_rule_registry is None and os.getenv(
+            "ANALYZER_EVENT_RULES", "false"
+        ).lower() not in {"0", "false", "no", ""}:
+            event_rule_registry = event_rules
+        self.event_rules = event_rule_registry
+
+    def bind_event_loop(self, loop: asyncio.AbstractEventLoop | None) -> None:
+        """
+        Register the event loop used to broadcast alerts when called off-loop.
+        """
+        self._broadcast_loop = loop
 
+    @staticmethod
+    def alert_payload(a: SecurityAlert) -> dict:
+        """
+        JSON-ready WebSocket payload for a persisted alert.
+        """
         try:
-            if self._scaler_path.exists():
-                self.scaler = load(self._scaler_path)
-                logger.info("Loaded scaler from %s", self._scaler_path)
-            else:
-                warnings.warn(f"Scaler not found at {self._scaler_path}")
-        except Exception as exc:
-            warnings.warn(f"Failed to load scaler: {exc}")
+            return SecurityAlertOut.model_validate(a).model_dump(mode="json")
+        except Exception:
+            created_at_val = getattr(a, "created_at", None)
+            created_at_str = (
+                created_at_val.isoformat()
+                if hasattr(created_at_val, "isoformat")
+                else str(created_at_val)
+            )
+            return {
+                "id": getattr(a, "id", None),
+                "event_id": getattr(a, "event_id", "") or "",
+                "rule_code": getattr(a, "rule_code", "") or "",
+                "severity": getattr(a, "severity", "") or "",
+                "description": getattr(a, "description", "") or "",
+                "created_at": created_at_str,
+                "organization_id": str(getattr(a, "organization_id", "")) or "",
+                "cloud_identity_id": (
+                    str(getattr(a, "cloud_identity_id"))
+                    if getattr(a, "cloud_identity_id", None)
+                    else None
+                ),
+                "cloud_account_id": (
+                    str(getattr(a, "cloud_account_id"))
+                    if getattr(a, "cloud_account_id", None)
+                    else None
+                ),
+            }
+
+    def publish_alerts(self, payloads: List[dict], organization_id: uuid.UUID) -> None:
+        for payload in payloads:
+            self._broadcast(payload, organization_id)
 
+    def _broadcast(self, payload: dict, organization_id: uuid.UUID) -> None:
         try:
-            if self._model_path.exists():
-                self.model = load(self._model_path)
-                logger.info("Loaded model from %s", self._model_path)
-            else:
-                warnings.warn(f"Model not found at {self._model_path}")
-        except Exception as exc:
-            warnings.warn(f"Failed to load model: {exc}")
+            loop = asyncio.get_running_loop()
+            loop.create_task(manager.broadcast(payload, organization_id))
+            return
+        except RuntimeError:
+            pass
+        target = self._broadcast_loop
+        if target is not None and target.is_running() and not target.is_closed():
+            asyncio.run_coroutine_threadsafe(
+                manager.broadcast(payload, organization_id), target
+            )
+            return
+        try:
+            asyncio.run(manager.broadcast(payload, organization_id))
+        except RuntimeError:
+            logger.debug("Skipping broadcast; no valid event loop context")
 
     @staticmethod
     def _hybrid_entity_id(event: GenericAuditEvent) -> str:
@@ -66,70 +169,92 @@ class EventAnalyzerService:
         return (event.actor_ip_address or "").strip()
 
     @staticmethod
-    def _truncate_to_hour(dt: datetime) -> datetime:
-        return dt.replace(minute=0, second=0, microsecond=0)
-
-    @staticmethod
-    def _ip_in_whitelisted_cidrs(ip_str: str, cidrs: list[str]) -> bool:
+    def _select_by_org_key(
+        db: Session, model: Any, key_column: Any, keys: List[Tuple[uuid.UUID, str]]
+    ) -> List[Any]:
         """
-        Return True if the provided IP belongs to any of the CIDRs.
-        Invalid IP or CIDR entries are ignored gracefully.
+        Rows of `model` matching (organization_id, key) IN (...), one SELECT per
+        LOOKUP_CHUNK_SIZE keys.
         """
-        if not ip_str or not cidrs:
-            return False
-        try:
-            ip_obj = ipaddress.ip_address(ip_str)
-        except ValueError:
-            return False
-        for cidr in cidrs:
-            try:
-                network = ipaddress.ip_network(cidr, strict=False)
-            except ValueError:
-                continue
-            if ip_obj in network:
-                return True
-        return False
-
-    @staticmethod
-    def _is_destructive_action(action_name: str) -> bool:
+        rows: List[Any] = []
+        for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            stmt = select(model).where(
+                tuple_(model.organization_id, key_column).in_(
+                    keys[start : start + LOOKUP_CHUNK_SIZE]
+                )
+            )
+            rows.extend(db.execute(stmt).scalars().all())
+        return rows
+
+    def _load_lookups(
+        self, db: Session, org_to_events: Dict[uuid.UUID, List[GenericAuditEvent]]
+    ) -> Tuple[
+        Dict[uuid.UUID, Dict[str, CompiledProfile]],
+        Dict[uuid.UUID, Dict[str, IdentitySnapshot]],
+        Dict[uuid.UUID, Dict[str, ResourceSnapshot]],
+    ]:
         """
-        Heuristic to classify destructive actions (deletes/terminations/drops).
+        Profiles, identities and resources referenced by the events of every
+        organization, read through the shared caches; the misses of all
+        organizations are loaded with one query per table.
         """
-        if not action_name:
-            return False
-        a = action_name.strip().lower()
-        destructive_prefixes = (
-            "delete",
-            "terminate",
-            "destroy",
-            "drop",
-            "purge",
-            "revoke",
-            "shutdown",
-            "kill",
-        )
-        return a.startswith(destructive_prefixes)
+        entity_ids: Dict[uuid.UUID, set[str]] = {}
+        actor_arns: Dict[uuid.UUID, set[str]] = {}
+        resource_ids: Dict[uuid.UUID, set[str]] = {}
+        for org_id, events in org_to_events.items():
+            entity_ids[org_id] = {self._hybrid_entity_id(e) for e in events}
+            actor_arns[org_id] = {
+                (e.actor_identity or "").strip()
+                for e in events
+                if (e.actor_identity or "").strip()
+            }
+            resource_ids[org_id] = {
+                e.target_resource for e in events if e.target_resource
+            }
 
-    @staticmethod
-    def _auto_profile_allows(
-        event: GenericAuditEvent, profile: EntityProfile | None
-    ) -> bool:
-        """
-        Return True if the event matches all available auto-profile attributes.
-        If profile is None or no auto fields are configured, returns False (no allow).
-        """
-        if profile is None:
-            return False
-        hours = set(profile.auto_common_hours or [])
-        ips = set(profile.auto_common_ips or [])
-        actions = set(profile.auto_common_actions or [])
-        has_any = bool(hours or ips or actions)
-        if not has_any:
-            return False
-        hour_ok = (int(event.event_time.hour) in hours) if hours else True
-        ip_ok = ((event.actor_ip_address or "") in ips) if ips else True
-        action_ok = ((event.action_name or "") in actions) if actions else True
-        return bool(hour_ok and ip_ok and action_ok)
+        def load_profiles(keys):
+            rows = self._select_by_org_key(
+                db, EntityProfile, EntityProfile.entity_id, keys
+            )
+            return {
+                (row.organization_id, str(row.entity_id)): CompiledProfile.from_row(row)
+                for row in rows
+            }
+
+        def load_identities(keys):
+            rows = self._select_by_org_key(
+                db, CloudIdentity, CloudIdentity.identity_arn, keys
+            )
+            return {
+                (row.organization_id, str(row.identity_arn)): IdentitySnapshot.from_row(
+                    row
+                )
+                for row in rows
+            }
+
+        def load_resources(keys):
+            rows = self._select_by_org_key(
+                db, CloudResource, CloudResource.resource_id, keys
+            )
+            return {
+                (row.organization_id, str(row.resource_id)): ResourceSnapshot.from_row(
+                    row
+                )
+                for row in rows
+            }
+
+        lookups = (
+            profile_cache.read_through(entity_ids, load_profiles),
+            identity_cache.read_through(actor_arns, load_identities),
+            resource_cache.read_through(resource_ids, load_resources),
+        )
+        logger.debug(
+            "Lookup caches: profiles=%s identities=%s resources=%s",
+            profile_cache.stats(),
+            identity_cache.stats(),
+            resource_cache.stats(),
+        )
+        return lookups
 
     def _get_anomaly_summary(
         self, db: Session, entity_id: str, start_time: datetime, end_time: datetime
@@ -139,327 +264,358 @@ class EventAnalyzerService:
             entity_id=entity_id, start_time=start_time, end_time=end_time
         )
 
-    def _prepare_features(self, events: List[GenericAuditEvent]) -> pd.DataFrame:
+    def _feature_rows(self, events: List[GenericAuditEvent]) -> List[FeatureRow]:
         """
-        Convert raw events into hourly aggregated features matching training logic.
-        Returns DataFrame indexed by (entity_id, time_window).
+        Per-event inputs of the hourly features, shared by the streaming windows
+        and the batch-only fallback.
         """
-        if not events:
-            return pd.DataFrame(
-                columns=[
-                    "event_count",
-                    "failure_ratio",
-                    "unique_ips",
-                    "critical_actions_count",
-                    "is_night",
-                ]
-            )
-
-        records: List[Dict[str, Any]] = []
+        rows: List[FeatureRow] = []
         for e in events:
-            records.append(
-                {
-                    "event_time": pd.to_datetime(
-                        e.event_time, utc=True, errors="coerce"
-                    ),
-                    "actor_identity": (e.actor_identity or "").strip(),
-                    "actor_ip_address": (e.actor_ip_address or "").strip(),
-                    "action_name": (e.action_name or "").strip(),
-                    "status": (
-                        e.event_status.value
-                        if hasattr(e.event_status, "value")
-                        else str(e.event_status)
-                    ).upper(),
-                    "entity_id": self._hybrid_entity_id(e),
-                }
+            status = (
+                e.event_status.value
+                if hasattr(e.event_status, "value")
+                else str(e.event_status)
             )
+            rows.append(
+                (
+                    self._hybrid_entity_id(e),
+                    epoch_hour(e.event_time),
+                    (e.actor_ip_address or "").strip(),
+                    status.strip().upper() == "FAILURE",
+                    CRITICAL_ACTION
+                    in keyword_matcher.categories((e.action_name or "").strip()),
+                )
+            )
+        return rows
 
-        df = pd.DataFrame.from_records(records)
-        df = df.dropna(subset=["event_time"])
-
-        status_series = df["status"].astype(str).str.strip().str.upper()
-        df["is_failure"] = status_series.eq("FAILURE")
-        action_series = df["action_name"].astype(str).str.strip().str.lower()
-        df["is_critical_action"] = action_series.str.startswith(("delete", "terminate"))
-
-        df["time_window"] = df["event_time"].dt.floor("h")
+    @staticmethod
+    def _prepare_features(rows: List[FeatureRow]) -> Dict[FeatureKey, List[float]]:
+        """
+        Hourly features of this batch alone, matching training logic, keyed by
+        (entity_id, hour) in FEATURE_COLUMNS order.
+        """
+        return FeatureBatch(rows).aggregate()
 
-        grouped = df.groupby(["entity_id", "time_window"])
-        features = grouped.agg(
-            event_count=("event_time", "size"),
-            failure_ratio=("is_failure", "mean"),
-            unique_ips=("actor_ip_address", "nunique"),
-            critical_actions_count=("is_critical_action", "sum"),
+    def _observe_features(
+        self,
+        organization_id: uuid.UUID,
+        rows: List[FeatureRow],
+        events: List[GenericAuditEvent],
+    ) -> None:
+        """
+        Feed the batch into the streaming hourly feature windows. Keyed by event
+        id, so a batch analyzed again after a rolled-back flush is not counted
+        twice.
+        """
+        if self.feature_aggregator is None:
+            return
+        self.feature_aggregator.observe_many(
+            organization_id, rows, [e.event_id for e in events]
         )
 
-        window_hours = features.index.get_level_values(1).hour
-        is_night = ((window_hours <= 6) | (window_hours >= 21)).astype(int)
-        features = features.assign(is_night=is_night)
-
-        features = features.astype(
-            {
-                "event_count": "int64",
-                "failure_ratio": "float64",
-                "unique_ips": "int64",
-                "critical_actions_count": "int64",
-                "is_night": "int64",
-            }
-        )
-        features.index.set_names(["entity_id", "time_window"], inplace=True)
-        return features
+    def _feature_vectors(
+        self,
+        organization_id: uuid.UUID,
+        rows: List[FeatureRow],
+        keys: List[FeatureKey],
+    ) -> Dict[FeatureKey, Sequence[float]]:
+        """
+        Feature vectors for the requested keys: from the streaming windows when
+        enabled and still open, otherwise aggregated from this batch alone.
+        """
+        vectors: Dict[FeatureKey, Sequence[float]] = {}
+        if self.feature_aggregator is not None and keys:
+            vectors.update(self.feature_aggregator.features(organization_id, keys))
+            # Hours already closed (backfill, replays) are scored on this batch alone
+            keys = [k for k in keys if k not in vectors]
+        if not keys:
+            return vectors
+        batch_features = self._prepare_features(rows)
+        for key in keys:
+            if key in batch_features:
+                vectors[key] = batch_features[key]
+        return vectors
+
+    def _predict_anomalies(
+        self,
+        vectors: Dict[FeatureKey, Sequence[float]],
+        loaded: LoadedModel | None,
+    ) -> set[FeatureKey]:
+        """
+        Score the distinct (entity_id, hour) feature rows with a single
+        scaler+model call and return the keys predicted as anomalies (-1).
+        """
+        if not vectors or loaded is None:
+            return set()
+        keys = list(vectors)
+        matrix = np.array([vectors[k] for k in keys], dtype=np.float64)
+        try:
+            if loaded.forest_scorer is not None:
+                predictions = loaded.forest_scorer.predict(matrix)
+            else:
+                predictions = loaded.model.predict(loaded.scaler.transform(matrix))
+        except Exception as exc:
+            warnings.warn(f"ML inference failed: {exc}")
+            return set()
+        return {k for k, p in zip(keys, predictions) if p == -1}
 
     def analyze_events(
         self,
         db: Session,
         events: List[GenericAuditEvent],
         organization_id: uuid.UUID,
+        broadcast: bool = True,
     ) -> List[SecurityAlert]:
         """
         Aggregated alerting per event:
           - Collect all violations for a single event instead of stopping at the first one.
           - Compute maximum severity over all detected violations.
           - Emit ONE SecurityAlert per event if there are any violations.
+        Alerts are added to the session but not committed; the caller commits.
+        With broadcast=False the caller is responsible for publishing the alerts
+        (see alert_payload / publish_alerts), e.g. once its commit succeeded.
         """
-        logger.info("Analyzing events batch: size=%d", len(events) if events else 0)
-        created_alerts: List[SecurityAlert] = []
         if not events:
-            return created_alerts
-
-        entity_ids = {self._hybrid_entity_id(e) for e in events}
-        target_resource_ids = {e.target_resource for e in events if e.target_resource}
-        actor_arns = {
-            (e.actor_identity or "").strip()
-            for e in events
-            if (e.actor_identity or "").strip()
-        }
-
-        profiles_by_id: Dict[str, EntityProfile] = {}
-        if entity_ids:
-            stmt = select(EntityProfile).where(
-                EntityProfile.entity_id.in_(list(entity_ids)),
-                EntityProfile.organization_id == organization_id,
-            )
-            for prof in db.execute(stmt).scalars().all():
-                profiles_by_id[str(prof.entity_id)] = prof
-
-        identities_by_arn: Dict[str, CloudIdentity] = {}
-        if actor_arns:
-            istmt = select(CloudIdentity).where(
-                CloudIdentity.identity_arn.in_(list(actor_arns)),
-                CloudIdentity.organization_id == organization_id,
-            )
-            for ident in db.execute(istmt).scalars().all():
-                identities_by_arn[str(ident.identity_arn)] = ident
-
-        resources_by_id: Dict[str, CloudResource] = {}
-        if target_resource_ids:
-            rstmt = select(CloudResource).where(
-                CloudResource.resource_id.in_(list(target_resource_ids)),
-                CloudResource.organization_id == organization_id,
+            logger.info("Analyzing events batch: size=0")
+            return []
+        profiles, identities, resources = self._load_lookups(
+            db, {organization_id: events}
+        )
+        created_alerts = self._detect(
+            db,
+            events,
+            organization_id,
+            profiles[organization_id],
+            identities[organization_id],
+            resources[organization_id],
+        )
+        self._persist_alerts(db, created_alerts)
+        if broadcast and created_alerts:
+            self.publish_alerts(
+                [self.alert_payload(a) for a in created_alerts], organization_id
             )
-            for res in db.execute(rstmt).scalars().all():
-                resources_by_id[str(res.resource_id)] = res
-
-        features_df = self._prepare_features(events)
-        feature_columns = [
-            "event_count",
-            "failure_ratio",
-            "unique_ips",
-            "critical_actions_count",
-            "is_night",
-        ]
-
-        for event in events:
-            entity_id = self._hybrid_entity_id(event)
-            profile = profiles_by_id.get(str(entity_id))
-            resource = resources_by_id.get(event.target_resource)
-            actor_arn = (event.actor_identity or "").strip()
-            cloud_identity = identities_by_arn.get(actor_arn) if actor_arn else None
-
-            violations: list[str] = []
-            max_severity_val: int = 0
-            skip_ml: bool = False
-
-            def update_max_severity(tag: str) -> None:
-                nonlocal max_severity_val
-                severity_rank: dict[str, int] = {
-                    "LOW": 1,
-                    "MEDIUM": 2,
-                    "HIGH": 3,
-                    "CRITICAL": 4,
-                }
-                rank = severity_rank.get(tag, 0)
-                if rank > max_severity_val:
-                    max_severity_val = rank
-
-            if actor_arn:
-                if cloud_identity:
-                    if (
-                        profile
-                        and getattr(profile, "cloud_identity_id", None)
-                        != cloud_identity.id
-                    ):
-                        profile.cloud_identity_id = cloud_identity.id
-                        db.add(profile)
-                else:
-                    violations.append("SHADOW_IDENTITY")
-                    update_max_severity("MEDIUM")
-
-            if profile and profile.whitelisted_cidrs:
-                whitelisted = self._ip_in_whitelisted_cidrs(
-                    (event.actor_ip_address or "").strip(), profile.whitelisted_cidrs
-                )
-                if not whitelisted:
-                    violations.append("IP_VIOLATION")
-                    update_max_severity("CRITICAL")
-
-            if resource and resource.criticality == CloudResourceCriticality.CRITICAL:
-                if self._is_destructive_action(event.action_name or ""):
-                    violations.append("CRITICAL_RESOURCE_TAMPERING")
-                    update_max_severity("HIGH")
-
-            if profile:
-                if (event.action_name or "") in (
-                    profile.manual_forbidden_actions or []
-                ):
-                    violations.append("FORBIDDEN_ACTION")
-                    update_max_severity("MEDIUM")
-                if (event.action_name or "") in (profile.manual_allowed_actions or []):
-                    skip_ml = True
-
-                event_hour = event.event_time.hour
-                is_night_time = event_hour <= 6 or event_hour >= 21
-                is_unusual_hour = event_hour not in (profile.auto_common_hours or [])
-                is_unusual_action = (event.action_name or "") not in (
-                    profile.auto_common_actions or []
-                )
+        return created_alerts
 
-                if is_night_time and is_unusual_action:
-                    violations.append("PROFILE_DEVIATION_DETECTED")
-                    update_max_severity("MEDIUM")
-                elif (
-                    is_unusual_hour and is_unusual_action and profile.auto_common_hours
-                ):
-                    violations.append("PROFILE_DEVIATION_DETECTED")
-                    update_max_severity("LOW")
-                elif is_unusual_hour and profile.auto_common_hours:
-                    violations.append("MINOR_TIME_DEVIATION")
-                    update_max_severity("LOW")
-
-            should_run_ml = False
-            if not skip_ml:
-                if profile is None:
-                    should_run_ml = True
-                else:
-                    should_run_ml = not self._auto_profile_allows(event, profile)
-
-            if should_run_ml and self.model is not None and self.scaler is not None:
-                window_start = self._truncate_to_hour(event.event_time)
-                idx_key: Tuple[str, datetime] = (
-                    str(entity_id),
-                    pd.to_datetime(window_start, utc=True),
+    def analyze_batch(
+        self,
+        db: Session,
+        org_to_events: Dict[uuid.UUID, List[GenericAuditEvent]],
+        broadcast: bool = True,
+    ) -> Dict[uuid.UUID, List[SecurityAlert]]:
+        """
+        Analyze a batch spanning several organizations. Lookups for all of them
+        are resolved with one query per table, detection runs per organization
+        in memory and every alert is written in one bulk insert, which the
+        caller commits.
+        An organization whose detection raises is logged and left out of the
+        result; the other organizations are still analyzed.
+        """
+        org_to_events = {org: evs for org, evs in org_to_events.items() if evs}
+        alerts_by_org: Dict[uuid.UUID, List[SecurityAlert]] = {}
+        if not org_to_events:
+            return alerts_by_org
+        profiles, identities, resources = self._load_lookups(db, org_to_events)
+        for org_id, events in org_to_events.items():
+            try:
+                alerts_by_org[org_id] = self._detect(
+                    db,
+                    events,
+                    org_id,
+                    profiles[org_id],
+                    identities[org_id],
+                    resources[org_id],
                 )
-                if features_df.empty or idx_key not in features_df.index:
-                    pass
-                else:
-                    row = features_df.loc[idx_key]
-                    vector = row[feature_columns].fillna(0).values.reshape(1, -1)
-                    try:
-                        vector_scaled = self.scaler.transform(vector)
-                        prediction = self.model.predict(vector_scaled)
-                    except Exception as exc:
-                        warnings.warn(f"ML inference failed: {exc}")
-                        prediction = [None]
-                    if prediction and prediction[0] == -1:
-                        violations.append("ML_ANOMALY_DETECTED")
-                        update_max_severity("HIGH")
-
-            if violations:
-                val_to_label: dict[int, str] = {
-                    1: "LOW",
-                    2: "MEDIUM",
-                    3: "HIGH",
-                    4: "CRITICAL",
-                }
-                severity_label = val_to_label.get(max_severity_val, "LOW")
-
-                rule_code = (
-                    "MULTIPLE_VIOLATIONS" if len(violations) > 1 else violations[0]
+            except Exception as exc:
+                logger.exception(
+                    "Analyzer failed for org %s batch of %d events: %s",
+                    org_id,
+                    len(events),
+                    exc,
                 )
+        self._persist_alerts(
+            db, [a for alerts in alerts_by_org.values() for a in alerts]
+        )
+        if broadcast:
+            for org_id, alerts in alerts_by_org.items():
+                if alerts:
+                    self.publish_alerts([self.alert_payload(a) for a in alerts], org_id)
+        return alerts_by_org
 
-                target_id = (
-                    resource.resource_id
-                    if resource
-                    else (event.target_resource or "unknown")
-                )
-                description = (
-                    f"Violations detected: {', '.join(violations)}. "
-                    f"Details: action={event.action_name}, resource={target_id}, "
-                    f"actor={entity_id}, ip={event.actor_ip_address}."
+    @staticmethod
+    def _link_profile_identities(
+        db: Session,
+        organization_id: uuid.UUID,
+        events: List[GenericAuditEvent],
+        entity_ids: List[str],
+        profiles_by_id: Dict[str, CompiledProfile],
+        identities_by_arn: Dict[str, IdentitySnapshot],
+    ) -> None:
+        """
+        Point each profile at the cloud identity its events act as, in event order.
+        """
+        for event, entity_id in zip(events, entity_ids):
+            profile = profiles_by_id.get(entity_id)
+            actor_arn = (event.actor_identity or "").strip()
+            cloud_identity = identities_by_arn.get(actor_arn) if actor_arn else None
+            if (
+                profile is None
+                or cloud_identity is None
+                or profile.cloud_identity_id == cloud_identity.id
+            ):
+                continue
+            db.execute(
+                update(EntityProfile)
+                .where(
+                    EntityProfile.entity_id == profile.entity_id,
+                    EntityProfile.organization_id == organization_id,
                 )
+                .values(cloud_identity_id=cloud_identity.id)
+            )
+            profiles_by_id[entity_id] = profile._replace(
+                cloud_identity_id=cloud_identity.id
+            )
+            profile_cache.invalidate(organization_id, profile.entity_id)
 
-                alert = SecurityAlert(
-                    event_id=event.event_id,
-                    rule_code=rule_code,
-                    severity=severity_label,
-                    description=description,
-                    organization_id=organization_id,
-                )
+    def _extra_rule_hits(
+        self,
+        events: List[GenericAuditEvent],
+        resources_by_id: Dict[str, ResourceSnapshot],
+    ) -> List[List[EventRule | CustomRule]]:
+        """
+        Per event, the registered EventRules and the target resource's
+        custom_rules event rules that match it.
+        """
+        if self.event_rules is not None:
+            hits: List[List[EventRule | CustomRule]] = list(
+                self.event_rules.evaluate_many(events)
+            )
+        else:
+            hits = [[] for _ in events]
+        # Compiled once per resource and custom_rules content, then cached
+        custom_by_resource: Dict[str, Tuple[CustomRule, ...]] = {}
+        for resource_id in {e.target_resource for e in events}:
+            resource = resources_by_id.get(resource_id)
+            if resource is None or not resource.custom_rules:
+                continue
+            compiled = custom_rule_cache.get(
+                resource.resource_id, resource.custom_rules
+            )
+            if compiled.event_rules:
+                custom_by_resource[resource_id] = compiled.event_rules
+        if custom_by_resource:
+            for event, event_hits in zip(events, hits):
+                custom = custom_by_resource.get(event.target_resource)
+                if custom:
+                    event_hits.extend(matching_rules(custom, event))
+        return hits
+
+    def _detect(
+        self,
+        db: Session,
+        events: List[GenericAuditEvent],
+        organization_id: uuid.UUID,
+        profiles_by_id: Dict[str, CompiledProfile],
+        identities_by_arn: Dict[str, IdentitySnapshot],
+        resources_by_id: Dict[str, ResourceSnapshot],
+    ) -> List[SecurityAlert]:
+        """
+        Rule and ML checks for one organization's events; returns the unsaved
+        alerts. Only writes when linking a profile to its identity.
+        """
+        logger.info("Analyzing events batch: size=%d", len(events))
+        created_alerts: List[SecurityAlert] = []
+        feature_rows = self._feature_rows(events)
+        entity_ids = [row[0] for row in feature_rows]
+        self._observe_features(organization_id, feature_rows, events)
+        self._link_profile_identities(
+            db, organization_id, events, entity_ids, profiles_by_id, identities_by_arn
+        )
+        # The organization's own model if it has one, else the global model
+        loaded_model = self.org_models.model_for(organization_id)
 
-                if cloud_identity:
-                    alert.cloud_identity_id = cloud_identity.id
-                created_alerts.append(alert)
+        # Rules run as masks over the whole batch; the distinct feature rows of
+        # the events the model should see are then scored in one call
+        rules = evaluate_rules(
+            events, entity_ids, profiles_by_id, identities_by_arn, resources_by_id
+        )
+        severity = rules.severity
+        extra_hits = self._extra_rule_hits(events, resources_by_id)
+        if any(extra_hits):
+            severity = np.maximum(
+                severity,
+                np.fromiter(
+                    (
+                        max(
+                            (SEVERITY_RANKS[r.severity.value.upper()] for r in hits),
+                            default=0,
+                        )
+                        for hits in extra_hits
+                    ),
+                    dtype=severity.dtype,
+                    count=len(events),
+                ),
+            )
+        ml_anomaly = np.zeros(len(events), dtype=bool)
+        if loaded_model is not None:
+            ml_rows = np.flatnonzero(rules.run_ml).tolist()
+            ml_keys: Dict[FeatureKey, None] = dict.fromkeys(
+                feature_rows[i][:2] for i in ml_rows
+            )
+            anomalous_keys = self._predict_anomalies(
+                self._feature_vectors(organization_id, feature_rows, list(ml_keys)),
+                loaded_model,
+            )
+            if anomalous_keys:
+                for i in ml_rows:
+                    ml_anomaly[i] = feature_rows[i][:2] in anomalous_keys
+                severity = np.maximum(severity, ml_anomaly * SEVERITY_RANKS["HIGH"])
+
+        alerting = np.flatnonzero(severity > 0)
+        for i, violations, severity_rank, is_ml_anomaly in zip(
+            alerting.tolist(),
+            rules.violations(alerting),
+            severity[alerting].tolist(),
+            ml_anomaly[alerting].tolist(),
+        ):
+            event = events[i]
+            entity_id = entity_ids[i]
+            violations.extend(rule.code for rule in extra_hits[i])
+            if is_ml_anomaly:
+                violations.append("ML_ANOMALY_DETECTED")
+            severity_label = SEVERITY_LABELS.get(severity_rank, "LOW")
+            rule_code = "MULTIPLE_VIOLATIONS" if len(violations) > 1 else violations[0]
 
-        if created_alerts:
-            logger.info(
-                "DB insert pending: %d SecurityAlert alerts", len(created_alerts)
+            resource = resources_by_id.get(event.target_resource)
+            target_id = (
+                resource.resource_id
+                if resource
+                else (event.target_resource or "unknown")
             )
-            db.add_all(created_alerts)
-            db.commit()
-            for a in created_alerts:
-                db.refresh(a)
-            logger.info(
-                "DB insert committed: SecurityAlert ids=%s",
-                [a.id for a in created_alerts],
+            description = (
+                f"Violations detected: {', '.join(violations)}. "
+                f"Details: action={event.action_name}, resource={target_id}, "
+                f"actor={entity_id}, ip={event.actor_ip_address}."
             )
 
-            for a in created_alerts:
-                try:
-                    payload = SecurityAlertOut.model_validate(a).model_dump(mode="json")
-                except Exception:
-                    created_at_val = getattr(a, "created_at", None)
-                    created_at_str = (
-                        created_at_val.isoformat()
-                        if hasattr(created_at_val, "isoformat")
-                        else str(created_at_val)
-                    )
-                    payload = {
-                        "id": getattr(a, "id", None),
-                        "event_id": getattr(a, "event_id", "") or "",
-                        "rule_code": getattr(a, "rule_code", "") or "",
-                        "severity": getattr(a, "severity", "") or "",
-                        "description": getattr(a, "description", "") or "",
-                        "created_at": created_at_str,
-                        "organization_id": str(getattr(a, "organization_id", "")) or "",
-                        "cloud_identity_id": (
-                            str(getattr(a, "cloud_identity_id"))
-                            if getattr(a, "cloud_identity_id", None)
-                            else None
-                        ),
-                        "cloud_account_id": (
-                            str(getattr(a, "cloud_account_id"))
-                            if getattr(a, "cloud_account_id", None)
-                            else None
-                        ),
-                    }
-                try:
-                    loop = asyncio.get_running_loop()
-                    loop.create_task(manager.broadcast(payload, organization_id))
-                except RuntimeError:
-                    try:
-                        asyncio.run(manager.broadcast(payload, organization_id))
-                    except RuntimeError:
-                        logger.debug("Skipping broadcast; no valid event loop context")
-        else:
-            logger.info("No alerts created for this batch")
+            alert = SecurityAlert(
+                event_id=event.event_id,
+                rule_code=rule_code,
+                severity=severity_label,
+                description=description,
+                organization_id=organization_id,
+            )
+
+            actor_arn = (event.actor_identity or "").strip()
+            cloud_identity = identities_by_arn.get(actor_arn) if actor_arn else None
+            if cloud_identity:
+                alert.cloud_identity_id = cloud_identity.id
+            created_alerts.append(alert)
+
         return created_alerts
+
+    @staticmethod
+    def _persist_alerts(db: Session, created_alerts: List[SecurityAlert]) -> None:
+        if not created_alerts:
+            logger.info("No alerts created for this batch")
+            return
+        SecurityAlertRepository(db).create_many(created_alerts)
@@ -0,0 +1,222 @@
+"""
+Organization-scoped read-through caches for the analyzer's per-batch lookups.
+
+Values are keyed by (organization_id, key) and expire after a TTL; the cache is
+LRU-bounded. A key with no row is cached as None (negative caching) with its
+own, usually shorter, TTL, so unknown actors and resources do not hit the
+database on every batch. Writers invalidate the keys they change; the TTL
+bounds staleness for writes made by other processes.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+from uuid import UUID
+
+from ..db.models.cloud_identity import CloudIdentity
+from ..db.models.cloud_resource import CloudResource, CloudResourceCriticality
+
+V = TypeVar("V")
+
+
+class OrgLookupCache(Generic[V]):
+    """
+    Thread-safe TTL + LRU cache of Optional[V] values with hit/miss counters.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 50_000,
+        ttl_seconds: float = 60.0,
+        negative_ttl_seconds: Optional[float] = None,
+    ) -> None:
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.negative_ttl_seconds = (
+            self.ttl_seconds
+            if negative_ttl_seconds is None
+            else float(negative_ttl_seconds)
+        )
+        self._entries: OrderedDict[Tuple[UUID, str], Tuple[float, Optional[V]]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        # Bumped by invalidate(); loads that started earlier must not be cached
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get_many(
+        self, organization_id: UUID, keys: Iterable[str]
+    ) -> Tuple[Dict[str, Optional[V]], list[str]]:
+        """
+        Return (cached entries, keys that missed or expired).
+        """
+        found: Dict[str, Optional[V]] = {}
+        missing: list[str] = []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get((organization_id, key))
+                if entry is None or entry[0] <= now:
+                    missing.append(key)
+                    continue
+                self._entries.move_to_end((organization_id, key))
+                found[key] = entry[1]
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put(
+        self,
+        organization_id: UUID,
+        key: str,
+        value: Optional[V],
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Cache a loaded value. Pass the generation read before loading it so a
+        row read before a concurrent invalidate() is not cached.
+        """
+        if not self.max_entries:
+            return
+        ttl = self.ttl_seconds if value is not None else self.negative_ttl_seconds
+        if ttl <= 0:
+            return
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[(organization_id, key)] = (expires_at, value)
+            self._entries.move_to_end((organization_id, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def read_through(
+        self,
+        keys_by_org: Dict[UUID, Iterable[str]],
+        load: Callable[[list[Tuple[UUID, str]]], Dict[Tuple[UUID, str], V]],
+    ) -> Dict[UUID, Dict[str, V]]:
+        """
+        Values for the given keys of one or more organizations, calling
+        load(missing (organization_id, key) pairs) once for all misses. Keys
+        without a value are cached as None and left out of the result.
+        """
+        values: Dict[UUID, Dict[str, V]] = {}
+        missing: list[Tuple[UUID, str]] = []
+        generation = self._generation
+        for organization_id, keys in keys_by_org.items():
+            cached, org_missing = self.get_many(organization_id, keys)
+            values[organization_id] = {
+                key: value for key, value in cached.items() if value is not None
+            }
+            missing.extend((organization_id, key) for key in org_missing)
+        if not missing:
+            return values
+        loaded = load(missing)
+        for organization_id, key in missing:
+            value = loaded.get((organization_id, key))
+            self.put(organization_id, key, value, generation)
+            if value is not None:
+                values[organization_id][key] = value
+        return values
+
+    def invalidate(self, organization_id: UUID, key: Optional[str] = None) -> None:
+        """
+        Drop one key's entry, or every entry of the organization.
+        """
+        if key is not None:
+            self.invalidate_many(organization_id, (key,))
+            return
+        with self._lock:
+            self._generation += 1
+            for k in [k for k in self._entries if k[0] == organization_id]:
+                del self._entries[k]
+
+    def invalidate_many(self, organization_id: UUID, keys: Iterable[str]) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop((organization_id, key), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class ResourceSnapshot(NamedTuple):
+    """
+    The CloudResource columns the analyzer reads, detached from any session.
+    """
+
+    resource_id: str
+    criticality: CloudResourceCriticality
+    custom_rules: Dict[str, Any]
+
+    @classmethod
+    def from_row(cls, resource: CloudResource) -> "ResourceSnapshot":
+        return cls(
+            resource_id=str(resource.resource_id),
+            criticality=resource.criticality,
+            custom_rules=dict(resource.custom_rules or {}),
+        )
+
+
+class IdentitySnapshot(NamedTuple):
+    """
+    The CloudIdentity columns the analyzer reads, detached from any session.
+    """
+
+    id: uuid.UUID
+    identity_arn: str
+
+    @classmethod
+    def from_row(cls, identity: CloudIdentity) -> "IdentitySnapshot":
+        return cls(id=identity.id, identity_arn=str(identity.identity_arn))
+
+
+def _cache_from_env() -> OrgLookupCache:
+    return OrgLookupCache(
+        max_entries=int(os.getenv("LOOKUP_CACHE_SIZE", "100000")),
+        ttl_seconds=float(os.getenv("LOOKUP_CACHE_TTL_SECONDS", "300")),
+        negative_ttl_seconds=float(
+            os.getenv("LOOKUP_CACHE_NEGATIVE_TTL_SECONDS", "30")
+        ),
+    )
+
+
+# Process-wide caches shared by the analyzer and the endpoints that write them
+resource_cache: OrgLookupCache[ResourceSnapshot] = _cache_from_env()
+identity_cache: OrgLookupCache[IdentitySnapshot] = _cache_from_env()
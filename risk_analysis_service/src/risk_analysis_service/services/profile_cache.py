@@ -0,0 +1,81 @@
+"""
+Compiled EntityProfile snapshots for the analyzer hot loop, cached per
+(organization_id, entity_id).
+
+A CompiledProfile turns the JSONB lists of an EntityProfile row into frozensets,
+an hour-of-day bitmask and a CIDR range index once, instead of once per event.
+The cache is an OrgLookupCache: entries expire after a TTL, it is LRU-bounded
+and the profile endpoints invalidate entries they change. Entities without a
+profile are cached as well (as None) so they do not hit the database on every
+batch.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, FrozenSet, Iterable, NamedTuple, Optional
+from uuid import UUID
+
+from ..core.ip_ranges import IPRangeIndex
+from ..db.models.entity_profile import EntityProfile
+from .lookup_cache import OrgLookupCache
+
+
+def _hour_mask(hours: Iterable[Any]) -> int:
+    mask = 0
+    for hour in hours:
+        if isinstance(hour, int) and 0 <= hour < 24:
+            mask |= 1 << hour
+    return mask
+
+
+class CompiledProfile(NamedTuple):
+    """
+    Immutable, analysis-ready view of one EntityProfile row.
+    """
+
+    entity_id: str
+    organization_id: UUID
+    cloud_identity_id: Optional[UUID]
+    # A non-empty whitelist with only invalid CIDRs still rejects every IP
+    has_cidr_whitelist: bool
+    cidr_index: IPRangeIndex
+    allowed_actions: FrozenSet[Any]
+    forbidden_actions: FrozenSet[Any]
+    common_hours_mask: int
+    has_common_hours: bool
+    common_ips: FrozenSet[Any]
+    common_actions: FrozenSet[Any]
+
+    @classmethod
+    def from_row(cls, profile: EntityProfile) -> "CompiledProfile":
+        return cls(
+            entity_id=str(profile.entity_id),
+            organization_id=profile.organization_id,
+            cloud_identity_id=profile.cloud_identity_id,
+            has_cidr_whitelist=bool(profile.whitelisted_cidrs),
+            cidr_index=IPRangeIndex(profile.whitelisted_cidrs or ()),
+            allowed_actions=frozenset(profile.manual_allowed_actions or ()),
+            forbidden_actions=frozenset(profile.manual_forbidden_actions or ()),
+            common_hours_mask=_hour_mask(profile.auto_common_hours or ()),
+            has_common_hours=bool(profile.auto_common_hours),
+            common_ips=frozenset(profile.auto_common_ips or ()),
+            common_actions=frozenset(profile.auto_common_actions or ()),
+        )
+
+    def is_common_hour(self, hour: int) -> bool:
+        return bool(self.common_hours_mask >> hour & 1)
+
+    def ip_whitelisted(self, ip_str: str) -> bool:
+        """
+        Return True if the IP belongs to any whitelisted network; invalid IPs
+        never match.
+        """
+        return self.cidr_index.contains(ip_str)
+
+
+# Process-wide cache shared by the analyzer and the profile endpoints
+profile_cache: OrgLookupCache[CompiledProfile] = OrgLookupCache(
+    max_entries=int(os.getenv("PROFILE_CACHE_SIZE", "50000")),
+    ttl_seconds=float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "60")),
+)
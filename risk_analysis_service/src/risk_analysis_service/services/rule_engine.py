@@ -0,0 +1,275 @@
+"""
+Batch evaluation of the analyzer's per-event detection rules.
+
+Each rule is a boolean mask over the events of one organization batch and the
+alert severity is the element-wise maximum of the masks' severities. Checks
+against an entity's profile depend only on (entity, action), (entity, ip) or
+(entity, hour), so they are evaluated once per distinct pair in the batch and
+broadcast back to the events; a backfill with thousands of events per entity
+costs one set lookup per combination instead of one per event.
+"""
+
+from __future__ import annotations
+
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.keyword_matcher import keyword_matcher
+from ..db.models.cloud_resource import CloudResourceCriticality
+from ..schemas.audit_event import GenericAuditEvent
+from .lookup_cache import IdentitySnapshot, ResourceSnapshot
+from .profile_cache import CompiledProfile
+
+SEVERITY_LABELS: Dict[int, str] = {1: "LOW", 2: "MEDIUM", 3: "HIGH", 4: "CRITICAL"}
+SEVERITY_RANKS: Dict[str, int] = {
+    label: rank for rank, label in SEVERITY_LABELS.items()
+}
+
+# (violation code, severity rank), in the order violations are reported
+RULES: Tuple[Tuple[str, int], ...] = (
+    ("SHADOW_IDENTITY", SEVERITY_RANKS["MEDIUM"]),
+    ("IP_VIOLATION", SEVERITY_RANKS["CRITICAL"]),
+    ("CRITICAL_RESOURCE_TAMPERING", SEVERITY_RANKS["HIGH"]),
+    ("FORBIDDEN_ACTION", SEVERITY_RANKS["MEDIUM"]),
+    # Night-time event with an action outside the profile's common actions
+    ("PROFILE_DEVIATION_DETECTED", SEVERITY_RANKS["MEDIUM"]),
+    # Otherwise: unusual hour and unusual action
+    ("PROFILE_DEVIATION_DETECTED", SEVERITY_RANKS["LOW"]),
+    # Otherwise: unusual hour only
+    ("MINOR_TIME_DEVIATION", SEVERITY_RANKS["LOW"]),
+)
+_RULE_SEVERITIES = np.array([severity for _, severity in RULES], dtype=np.int8)
+
+DESTRUCTIVE_ACTION_PREFIXES: Tuple[str, ...] = (
+    "delete",
+    "terminate",
+    "destroy",
+    "drop",
+    "purge",
+    "revoke",
+    "shutdown",
+    "kill",
+)
+DESTRUCTIVE_ACTION = "destructive_action"
+keyword_matcher.add_prefixes(DESTRUCTIVE_ACTION, DESTRUCTIVE_ACTION_PREFIXES)
+
+
+def is_destructive_action(action_name: str) -> bool:
+    """
+    Heuristic to classify destructive actions (deletes/terminations/drops).
+    """
+    if not action_name:
+        return False
+    return DESTRUCTIVE_ACTION in keyword_matcher.categories(action_name.strip())
+
+
+class RuleEvaluation(NamedTuple):
+    """
+    Rule masks of shape (len(RULES), n_events), the highest severity rank per
+    event (0 without violations) and which events the ML model should score.
+    """
+
+    masks: np.ndarray
+    severity: np.ndarray
+    run_ml: np.ndarray
+
+    def violations(self, indices: np.ndarray) -> List[List[str]]:
+        """
+        Violation codes, in RULES order, of each of the given events.
+        """
+        return [
+            [code for (code, _), hit in zip(RULES, hits) if hit]
+            for hits in self.masks[:, indices].T.tolist()
+        ]
+
+
+def _intern(values: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+    """
+    Integer codes for values plus the distinct values in first-seen order.
+    """
+    codes: Dict[str, int] = {}
+    array = np.fromiter(
+        (codes.setdefault(value, len(codes)) for value in values),
+        dtype=np.int64,
+        count=len(values),
+    )
+    return array, list(codes)
+
+
+def _pair_lookup(
+    entity: np.ndarray,
+    value: np.ndarray,
+    n_values: int,
+    predicate: Callable[[int, int], bool],
+) -> np.ndarray:
+    """
+    predicate(entity code, value code) for every event, called once per
+    distinct pair.
+    """
+    if not len(entity):
+        return np.zeros(0, dtype=bool)
+    pairs, inverse = np.unique(entity * n_values + value, return_inverse=True)
+    hits = np.fromiter(
+        (predicate(pair // n_values, pair % n_values) for pair in pairs.tolist()),
+        dtype=bool,
+        count=len(pairs),
+    )
+    return hits[inverse.ravel()]
+
+
+def evaluate_rules(
+    events: Sequence[GenericAuditEvent],
+    entity_ids: Sequence[str],
+    profiles_by_id: Dict[str, CompiledProfile],
+    identities_by_arn: Dict[str, IdentitySnapshot],
+    resources_by_id: Dict[str, ResourceSnapshot],
+) -> RuleEvaluation:
+    """
+    Run every rule over the batch. entity_ids holds each event's hybrid entity id.
+    """
+    count = len(events)
+    actors = [(e.actor_identity or "").strip() for e in events]
+    raw_ips = [e.actor_ip_address or "" for e in events]
+    action_names = [e.action_name or "" for e in events]
+    hour = np.fromiter((e.event_time.hour for e in events), np.int64, count)
+
+    entity, entities = _intern(entity_ids)
+    action, actions = _intern(action_names)
+    raw_ip, raw_ip_values = _intern(raw_ips)
+    ip, ip_values = _intern([value.strip() for value in raw_ips])
+
+    profiles: List[Optional[CompiledProfile]] = [
+        profiles_by_id.get(entity_id) for entity_id in entities
+    ]
+
+    def per_entity(attribute: Callable[[CompiledProfile], int]) -> np.ndarray:
+        return np.array(
+            [attribute(p) if p is not None else 0 for p in profiles], dtype=np.int64
+        )[entity]
+
+    has_profile = per_entity(lambda p: 1).astype(bool)
+    has_cidr = per_entity(lambda p: p.has_cidr_whitelist).astype(bool)
+    has_hours = per_entity(lambda p: p.has_common_hours).astype(bool)
+    has_ips = per_entity(lambda p: bool(p.common_ips)).astype(bool)
+    has_actions = per_entity(lambda p: bool(p.common_actions)).astype(bool)
+    common_hour = (per_entity(lambda p: p.common_hours_mask) >> hour & 1).astype(bool)
+
+    def profile_has(
+        attribute: Callable[[CompiledProfile], frozenset], values: List[str]
+    ) -> Callable[[int, int], bool]:
+        def predicate(entity_code: int, value_code: int) -> bool:
+            profile = profiles[entity_code]
+            return profile is not None and values[value_code] in attribute(profile)
+
+        return predicate
+
+    n_actions = max(1, len(actions))
+    forbidden = _pair_lookup(
+        entity,
+        action,
+        n_actions,
+        profile_has(lambda p: p.forbidden_actions, actions),
+    )
+    allowed = _pair_lookup(
+        entity,
+        action,
+        n_actions,
+        profile_has(lambda p: p.allowed_actions, actions),
+    )
+    common_action = _pair_lookup(
+        entity,
+        action,
+        n_actions,
+        profile_has(lambda p: p.common_actions, actions),
+    )
+    common_ip = _pair_lookup(
+        entity,
+        raw_ip,
+        max(1, len(raw_ip_values)),
+        profile_has(lambda p: p.common_ips, raw_ip_values),
+    )
+    whitelisted = _whitelisted(entity, ip, has_cidr, profiles, ip_values)
+
+    has_actor = np.fromiter((bool(a) for a in actors), dtype=bool, count=count)
+    identity_found = np.fromiter(
+        (a in identities_by_arn for a in actors), dtype=bool, count=count
+    )
+    critical_resource = np.fromiter(
+        (
+            resource is not None
+            and resource.criticality == CloudResourceCriticality.CRITICAL
+            for resource in (resources_by_id.get(e.target_resource) for e in events)
+        ),
+        dtype=bool,
+        count=count,
+    )
+    destructive = np.array(
+        [is_destructive_action(name) for name in actions], dtype=bool
+    )[action]
+
+    night = (hour <= 6) | (hour >= 21)
+    unusual_action = ~common_action
+    unusual_hour = ~common_hour
+    deviation_night = has_profile & night & unusual_action
+    deviation_hour = (
+        has_profile & ~deviation_night & unusual_hour & unusual_action & has_hours
+    )
+    minor_deviation = (
+        has_profile & ~deviation_night & ~deviation_hour & unusual_hour & has_hours
+    )
+    masks = np.stack(
+        [
+            has_actor & ~identity_found,
+            has_profile & has_cidr & ~whitelisted,
+            critical_resource & destructive,
+            has_profile & forbidden,
+            deviation_night,
+            deviation_hour,
+            minor_deviation,
+        ]
+    )
+    severity = np.maximum.reduce(masks * _RULE_SEVERITIES[:, None], axis=0)
+
+    # Events that match every auto-profile attribute the profile has are not
+    # scored by the model, nor are manually allowed actions
+    auto_allows = (
+        has_profile
+        & (has_hours | has_ips | has_actions)
+        & (common_hour | ~has_hours)
+        & (common_ip | ~has_ips)
+        & (common_action | ~has_actions)
+    )
+    run_ml = ~(has_profile & allowed) & ~auto_allows
+    return RuleEvaluation(masks=masks, severity=severity, run_ml=run_ml)
+
+
+def _whitelisted(
+    entity: np.ndarray,
+    ip: np.ndarray,
+    has_cidr: np.ndarray,
+    profiles: List[Optional[CompiledProfile]],
+    ip_values: List[str],
+) -> np.ndarray:
+    """
+    CIDR whitelist membership per event, with one vectorized lookup per profile
+    over its distinct IPs.
+    """
+    result = np.zeros(len(entity), dtype=bool)
+    if not has_cidr.any():
+        return result
+    checked = np.flatnonzero(has_cidr)
+    n_ips = max(1, len(ip_values))
+    pairs, inverse = np.unique(
+        entity[checked] * n_ips + ip[checked], return_inverse=True
+    )
+    pair_entity, pair_ip = pairs // n_ips, pairs % n_ips
+    hits = np.zeros(len(pairs), dtype=bool)
+    for entity_code in np.unique(pair_entity).tolist():
+        selected = np.flatnonzero(pair_entity == entity_code)
+        profile = profiles[entity_code]
+        hits[selected] = profile.cidr_index.contains_many(
+            [ip_values[code] for code in pair_ip[selected].tolist()]
+        )
+    result[checked] = hits[inverse.ravel()]
+    return result
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from src.risk_analysis_service.api.v1.endpoints.resources import (
+    _validate_custom_rules,
+)
+from src.risk_analysis_service.rules import custom_rules
+from src.risk_analysis_service.rules.custom_rules import compile_custom_rules
+
+
+def _regex_rule(pattern: str) -> dict:
+    return {
+        "rules": [
+            {
+                "code": "REGEX_RULE",
+                "description": "Action name matches a tenant pattern",
+                "severity": "High",
+                "when": {"field": "action_name", "regex": pattern},
+            }
+        ]
+    }
+
+
+@pytest.mark.parametrize(
+    "pattern",
+    [
+        r"^(a+)+\1$",  # backreference
+        r"(?=a+)+b",  # lookahead
+        r"(?<!x)(a|a)*$",  # lookbehind
+    ],
+)
+def test_patch_validator_rejects_backtracking_regex(pattern: str) -> None:
+    with pytest.raises(HTTPException) as excinfo:
+        _validate_custom_rules(_regex_rule(pattern))
+    assert excinfo.value.status_code == 422
+    assert "Invalid regex" in excinfo.value.detail
+
+
+def test_patch_validator_rejects_regex_without_re2(monkeypatch) -> None:
+    monkeypatch.setattr(custom_rules, "re2", None)
+    with pytest.raises(HTTPException) as excinfo:
+        _validate_custom_rules(_regex_rule("(a+)+$"))
+    assert excinfo.value.status_code == 422
+
+
+def test_nested_quantifier_matches_in_linear_time() -> None:
+    pytest.importorskip("re2")
+    (rule,) = compile_custom_rules(_regex_rule("(a+)+$")).event_rules
+
+    class Event:
+        action_name = "a" * 5000 + "!"
+
+    started = time.perf_counter()
+    assert not rule.check(Event())
+    assert time.perf_counter() - started < 0.5
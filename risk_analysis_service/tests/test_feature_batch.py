@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from src.risk_analysis_service.ml_engine.hourly_features import (
+    FEATURE_COLUMNS,
+    FeatureBatch,
+)
+from src.risk_analysis_service.ml_engine.train_model import aggregate_hourly_features
+from src.risk_analysis_service.schemas.audit_event import GenericAuditEvent
+from src.risk_analysis_service.services.event_analyzer import EventAnalyzerService
+
+ORGANIZATION_ID = uuid.UUID("00000000-0000-0000-0000-000000000001")
+DAY = datetime(2025, 3, 1, tzinfo=timezone.utc)
+
+
+def _event(
+    index: int,
+    event_time: datetime,
+    actor_identity: str = "alice",
+    actor_ip_address: str = "10.0.0.1",
+    action_name: str = "GetObject",
+    event_status: str = "SUCCESS",
+) -> GenericAuditEvent:
+    return GenericAuditEvent(
+        event_id=str(index),
+        event_time=event_time,
+        actor_identity=actor_identity,
+        actor_ip_address=actor_ip_address,
+        action_name=action_name,
+        target_resource="arn:aws:s3:::bucket",
+        event_status=event_status,
+        organization_id=ORGANIZATION_ID,
+        cloud_provider="AWS",
+        raw_log={},
+    )
+
+
+def _events() -> list[GenericAuditEvent]:
+    events = []
+    # The last night hour, the first day hour and their evening counterparts
+    for hour in (6, 7, 20, 21):
+        start = DAY + timedelta(hours=hour)
+        events += [
+            _event(len(events), start + timedelta(minutes=5)),
+            _event(
+                len(events) + 1,
+                start + timedelta(minutes=59, seconds=59),
+                actor_ip_address="10.0.0.2",
+                action_name="DeleteBucket",
+                event_status="FAILURE",
+            ),
+            _event(
+                len(events) + 2,
+                start,
+                actor_identity="bob",
+                action_name="TerminateInstances",
+            ),
+        ]
+    # A naive datetime (treated as UTC) and a tz-aware one in the same hour
+    events += [
+        _event(len(events), datetime(2025, 3, 1, 7, 30), actor_identity="carol"),
+        _event(
+            len(events) + 1,
+            datetime(2025, 3, 1, 9, 45, tzinfo=timezone(timedelta(hours=2))),
+            actor_identity="carol",
+            event_status="FAILURE",
+        ),
+    ]
+    # Identities that fall back to the IP address
+    for identity in ("", "  ", "Unknown", "anonymous", "None"):
+        events.append(
+            _event(
+                len(events),
+                DAY + timedelta(hours=21, minutes=len(events)),
+                actor_identity=identity,
+                actor_ip_address="198.51.100.9",
+                action_name="deleteObject",
+            )
+        )
+    return events
+
+
+def _training_features(events: list[GenericAuditEvent]) -> dict:
+    df = pd.DataFrame(
+        {
+            "event_time": [e.event_time for e in events],
+            "actor_identity": [e.actor_identity for e in events],
+            "actor_ip_address": [e.actor_ip_address for e in events],
+            "action_name": [e.action_name for e in events],
+            "event_status": [e.event_status.value for e in events],
+        }
+    )
+    features = aggregate_hourly_features(df)
+    return {
+        (entity_id, int(window.timestamp()) // 3600): [float(value) for value in row]
+        for (window, entity_id), row in zip(
+            features.index, features[FEATURE_COLUMNS].to_numpy()
+        )
+    }
+
+
+@pytest.fixture(scope="module")
+def analyzer() -> EventAnalyzerService:
+    return EventAnalyzerService(streaming_features=False)
+
+
+def test_feature_batch_matches_training_aggregation(analyzer) -> None:
+    events = _events()
+    expected = _training_features(events)
+    actual = FeatureBatch(analyzer._feature_rows(events)).aggregate()
+
+    assert actual.keys() == expected.keys()
+    for key, vector in expected.items():
+        assert actual[key] == pytest.approx(vector), key
+    hour = int(DAY.timestamp()) // 3600
+    assert [actual[("alice", hour + h)][-1] for h in (6, 7, 20, 21)] == [
+        1.0,
+        0.0,
+        0.0,
+        1.0,
+    ]
+    assert actual[("carol", hour + 7)][0] == 2.0
+    assert actual[("198.51.100.9", hour + 21)][0] == 5.0
+
+
+def test_feature_batch_empty() -> None:
+    assert FeatureBatch([]).aggregate() == {}
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from src.risk_analysis_service.ml_engine.predictor import ForestScorer
+from src.risk_analysis_service.ml_engine.train_model import export_forest
+
+
+def _make_features(count: int, seed: int) -> np.ndarray:
+    # Shaped like the analyzer's hourly rows, so many of them repeat
+    rng = np.random.default_rng(seed)
+    event_count = rng.integers(1, 40, count)
+    return np.column_stack(
+        [
+            event_count,
+            rng.binomial(event_count, 0.05) / event_count,
+            rng.integers(1, 4, count),
+            rng.binomial(event_count, 0.02),
+            rng.integers(0, 2, count),
+        ]
+    ).astype(np.float64)
+
+
+TRAINING = _make_features(600, seed=1)
+
+
+@pytest.fixture(
+    scope="module",
+    params=[
+        # max_samples="auto" subsamples 256 of the 600 rows
+        {},
+        {"max_samples": 64},
+        {"max_samples": 200, "bootstrap": True},
+        {"max_features": 3},
+    ],
+    ids=["auto", "max-samples-64", "bootstrap", "max-features-3"],
+)
+def fitted(request):
+    scaler = StandardScaler().fit(TRAINING)
+    model = IsolationForest(n_estimators=40, random_state=0, **request.param)
+    model.fit(scaler.transform(TRAINING))
+    return model, scaler
+
+
+@pytest.mark.parametrize("size", [0, 1, 10, 500])
+def test_scorer_matches_sklearn(fitted, size) -> None:
+    model, scaler = fitted
+    scorer = ForestScorer.from_model(model, scaler)
+    batch = _make_features(size, seed=size + 2)
+
+    if size == 0:
+        assert scorer.predict(batch).shape == (0,)
+        assert scorer.score_samples(batch).shape == (0,)
+        return
+    scaled = scaler.transform(batch)
+    np.testing.assert_array_equal(scorer.predict(batch), model.predict(scaled))
+    np.testing.assert_allclose(
+        scorer.score_samples(batch), model.score_samples(scaled), rtol=0, atol=1e-12
+    )
+    np.testing.assert_array_equal(
+        scorer.predict(scaled, scaled=True), model.predict(scaled)
+    )
+
+
+def test_exported_forest_matches_sklearn(fitted, tmp_path) -> None:
+    model, scaler = fitted
+    scorer = ForestScorer.load(export_forest(model, scaler, tmp_path / "forest"))
+    batch = _make_features(200, seed=3)
+    scaled = scaler.transform(batch)
+
+    np.testing.assert_array_equal(scorer.predict(batch), model.predict(scaled))
+    np.testing.assert_allclose(
+        scorer.score_samples(batch), model.score_samples(scaled), rtol=0, atol=1e-12
+    )
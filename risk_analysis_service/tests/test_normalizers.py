@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import pytest
+
+from src.risk_analysis_service.core.normalizers import (
+    AZURE_ACTIVITY_LOG,
+    CLOUDTRAIL,
+    GCP_AUDIT_LOG,
+    registry,
+)
+from src.risk_analysis_service.schemas.audit_event import GenericAuditEvent
+
+PRE_NORMALIZED_RECORD = {
+    "event_id": "evt-1",
+    "event_time": "2024-05-01T12:00:00Z",
+    "actor_identity": "alice@example.com",
+    "actor_ip_address": "203.0.113.7",
+    "action_name": "DeleteBucket",
+    "target_resource": "bucket-1",
+    "event_status": "FAILURE",
+}
+
+
+@pytest.mark.parametrize(
+    "provider, normalizer",
+    [("AZURE", AZURE_ACTIVITY_LOG), ("GCP", GCP_AUDIT_LOG)],
+)
+def test_pre_normalized_envelope_keeps_raw_fields(provider, normalizer) -> None:
+    payload = {
+        "organization_id": "00000000-0000-0000-0000-000000000001",
+        "cloud_provider": provider,
+        "raw": dict(PRE_NORMALIZED_RECORD),
+    }
+    assert registry.resolve(payload) is normalizer
+
+    normalized = registry.normalize(payload)
+
+    for field, value in PRE_NORMALIZED_RECORD.items():
+        assert normalized[field] == value
+    assert normalized["cloud_provider"] == provider
+    assert registry.event_id(payload) == "evt-1"
+
+
+@pytest.mark.parametrize(
+    "aws_keys",
+    [
+        {"eventID": "evt-1", "eventTime": "2024-05-01T12:00:00Z"},
+        {"EventId": "evt-1", "EventTime": "2024-05-01T12:00:00Z"},
+        {
+            "eventVersion": "1.08",
+            "event_id": "evt-1",
+            "event_time": "2024-05-01T12:00:00Z",
+        },
+    ],
+    ids=["eventID", "EventId", "eventVersion"],
+)
+def test_aws_keys_without_other_markers_use_cloudtrail(aws_keys) -> None:
+    record = {
+        "actor_identity": "alice@example.com",
+        "actor_ip_address": "203.0.113.7",
+        "action_name": "DeleteBucket",
+        "target_resource": "bucket-1",
+        "errorCode": "AccessDenied",
+        **aws_keys,
+    }
+    payload = {
+        "organization_id": "00000000-0000-0000-0000-000000000001",
+        "raw": record,
+    }
+    assert registry.resolve(payload) is CLOUDTRAIL
+
+    normalized = registry.normalize(payload)
+
+    assert normalized["event_id"] == "evt-1"
+    assert normalized["event_time"] == "2024-05-01T12:00:00Z"
+    assert normalized["event_status"] == "FAILURE"
+    assert normalized["cloud_provider"] == "AWS"
+    assert GenericAuditEvent.model_validate(normalized).event_id == "evt-1"